@@ -0,0 +1,82 @@
+"""
+Read-path serialization benchmark
+=================================
+Compares rows/sec for GET /houses/ and GET /interactions/ across the three
+read paths: ORM + Pydantic (default), ``?fast=true`` and columnar NPZ.
+
+    python -m apps.backend_api.bench_read_path --rows 20000 --repeat 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from .main import app
+from .database import Base, get_async_db, async_database_url
+from .models.house import HouseListing
+from .models.interaction import UserInteraction
+
+
+def _populate(session_factory, rows: int):
+    db = session_factory()
+    db.bulk_insert_mappings(HouseListing, [
+        {"title": f"House {i}", "description": f"Benchmark home {i}", "price": 100000.0 + i,
+         "location": "Downtown", "bedrooms": 1 + i % 5, "bathrooms": 1 + i % 3, "sqft": 800 + i % 3000}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(UserInteraction, [
+        {"user_id": 1 + i % 500, "house_id": 1 + i % rows, "event_type": ("click", "save", "search")[i % 3]}
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def _rows_per_sec(client: TestClient, path: str, rows: int, repeat: int, **kwargs) -> float:
+    client.get(path, **kwargs)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(path, **kwargs)
+        response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return rows * repeat / elapsed
+
+
+def run(rows: int, repeat: int):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    bench_engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=bench_engine)
+    _populate(sessionmaker(bind=bench_engine), rows)
+    async_session_factory = async_sessionmaker(create_async_engine(async_database_url(url)), expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    client = TestClient(app)
+    try:
+        print(f"{'endpoint':<16}{'path':<12}{'rows/sec':>14}{'speedup':>10}")
+        for endpoint in ("/houses/", "/interactions/"):
+            params = {"limit": rows}
+            baseline = _rows_per_sec(client, endpoint, rows, repeat, params=params)
+            fast = _rows_per_sec(client, endpoint, rows, repeat, params={**params, "fast": "true"})
+            npz = _rows_per_sec(client, endpoint, rows, repeat, params=params,
+                                headers={"Accept": "application/x-npz"})
+            for label, value in (("orm", baseline), ("fast", fast), ("npz", npz)):
+                print(f"{endpoint:<16}{label:<12}{value:>14,.0f}{value / baseline:>9.1f}x")
+    finally:
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark backend read-path serialization.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,348 @@
+"""
+Bulk Import
+===========
+- Streams listing, user and interaction files into the database in batches, never
+  holding the whole file: JSON arrays and JSON Lines (UTF-8 or UTF-16, told apart by the
+  byte-order mark), CSV, and Parquet (needs ``pyarrow``).
+- PostgreSQL: each batch is COPY'd into a temporary staging table and moved across with a
+  single ``INSERT ... SELECT ... ON CONFLICT DO NOTHING``. SQLite: one executemany
+  ``INSERT ... ON CONFLICT DO NOTHING`` per batch. One transaction per batch either way.
+- Duplicates are rejected set-based by the unique constraints (``_house_title_loc_price_uc``
+  for listings, ``email`` for users), not by a lookup per row, so re-running an import is safe.
+- Column names written by ``generate_data.py`` (``house_id``, ``interaction_type``, ...) are
+  mapped onto the models; unknown columns are ignored.
+- Progress and rows/sec are printed as batches land.
+
+    python -m apps.backend_api.bulk_import houses houses_raw.json
+    python -m apps.backend_api.bulk_import interactions interactions.csv --keep-ids --batch-size 20000
+"""
+import argparse
+import codecs
+import csv
+import io
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .models.house import HouseListing
+from .models.interaction import UserInteraction
+from .models.user import User
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_PROGRESS_SECONDS = float(os.getenv("IMPORT_PROGRESS_SECONDS", "2"))
+
+TABLES = {
+    "houses": HouseListing.__table__,
+    "users": User.__table__,
+    "interactions": UserInteraction.__table__,
+}
+FORMATS = ("json", "jsonl", "csv", "parquet")
+
+# Column names used by generate_data.py and other exports -> model columns
+ALIASES = {
+    "houses": {"house_id": "id"},
+    "users": {"user_id": "id"},
+    "interactions": {"interaction_type": "event_type", "timestamp": "created_at", "metadata": "metadata_json"},
+}
+# Python-side model defaults (COPY does not apply them)
+DEFAULTS = {
+    "users": {"hashed_password": "hashed_password", "is_active": True},
+}
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+# --- Readers -------------------------------------------------------------------------
+
+def format_of(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    fmt = {"ndjson": "jsonl", "pq": "parquet"}.get(extension, extension)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}', expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def _encoding(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    return "utf-8"
+
+
+@contextmanager
+def _binary(source):
+    """A seekable binary stream for a path or an already open file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        yield source
+
+
+@contextmanager
+def _text(raw):
+    head = raw.read(4)
+    raw.seek(0)
+    text = io.TextIOWrapper(raw, encoding=_encoding(head), newline="")
+    try:
+        yield text
+    finally:
+        text.detach()  # leave the caller's file open
+
+
+def _json_array(text, chunk_size: int = 1 << 20):
+    """Objects of a top-level JSON array, decoded one at a time from fixed-size chunks."""
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+    while True:
+        chunk = text.read(chunk_size)
+        buffer, pos = buffer[pos:] + chunk, 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == "]":
+                break
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break  # the object continues in the next chunk
+            yield record
+        if not chunk or (pos < len(buffer) and buffer[pos] == "]"):
+            return
+
+
+def _json_lines(text):
+    for line in text:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _records(raw, fmt: str, batch_size: int):
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet import needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(raw).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+    with _text(raw) as text:
+        if fmt == "csv":
+            yield from csv.DictReader(text)
+        elif fmt == "jsonl":
+            yield from _json_lines(text)
+        else:
+            first = text.read(1)
+            while first.isspace():
+                first = text.read(1)
+            if first == "[":
+                yield from _json_array(text)
+            elif first:
+                yield json.loads(first + text.readline())
+                yield from _json_lines(text)
+
+
+def _batches(records, batch_size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Row normalisation ---------------------------------------------------------------
+
+def _to_bool(value):
+    return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "t", "yes", "y")
+
+
+def _to_int(value):
+    return int(value) if not isinstance(value, str) else int(float(value))
+
+
+def _to_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _to_json(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+_CONVERTERS = {int: _to_int, float: float, bool: _to_bool, str: str, datetime: _to_datetime, dict: _to_json}
+
+
+def _converters(table) -> dict:
+    converters = {}
+    for column in table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        converters[column.name] = _CONVERTERS.get(python_type, _to_json)
+    return converters
+
+
+def _convert(convert, value):
+    if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+        return None  # empty CSV field / missing Parquet value
+    return convert(value)
+
+
+def _normalize(name: str, record: dict, converters: dict, keep_ids: bool) -> dict:
+    aliases = ALIASES.get(name, {})
+    row = {}
+    for key, value in record.items():
+        column = aliases.get(key, key)
+        if column in converters and column not in row:
+            value = _convert(converters[column], value)
+            if value is not None or TABLES[name].columns[column].server_default is None:
+                row[column] = value  # a missing created_at is left to the database
+    if name == "users" and not row.get("email") and row.get("id") is not None:
+        row["email"] = f"user{row['id']}@example.com"  # same convention as /auth/token
+    for column, value in DEFAULTS.get(name, {}).items():
+        if row.get(column) is None:
+            row[column] = value
+    if not keep_ids:
+        row.pop("id", None)
+    return row
+
+
+def _by_columns(rows: list) -> dict:
+    """executemany/COPY need one column list per statement; rows of a file almost always share one."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+    return groups
+
+
+# --- Writers -------------------------------------------------------------------------
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _write_postgres(db: Session, table, columns: list, rows: list) -> int:
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return db.execute(pg_insert(table).on_conflict_do_nothing(), rows).rowcount
+    names = ", ".join(columns)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[c]) for c in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.execute(f"CREATE TEMP TABLE _import_staging AS SELECT {names} FROM {table.name} WITH NO DATA")
+    cursor.copy_expert(f"COPY _import_staging ({names}) FROM STDIN", buffer)
+    cursor.execute(f"INSERT INTO {table.name} ({names}) SELECT {names} FROM _import_staging ON CONFLICT DO NOTHING")
+    inserted = cursor.rowcount
+    # A batch with several column groups stages each one in the same transaction
+    cursor.execute("DROP TABLE _import_staging")
+    return inserted
+
+
+def _write_sqlite(db: Session, table, columns: list, rows: list) -> int:
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return db.execute(sqlite_insert(table).on_conflict_do_nothing(), rows).rowcount
+
+
+def _write(db: Session, table, rows: list) -> int:
+    writer = {"postgresql": _write_postgres, "sqlite": _write_sqlite}.get(db.get_bind().dialect.name, _write_generic)
+    return sum(writer(db, table, list(columns), group) for columns, group in _by_columns(rows).items())
+
+
+def _write_generic(db: Session, table, columns: list, rows: list) -> int:
+    return db.execute(insert(table), rows).rowcount
+
+
+def _sync_sequence(db: Session, table):
+    """Explicit ids were written; move the serial past them."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection().exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1)) FROM {table.name}")
+        db.commit()
+
+
+def _report(stats: dict):
+    print(f"[Import] {stats['table']}: {stats['read']:,} rows read, {stats['inserted']:,} inserted, "
+          f"{stats['skipped']:,} duplicates skipped ({stats['rows_per_sec']:,.0f} rows/sec)")
+
+
+def import_file(db: Session, table: str, source, fmt: str = None, batch_size: int = IMPORT_BATCH_SIZE,
+                keep_ids: bool = False, progress: bool = True) -> dict:
+    """Stream ``source`` (a path or a binary file) into ``table``. Returns the final counts."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}', expected one of {', '.join(TABLES)}")
+    fmt = fmt or format_of(str(source))
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    target, converters = TABLES[table], _converters(TABLES[table])
+    stats = {"table": table, "read": 0, "inserted": 0, "skipped": 0, "batches": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    start = last_report = time.perf_counter()
+
+    with _binary(source) as raw:
+        for batch in _batches(_records(raw, fmt, batch_size), batch_size):
+            rows = [_normalize(table, record, converters, keep_ids) for record in batch]
+            try:
+                inserted = _write(db, target, rows)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            stats["read"] += len(rows)
+            stats["inserted"] += max(inserted, 0)
+            stats["skipped"] = stats["read"] - stats["inserted"]
+            stats["batches"] += 1
+            now = time.perf_counter()
+            stats["seconds"] = round(now - start, 3)
+            stats["rows_per_sec"] = round(stats["read"] / max(now - start, 1e-9), 1)
+            if progress and now - last_report >= IMPORT_PROGRESS_SECONDS:
+                _report(stats)
+                last_report = now
+
+    if keep_ids and stats["inserted"]:
+        _sync_sequence(db, target)
+    if progress:
+        _report(stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import houses, users or interactions from a file")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--keep-ids", action="store_true", help="keep the file's ids (needed when interactions refer to them)")
+    args = parser.parse_args()
+
+    from .database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        import_file(db, args.table, args.path, fmt=args.format, batch_size=args.batch_size, keep_ids=args.keep_ids)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
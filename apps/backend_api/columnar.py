@@ -0,0 +1,68 @@
+"""
+Columnar bulk-transfer encoding
+===============================
+Bulk reads for the ML engine skip ORM hydration and Pydantic validation: the
+selected query columns are packed straight into NumPy arrays and shipped as a
+single NPZ archive. Clients opt in with ``Accept: application/x-npz``.
+"""
+import io
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi import Request, Response
+
+NPZ_MEDIA_TYPE = "application/x-npz"
+
+
+def wants_columnar(request: Request) -> bool:
+    """True when the client negotiated the columnar NPZ payload."""
+    return NPZ_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _column_array(column, values) -> np.ndarray:
+    """Convert one result column to a NumPy array that loads without pickle."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = object
+
+    if python_type is int:
+        if any(v is None for v in values):
+            # Nullable integer columns (e.g. interaction.house_id) become float + NaN, like pandas
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    if python_type is float:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if python_type is bool:
+        return np.array([bool(v) for v in values], dtype=np.bool_)
+    if python_type is datetime:
+        return np.array([_naive_utc(v) for v in values], dtype="datetime64[ms]")
+    if python_type is str:
+        return np.array(["" if v is None else v for v in values], dtype=np.str_)
+    # JSON and anything else travels as serialized text
+    return np.array(["" if v is None else json.dumps(v) for v in values], dtype=np.str_)
+
+
+def _naive_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_columns(columns, rows) -> bytes:
+    """Pack query result rows (tuples ordered like ``columns``) into an NPZ archive."""
+    values_by_column = list(zip(*rows)) if rows else [() for _ in columns]
+    arrays = {
+        column.name: _column_array(column, list(values))
+        for column, values in zip(columns, values_by_column)
+    }
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def columnar_response(columns, rows) -> Response:
+    return Response(content=encode_columns(columns, rows), media_type=NPZ_MEDIA_TYPE)
@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -8,12 +9,56 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./smarthouse.db")
 
-# SQLite needs check_same_thread=False; PostgreSQL does not use this arg
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+# Connection pool tuning (ignored for SQLite, which uses SQLAlchemy's default file pool)
+DB_POOL_SIZE     = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW  = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE  = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT  = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+def is_sqlite(url: str = SQLALCHEMY_DATABASE_URL) -> bool:
+    return url.startswith("sqlite")
+
+def async_database_url(url: str) -> str:
+    """Map a sync driver URL to its async driver (aiosqlite / asyncpg)."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL))
+
+def engine_options(url: str) -> dict:
+    if is_sqlite(url):
+        # SQLite needs check_same_thread=False; PostgreSQL does not use this arg
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the writer; NORMAL sync is durable enough under WAL."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the hot read/write routers: one worker keeps many queries in flight
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if is_sqlite():
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
 Base = declarative_base()
 
 def get_db():
@@ -22,3 +67,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
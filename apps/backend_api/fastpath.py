@@ -0,0 +1,44 @@
+"""
+Fast-path read serialization
+============================
+Opt-in (``?fast=true``) read path for large pages: only the columns declared by
+the response schema are selected as plain tuples, zipped into dicts and encoded
+with orjson when available. No ORM objects are hydrated and no per-row Pydantic
+validation runs; the JSON shape matches the regular ``response_model`` output.
+"""
+import json
+from datetime import date, datetime
+
+from fastapi import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def schema_columns(model, schema) -> list:
+    """ORM columns backing each field of a Pydantic response schema, in schema order."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def rows_to_dicts(columns, rows) -> list:
+    names = [column.key for column in columns]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def fast_json_response(payload) -> Response:
+    return Response(content=dumps(payload), media_type="application/json")
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
-from .routers import houses, users, interactions, analytics, seed, auth
+from .routers import houses, users, interactions, analytics, seed, auth, changes, recommend, traces
+from .tracing import tracer, instrument_sqlalchemy, TRACE_HEADER, PARENT_HEADER
+from .recorder import recorder
 from .database import engine, Base
 import time
 import logging
@@ -40,6 +42,26 @@ async def add_process_time_header(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
+# Request tracing: root span per request, one span per SQL statement
+instrument_sqlalchemy()
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if request.url.path.startswith("/traces"):
+        return await call_next(request)
+    with tracer.request(f"{request.method} {request.url.path}", request.headers.get(TRACE_HEADER),
+                        request.headers.get(PARENT_HEADER)) as span:
+        response = await call_next(request)
+        if span is not None:
+            span["attrs"]["status"] = response.status_code
+            response.headers[TRACE_HEADER] = span["trace_id"]
+        return response
+
+@app.middleware("http")
+async def record_traffic(request: Request, call_next):
+    """Sampled request recording for replay (opt-in, RECORD_TRAFFIC=1)."""
+    return await recorder.middleware(request, call_next)
+
 # Strict CORS in Production
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +77,9 @@ app.include_router(users.router)
 app.include_router(interactions.router)
 app.include_router(analytics.router)
 app.include_router(seed.router)
+app.include_router(changes.router)
+app.include_router(recommend.router)
+app.include_router(traces.router)
 
 @app.on_event("startup")
 def startup_event():
@@ -74,6 +99,10 @@ def startup_event():
     finally:
         db.close()
 
+@app.on_event("shutdown")
+async def close_ml_client():
+    await recommend.close_ml_client()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Smart House Recommendation API"}
@@ -0,0 +1,167 @@
+"""
+Traffic Recorder
+================
+- The ML engine's recorder (``apps/ml_engine/recorder.py``) for the backend; see that module
+  for sampling, rotation and the line format. Differences:
+- Lines go to ``RECORD_DIR/backend_api.<pid>.jsonl``; ``python -m apps.ml_engine.replay`` drives
+  them too (point ``--target`` at a backend).
+- The data version is the ML engine's ``X-Data-Version``, passed through by the gateway.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from logging.handlers import RotatingFileHandler
+
+RECORD_TRAFFIC = os.getenv("RECORD_TRAFFIC", "0") == "1"
+RECORD_SAMPLE_RATE = float(os.getenv("RECORD_SAMPLE_RATE", "0.01"))
+RECORD_DIR = os.getenv("RECORD_DIR", "recordings")
+RECORD_PATHS = tuple(p for p in os.getenv("RECORD_PATHS", "/recommend").split(",") if p)
+RECORD_MAX_BYTES = int(os.getenv("RECORD_MAX_BYTES", str(50 * 1024 * 1024)))
+RECORD_BACKUPS = int(os.getenv("RECORD_BACKUPS", "5"))
+RECORD_MAX_BODY_BYTES = int(os.getenv("RECORD_MAX_BODY_BYTES", "65536"))
+REPLAY_HEADER = "X-Replay"
+DATA_VERSION_HEADER = "X-Data-Version"
+
+
+def result_signature(body: bytes, media_type: str = "") -> dict:
+    """What a response returned, in a form two runs can be diffed on."""
+    try:
+        if "ndjson" in (media_type or ""):
+            rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = json.loads(body)
+            rows = payload.get("recommendations") if isinstance(payload, dict) else payload
+        if isinstance(rows, list) and all(isinstance(r, dict) and "id" in r for r in rows):
+            return {"ids": [r["id"] for r in rows]}
+    except (ValueError, AttributeError):
+        pass
+    return {"sha1": hashlib.sha1(body).hexdigest()}
+
+
+class _StreamSignature:
+    """``result_signature`` taken as the body streams out: an NDJSON stream keeps only its ids."""
+
+    def __init__(self, media_type: str = ""):
+        self.ndjson = "ndjson" in (media_type or "")
+        self.sha1 = hashlib.sha1()
+        self.ids = []    # None once a line is not a row with an id
+        self.parts = []  # plain JSON: the whole body, the app built it in memory anyway
+        self.tail = b""
+
+    def _line(self, line: bytes):
+        if self.ids is None or not line.strip():
+            return
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if isinstance(row, dict) and "id" in row:
+            self.ids.append(row["id"])
+        else:
+            self.ids = None
+
+    def feed(self, chunk: bytes):
+        if not self.ndjson:
+            self.parts.append(chunk)
+            return
+        self.sha1.update(chunk)
+        lines = (self.tail + chunk).split(b"\n")
+        self.tail = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def result(self) -> dict:
+        if not self.ndjson:
+            return result_signature(b"".join(self.parts))
+        self._line(self.tail)
+        return {"ids": self.ids} if self.ids is not None else {"sha1": self.sha1.hexdigest()}
+
+
+def _decode(body: bytes):
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body[:RECORD_MAX_BODY_BYTES].decode("utf-8", "replace")
+
+
+class TrafficRecorder:
+    def __init__(self, service: str, enabled: bool = RECORD_TRAFFIC, sample_rate: float = RECORD_SAMPLE_RATE,
+                 directory: str = RECORD_DIR, paths: tuple = RECORD_PATHS, max_bytes: int = RECORD_MAX_BYTES,
+                 backups: int = RECORD_BACKUPS):
+        self.service = service
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.paths = paths
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.data_version = lambda: None  # set by the app
+        self.stats = {"sampled": 0, "written": 0, "skipped_large": 0}
+        self._logger = None
+        self._pid = None
+
+    @property
+    def path(self) -> str:
+        # One file per worker process: RotatingFileHandler is not safe across processes
+        return os.path.join(self.directory, f"{self.service}.{os.getpid()}.jsonl")
+
+    def _sink(self) -> logging.Logger:
+        if self._logger is None or self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger(f"recorder.{self.service}.{id(self)}.{os.getpid()}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+            self._logger, self._pid = logger, os.getpid()
+        return self._logger
+
+    def wants(self, request) -> bool:
+        return (self.enabled and request.url.path.startswith(self.paths) and REPLAY_HEADER not in request.headers
+                and random.random() < self.sample_rate)
+
+    def write(self, entry: dict):
+        self._sink().info(json.dumps(entry, separators=(",", ":"), default=str))
+        self.stats["written"] += 1
+
+    async def middleware(self, request, call_next):
+        if not self.wants(request):
+            return await call_next(request)
+        self.stats["sampled"] += 1
+        body = await request.body()
+        if len(body) > RECORD_MAX_BODY_BYTES:
+            self.stats["skipped_large"] += 1
+            return await call_next(request)
+        started_at, start = time.time(), time.perf_counter()
+        response = await call_next(request)
+        first_byte_ms = (time.perf_counter() - start) * 1000
+        # Same line format as apps/ml_engine/recorder.py (read by replay.py): change both together
+        entry = {"ts": started_at, "service": self.service, "method": request.method, "path": request.url.path,
+                 "query": request.url.query, "content_type": request.headers.get("content-type"),
+                 "body": _decode(body), "status": response.status_code, "first_byte_ms": round(first_byte_ms, 3),
+                 "data_version": response.headers.get(DATA_VERSION_HEADER) or self.data_version()}
+        signature, body_iterator = _StreamSignature(response.headers.get("content-type", "")), response.body_iterator
+
+        async def tee():
+            async for chunk in body_iterator:
+                signature.feed(chunk)
+                yield chunk
+            entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            entry["result"] = signature.result()
+            self.write(entry)
+
+        response.body_iterator = tee()
+        return response
+
+    def snapshot(self) -> dict:
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "path": self.path, **self.stats}
+
+
+recorder = TrafficRecorder("backend_api")
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from datetime import date, timedelta
-from ..database import get_db, SQLALCHEMY_DATABASE_URL
+from ..database import get_async_db, SQLALCHEMY_DATABASE_URL
 from ..models.interaction import UserInteraction
 from ..models.house import HouseListing
 from ..models.user import User
@@ -23,17 +23,17 @@ def _day_filter(query, model_col, day: date):
 
 
 @router.get("/summary")
-def get_summary(db: Session = Depends(get_db)):
+async def get_summary(db: AsyncSession = Depends(get_async_db)):
     """Returns high-level KPI totals for the dashboard."""
-    total_users         = db.query(func.count(User.id)).scalar() or 0
-    total_interactions  = db.query(func.count(UserInteraction.id)).scalar() or 0
+    total_users         = await db.scalar(select(func.count(User.id))) or 0
+    total_interactions  = await db.scalar(select(func.count(UserInteraction.id))) or 0
 
-    today_q = db.query(func.count(UserInteraction.id))
-    active_today = _day_filter(today_q, UserInteraction.created_at, date.today()).scalar() or 0
+    today_q = select(func.count(UserInteraction.id))
+    active_today = await db.scalar(_day_filter(today_q, UserInteraction.created_at, date.today())) or 0
 
-    click_count  = db.query(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "click").scalar() or 0
-    save_count   = db.query(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "save").scalar() or 0
-    search_count = db.query(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "search").scalar() or 0
+    click_count  = await db.scalar(select(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "click")) or 0
+    save_count   = await db.scalar(select(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "save")) or 0
+    search_count = await db.scalar(select(func.count(UserInteraction.id)).filter(UserInteraction.event_type == "search")) or 0
     ctr = round((click_count / total_interactions * 100), 1) if total_interactions > 0 else 0.0
 
     return {
@@ -48,46 +48,41 @@ def get_summary(db: Session = Depends(get_db)):
 
 
 @router.get("/interactions/daily")
-def get_daily_interactions(db: Session = Depends(get_db)):
+async def get_daily_interactions(db: AsyncSession = Depends(get_async_db)):
     """Returns click/save/search counts per day for the last 7 days."""
     result = []
     for i in range(6, -1, -1):
         day = date.today() - timedelta(days=i)
-        def day_type_count(etype):
-            q = db.query(func.count(UserInteraction.id)).filter(UserInteraction.event_type == etype)
-            return _day_filter(q, UserInteraction.created_at, day).scalar() or 0
+        async def day_type_count(etype):
+            q = select(func.count(UserInteraction.id)).filter(UserInteraction.event_type == etype)
+            return await db.scalar(_day_filter(q, UserInteraction.created_at, day)) or 0
 
         result.append({
             "date":    str(day),
-            "clicks":  day_type_count("click"),
-            "saves":   day_type_count("save"),
-            "searches":day_type_count("search"),
+            "clicks":  await day_type_count("click"),
+            "saves":   await day_type_count("save"),
+            "searches":await day_type_count("search"),
         })
     return result
 
 
 @router.get("/top-houses")
-def get_top_houses(db: Session = Depends(get_db)):
+async def get_top_houses(db: AsyncSession = Depends(get_async_db)):
     """Returns the top 10 most interacted-with houses."""
-    top = (
-        db.query(
-            UserInteraction.house_id,
-            func.count(UserInteraction.id).label("engagement")
-        )
-        .filter(UserInteraction.house_id.isnot(None))
-        .group_by(UserInteraction.house_id)
-        .order_by(func.count(UserInteraction.id).desc())
+    engagement = func.count(UserInteraction.id).label("engagement")
+    top = (await db.execute(
+        select(UserInteraction.house_id, HouseListing.title, HouseListing.location, engagement)
+        .join(HouseListing, HouseListing.id == UserInteraction.house_id)
+        .group_by(UserInteraction.house_id, HouseListing.title, HouseListing.location)
+        .order_by(engagement.desc())
         .limit(10)
-        .all()
-    )
-    result = []
-    for house_id, engagement in top:
-        house = db.query(HouseListing).filter(HouseListing.id == house_id).first()
-        if house:
-            result.append({
-                "house_id":  house_id,
-                "title":     house.title,
-                "location":  house.location,
-                "engagement":engagement
-            })
-    return result
+    )).all()
+    return [
+        {
+            "house_id":  house_id,
+            "title":     title,
+            "location":  location,
+            "engagement":count
+        }
+        for house_id, title, location, count in top
+    ]
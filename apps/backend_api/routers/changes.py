@@ -0,0 +1,124 @@
+"""
+Change-data feed
+================
+- ``GET /changes?since=<cursor>`` returns listings inserted or updated and interactions
+  recorded after the cursor, plus the cursor to resume from.
+- Listings are ordered by (second of last change, id); interactions by their increasing id.
+- Listing timestamps only have second precision and commit order can differ from timestamp
+  order, so the listing position never moves past ``CHANGES_SETTLE_SECONDS`` before the DB
+  clock: recent changes are sent again until they settle (clients upsert by id). The cursor
+  also remembers the last listing sent, so paging and long-polls only count new rows.
+- Without ``since`` only the head cursor is returned, so a client that just loaded a full
+  snapshot can follow from there.
+- ``wait=<seconds>`` turns the call into a long-poll: it returns as soon as something
+  changed, or empty at the deadline. The DB connection goes back to the pool between polls.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func, or_, and_, cast, BigInteger, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..fastpath import schema_columns, rows_to_dicts, fast_json_response
+from ..models.house import HouseListing
+from ..models.interaction import UserInteraction
+from ..schemas.house import HouseListing as HouseListingSchema
+from ..schemas.interaction import Interaction as InteractionSchema
+
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT", "30"))
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "0.5"))
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "1000"))
+CHANGES_SETTLE_SECONDS = int(os.getenv("CHANGES_SETTLE_SECONDS", "2"))
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"]
+)
+
+
+def encode_cursor(house: tuple, interaction_id: int, sent: tuple = None) -> str:
+    """``"<house second>.<house id>.<interaction id>[.<sent second>.<sent id>]"``"""
+    parts = [*house, interaction_id] + ([*sent] if sent and sent > house else [])
+    return ".".join(str(int(part)) for part in parts)
+
+
+def decode_cursor(cursor: str):
+    try:
+        parts = [int(part) for part in cursor.split(".")]
+    except ValueError:
+        parts = []
+    if len(parts) not in (3, 5):
+        raise HTTPException(status_code=400, detail="Malformed change cursor.")
+    house, interaction_id = (parts[0], parts[1]), parts[2]
+    return house, interaction_id, (parts[3], parts[4]) if len(parts) == 5 else house
+
+
+def _clock(dialect: str):
+    """Whole epoch seconds of each listing's last change and of the DB's own clock, per dialect."""
+    changed_at = func.coalesce(HouseListing.updated_at, HouseListing.created_at)
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", changed_at), Integer), cast(func.strftime("%s", "now"), Integer)
+    return (cast(func.floor(func.extract("epoch", changed_at)), BigInteger),
+            cast(func.floor(func.extract("epoch", func.now())), BigInteger))
+
+
+async def _head(db: AsyncSession, now_second) -> str:
+    interaction_id = (await db.execute(select(func.max(UserInteraction.id)))).scalar()
+    settled = (await db.execute(select(now_second))).scalar() - CHANGES_SETTLE_SECONDS
+    return encode_cursor((settled, 0), interaction_id or 0)  # the unsettled tail counts as not sent yet
+
+
+def _after(changed_second, position: tuple):
+    return or_(changed_second > position[0], and_(changed_second == position[0], HouseListing.id > position[1]))
+
+
+async def _read_changes(db: AsyncSession, changed_second, now_second, since: str, limit: int) -> dict:
+    house, interaction_id, sent = decode_cursor(since)
+    house_columns = schema_columns(HouseListing, HouseListingSchema)
+    listings = select(changed_second, *house_columns).order_by(changed_second, HouseListing.id)
+    house_rows = (await db.execute(listings.filter(_after(changed_second, sent)).limit(limit))).all()
+    interaction_columns = schema_columns(UserInteraction, InteractionSchema)
+    interaction_rows = (await db.execute(
+        select(*interaction_columns).filter(UserInteraction.id > interaction_id).order_by(UserInteraction.id).limit(limit)
+    )).all()
+
+    more = len(house_rows) == limit or len(interaction_rows) == limit
+    resent = []
+    if len(house_rows) < limit and sent > house:
+        # Sent but not yet settled: send again in case an earlier-stamped change committed late
+        resent = (await db.execute(listings.filter(_after(changed_second, house), ~_after(changed_second, sent)))).all()
+
+    settled = ((await db.execute(select(now_second))).scalar() - CHANGES_SETTLE_SECONDS, 0)
+    last = (int(house_rows[-1][0]), house_rows[-1].id) if house_rows else sent
+    if interaction_rows:
+        interaction_id = interaction_rows[-1].id
+    return {
+        "cursor": encode_cursor(max(house, min(settled, last)), interaction_id, last),
+        "houses": rows_to_dicts(house_columns, [row[1:] for row in resent + house_rows]),
+        "interactions": rows_to_dicts(interaction_columns, interaction_rows),
+        "more": more,
+        "fresh": bool(house_rows or interaction_rows),
+    }
+
+
+@router.get("/")
+async def read_changes(since: Optional[str] = None, wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT),
+                       limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=10 * CHANGES_PAGE_SIZE),
+                       db: AsyncSession = Depends(get_async_db)):
+    changed_second, now_second = _clock(db.bind.dialect.name)
+    if since is None:
+        return {"cursor": await _head(db, now_second), "houses": [], "interactions": [], "more": False}
+
+    decode_cursor(since)
+    deadline = time.monotonic() + wait
+    while True:
+        changes = await _read_changes(db, changed_second, now_second, since, limit)
+        # End the read transaction: frees the pooled connection and lets the next poll see new commits
+        await db.rollback()
+        fresh = changes.pop("fresh")
+        if fresh or time.monotonic() >= deadline:
+            return fast_json_response(changes)
+        await asyncio.sleep(min(CHANGES_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
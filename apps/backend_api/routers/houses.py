@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..database import get_async_db
+from ..columnar import wants_columnar, columnar_response
+from ..fastpath import schema_columns, rows_to_dicts, fast_json_response
 from ..models import house as models
 from ..schemas import house as schemas
 
@@ -13,25 +16,54 @@ router = APIRouter(
 from sqlalchemy.exc import IntegrityError
 
 @router.post("/", response_model=schemas.HouseListing)
-def create_house(house: schemas.HouseListingCreate, db: Session = Depends(get_db)):
+async def create_house(house: schemas.HouseListingCreate, db: AsyncSession = Depends(get_async_db)):
     db_house = models.HouseListing(**house.model_dump())
     db.add(db_house)
     try:
-        db.commit()
-        db.refresh(db_house)
+        await db.commit()
+        await db.refresh(db_house)
         return db_house
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="A house with this title, location, and price already exists.")
 
+def _page(stmt, skip: int, limit: int, ids: Optional[List[int]]):
+    if ids:
+        stmt = stmt.filter(models.HouseListing.id.in_(ids))
+    return stmt.offset(skip).limit(limit)
+
 @router.get("/", response_model=List[schemas.HouseListing])
-def read_houses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    houses = db.query(models.HouseListing).offset(skip).limit(limit).all()
+async def read_houses(request: Request, skip: int = 0, limit: int = 100, fast: bool = False,
+                      ids: Optional[List[int]] = Query(None), db: AsyncSession = Depends(get_async_db)):
+    if wants_columnar(request):
+        # Bulk path for the ML engine: raw column tuples -> NPZ, no ORM objects
+        columns = list(models.HouseListing.__table__.columns)
+        rows = (await db.execute(_page(select(*columns), skip, limit, ids))).all()
+        return columnar_response(columns, rows)
+    if fast:
+        columns = schema_columns(models.HouseListing, schemas.HouseListing)
+        rows = (await db.execute(_page(select(*columns), skip, limit, ids))).all()
+        return fast_json_response(rows_to_dicts(columns, rows))
+    houses = (await db.scalars(_page(select(models.HouseListing), skip, limit, ids))).all()
     return houses
 
+@router.put("/embeddings")
+async def assign_embeddings(assignments: List[schemas.EmbeddingAssignment], db: AsyncSession = Depends(get_async_db)):
+    """Bulk-sets embedding_id after the ML engine publishes a new embedding store (one executemany)."""
+    if not assignments:
+        return {"updated": 0}
+    table = models.HouseListing.__table__
+    # Core UPDATE rather than ORM bulk-by-primary-key, so ids deleted meanwhile are skipped instead of raising
+    result = await db.execute(
+        update(table).where(table.c.id == bindparam("b_id")).values(embedding_id=bindparam("b_embedding_id")),
+        [{"b_id": a.house_id, "b_embedding_id": a.embedding_id} for a in assignments],
+    )
+    await db.commit()
+    return {"updated": result.rowcount if result.rowcount >= 0 else len(assignments)}
+
 @router.get("/{house_id}", response_model=schemas.HouseListing)
-def read_house(house_id: int, db: Session = Depends(get_db)):
-    db_house = db.query(models.HouseListing).filter(models.HouseListing.id == house_id).first()
+async def read_house(house_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_house = await db.get(models.HouseListing, house_id)
     if db_house is None:
         raise HTTPException(status_code=404, detail="House not found")
     return db_house
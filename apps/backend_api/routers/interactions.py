@@ -1,6 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..columnar import wants_columnar, columnar_response
+from ..fastpath import schema_columns, rows_to_dicts, fast_json_response
 from ..models.interaction import UserInteraction
 from ..schemas.interaction import Interaction, InteractionCreate
 
@@ -10,17 +14,32 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=Interaction)
-def record_interaction(interaction: InteractionCreate, db: Session = Depends(get_db)):
+async def record_interaction(interaction: InteractionCreate, db: AsyncSession = Depends(get_async_db)):
     db_interaction = UserInteraction(**interaction.model_dump())
     db.add(db_interaction)
-    db.commit()
-    db.refresh(db_interaction)
+    await db.commit()
+    await db.refresh(db_interaction)
     return db_interaction
 
+def _page(stmt, skip: int, limit: int, after_id: Optional[int]):
+    """Offset paging by default; ``after_id`` switches to keyset paging in id order."""
+    if after_id is not None:
+        return stmt.filter(UserInteraction.id > after_id).order_by(UserInteraction.id).limit(limit)
+    return stmt.offset(skip).limit(limit)
+
 @router.get("/", response_model=list[Interaction])
-def get_all_interactions(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
-    return db.query(UserInteraction).offset(skip).limit(limit).all()
+async def get_all_interactions(request: Request, skip: int = 0, limit: int = 1000, after_id: Optional[int] = None,
+                               fast: bool = False, db: AsyncSession = Depends(get_async_db)):
+    if wants_columnar(request):
+        columns = list(UserInteraction.__table__.columns)
+        rows = (await db.execute(_page(select(*columns), skip, limit, after_id))).all()
+        return columnar_response(columns, rows)
+    if fast:
+        columns = schema_columns(UserInteraction, Interaction)
+        rows = (await db.execute(_page(select(*columns), skip, limit, after_id))).all()
+        return fast_json_response(rows_to_dicts(columns, rows))
+    return (await db.scalars(_page(select(UserInteraction), skip, limit, after_id))).all()
 
 @router.get("/user/{user_id}", response_model=list[Interaction])
-def get_user_interactions(user_id: int, db: Session = Depends(get_db)):
-    return db.query(UserInteraction).filter(UserInteraction.user_id == user_id).all()
+async def get_user_interactions(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(UserInteraction).filter(UserInteraction.user_id == user_id))).all()
@@ -0,0 +1,230 @@
+"""
+Recommendation gateway
+======================
+- ``POST /recommend`` and ``GET /recommend/{user_id}`` proxy to the ML engine over one
+  pooled, keep-alive ``httpx.AsyncClient`` per worker.
+- The user's stored preferences are read here and sent along in the request body, so
+  the ML engine does not have to call back into this API.
+- Successful responses are cached per user (and per ad-hoc payload) for
+  ``RECOMMEND_CACHE_TTL`` seconds; saving preferences drops the user's entries. Degraded
+  answers from an overloaded engine are passed through uncached, so users get full
+  results again as soon as it recovers.
+- Saving preferences also pushes them to the ML engine's preference cache
+  (``PUT /preferences/{user_id}``), after the response is sent.
+- Calls carry the request's ``X-Trace-Id`` so the ML engine's spans join its trace.
+- If the ML engine is down, slow (``ML_ENGINE_TIMEOUT``) or shedding load, a cheap SQL
+  ranking (filtered listings by interaction count) is served instead.
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import httpx
+from fastapi import APIRouter, Depends, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..fastpath import schema_columns, rows_to_dicts, dumps
+from ..models.house import HouseListing
+from ..models.interaction import UserInteraction
+from ..models.user import UserPreference
+from ..tracing import tracer
+from ..recorder import DATA_VERSION_HEADER
+from ..schemas.house import HouseListing as HouseListingSchema
+
+ML_ENGINE_URL = os.getenv("ML_ENGINE_URL", "http://localhost:8001")
+ML_ENGINE_TIMEOUT = float(os.getenv("ML_ENGINE_TIMEOUT", "2.0"))
+ML_MAX_CONNECTIONS = int(os.getenv("ML_MAX_CONNECTIONS", "100"))
+ML_MAX_KEEPALIVE = int(os.getenv("ML_MAX_KEEPALIVE", "20"))
+RECOMMEND_CACHE_TTL = float(os.getenv("RECOMMEND_CACHE_TTL", "30"))
+RECOMMEND_CACHE_SIZE = int(os.getenv("RECOMMEND_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/recommend",
+    tags=["recommend"]
+)
+
+
+class RecommendRequest(BaseModel):
+    user_id: Optional[int] = None
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    preferred_location: Optional[str] = None
+    preferred_locations: Optional[List[str]] = None
+    min_bedrooms: Optional[int] = Field(None, ge=0)
+
+
+class ResponseCache:
+    """Small LRU of encoded responses (body, data version) with a per-entry expiry."""
+
+    def __init__(self, ttl: float = RECOMMEND_CACHE_TTL, max_entries: int = RECOMMEND_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, (body, data_version))
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def drop_user(self, user_id: int):
+        for key in [k for k in self._entries if k[0] == "user" and k[1] == user_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+cache = ResponseCache()
+_client: Optional[httpx.AsyncClient] = None
+
+
+def ml_client() -> httpx.AsyncClient:
+    """The worker's pooled client, created on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=ML_ENGINE_URL,
+            timeout=httpx.Timeout(ML_ENGINE_TIMEOUT, connect=min(1.0, ML_ENGINE_TIMEOUT)),
+            limits=httpx.Limits(max_connections=ML_MAX_CONNECTIONS, max_keepalive_connections=ML_MAX_KEEPALIVE),
+        )
+    return _client
+
+
+async def close_ml_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def invalidate_user(user_id: int):
+    """Called when a user's preferences change."""
+    cache.drop_user(user_id)
+
+
+async def push_preferences(user_id: int, prefs: dict):
+    """Best effort: if the push is lost the ML engine's copy expires with its TTL."""
+    try:
+        response = await ml_client().put(f"/preferences/{user_id}", json=prefs, headers=tracer.headers())
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"[Gateway] Preference push for user {user_id} failed: {e!r}")
+
+
+def _json(body: bytes, source: str, data_version: Optional[str] = None) -> Response:
+    headers = {"X-Cache": source, **({DATA_VERSION_HEADER: data_version} if data_version else {})}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _cacheable(response: httpx.Response) -> bool:
+    """Not the engine's degraded modes ("Content-Only (Degraded)", "Cached (Degraded)", ...)."""
+    try:
+        return "(Degraded)" not in (response.json().get("engine") or "")
+    except ValueError:
+        return False
+
+
+async def _call_ml(path: str, payload: dict, limit: int) -> Optional[httpx.Response]:
+    try:
+        with tracer.span(f"POST {path}", kind="http", peer="ml_engine") as span:
+            response = await ml_client().post(path, json=payload, params={"limit": limit}, headers=tracer.headers())
+            if span is not None:
+                span["attrs"]["status"] = response.status_code
+            response.raise_for_status()
+        return response
+    except httpx.HTTPError as e:
+        logger.warning(f"[Gateway] ML engine unavailable for {path}: {e!r}")
+        return None
+
+
+async def _sql_ranking(db: AsyncSession, prefs: dict, limit: int) -> list:
+    """Listings passing the hard filters, most-interacted first. One indexed aggregate + one filtered scan."""
+    counts = (select(UserInteraction.house_id, func.count().label("n"))
+              .filter(UserInteraction.house_id.is_not(None))
+              .group_by(UserInteraction.house_id)
+              .subquery())
+    columns = schema_columns(HouseListing, HouseListingSchema)
+    interactions = func.coalesce(counts.c.n, 0)
+    stmt = select(*columns, interactions.label("n")).outerjoin(counts, counts.c.house_id == HouseListing.id)
+    if prefs.get("min_price") is not None:
+        stmt = stmt.filter(HouseListing.price >= prefs["min_price"])
+    if prefs.get("max_price") is not None:
+        stmt = stmt.filter(HouseListing.price <= prefs["max_price"])
+    if prefs.get("min_bedrooms") is not None:
+        stmt = stmt.filter(HouseListing.bedrooms >= prefs["min_bedrooms"])
+    locations = prefs.get("preferred_locations") or ([prefs["preferred_location"]] if prefs.get("preferred_location") else [])
+    locations = [loc.strip() for loc in locations if loc and loc.strip()]
+    if locations:
+        stmt = stmt.filter(or_(*[HouseListing.location.ilike(f"%{loc}%") for loc in locations]))
+    rows = (await db.execute(stmt.order_by(interactions.desc(), HouseListing.id).limit(limit))).all()
+
+    top = max((row.n for row in rows), default=0) or 1
+    houses = rows_to_dicts(columns, [row[:-1] for row in rows])
+    for house, row in zip(houses, rows):
+        house["score"] = round(row.n / top, 4)
+    return houses
+
+
+async def _fallback(db: AsyncSession, prefs: dict, limit: int, user_id: Optional[int] = None) -> Response:
+    recommendations = await _sql_ranking(db, prefs, limit)
+    payload = {"recommendations": recommendations, "engine": "SQL Fallback (Popularity)",
+               "message": "No houses match your criteria" if not recommendations else None}
+    if user_id is not None:
+        payload = {"user_id": user_id, **payload}
+    return _json(dumps(payload), "BYPASS")
+
+
+@router.post("/")
+async def recommend_adhoc(prefs: RecommendRequest, limit: int = 5, db: AsyncSession = Depends(get_async_db)):
+    payload = prefs.model_dump()
+    key = ("adhoc", json.dumps(payload, sort_keys=True), limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return _json(cached[0], "HIT", cached[1])
+    response = await _call_ml("/recommend", payload, limit)
+    if response is None:
+        return await _fallback(db, payload, limit)
+    cached = (response.content, response.headers.get(DATA_VERSION_HEADER))
+    if not _cacheable(response):
+        return _json(cached[0], "BYPASS", cached[1])
+    cache.put(key, cached)
+    return _json(cached[0], "MISS", cached[1])
+
+
+@router.get("/{user_id}")
+async def recommend_for_user(user_id: int, limit: int = 5, db: AsyncSession = Depends(get_async_db)):
+    key = ("user", user_id, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return _json(cached[0], "HIT", cached[1])
+    columns = [UserPreference.min_price, UserPreference.max_price, UserPreference.preferred_locations,
+               UserPreference.min_bedrooms]
+    row = (await db.execute(select(*columns).filter(UserPreference.user_id == user_id))).first()
+    # Inline the stored preferences; an empty body tells the engine there are none
+    prefs = {k: v for k, v in rows_to_dicts(columns, [row])[0].items() if v is not None} if row else {}
+    response = await _call_ml(f"/recommend/{user_id}", prefs, limit)
+    if response is None:
+        return await _fallback(db, prefs, limit, user_id)
+    cached = (response.content, response.headers.get(DATA_VERSION_HEADER))
+    if not _cacheable(response):
+        return _json(cached[0], "BYPASS", cached[1])
+    cache.put(key, cached)
+    return _json(cached[0], "MISS", cached[1])
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy.orm import Session
+from ..bulk_import import IMPORT_BATCH_SIZE, TABLES, format_of, import_file
 from ..database import get_db
 from ..models.house import HouseListing
 from ..models.user import User
@@ -25,59 +27,53 @@ def seed_data(clear: bool = False, db: Session = Depends(get_db)):
 
     # 2. Add Houses
     locations = ["Downtown", "Suburbs", "Uptown", "Beachfront", "Mountain View", "Nellore", "Ongole"]
-    houses = []
     # Generate 30 houses as requested
+    planned = []
     for i in range(1, 31):
-        title = f"Premium Property {i}" if i > 25 else f"Modern House {i}"
         location = random.choice(locations)
-        # Deterministic price: ensures idempotency check (Title+Loc+Price) is stable
-        price = 200000 + (i * 50000)
-        
-        # Check if exists before adding (Idempotency)
-        existing = db.query(HouseListing).filter(
-            HouseListing.title == title,
-            HouseListing.location == location,
-            HouseListing.price == price
-        ).first()
-        
-        if not existing:
-            h = HouseListing(
-                title=title,
-                description=f"Beautiful home in {location}",
-                price=price,
-                location=location,
-                bedrooms=random.randint(1, 6),
-                bathrooms=random.randint(1, 4),
-                sqft=random.randint(1000, 5000)
-            )
-            db.add(h)
-            houses.append(h)
-        else:
-            houses.append(existing)
-    
+        planned.append(dict(
+            title=f"Premium Property {i}" if i > 25 else f"Modern House {i}",
+            description=f"Beautiful home in {location}",
+            # Deterministic price: ensures idempotency check (Title+Loc+Price) is stable
+            price=200000 + (i * 50000),
+            location=location,
+            bedrooms=random.randint(1, 6),
+            bathrooms=random.randint(1, 4),
+            sqft=random.randint(1000, 5000)
+        ))
+
+    # Idempotency: one lookup for the whole set instead of one SELECT per house
+    def existing_houses():
+        rows = db.query(HouseListing).filter(HouseListing.title.in_([h["title"] for h in planned])).all()
+        return {(h.title, h.location, h.price): h for h in rows}
+
+    existing = existing_houses()
+    missing = [h for h in planned if (h["title"], h["location"], h["price"]) not in existing]
+    if missing:
+        db.bulk_insert_mappings(HouseListing, missing)
+
     # 3. Add Users
-    users = []
     # Ensure tester users exist
-    for i in range(1, 6):
-        u = db.query(User).filter(User.email == f"tester{i}@example.com").first()
-        if not u:
-            u = User(email=f"tester{i}@example.com", hashed_password="hashed_password")
-            db.add(u)
-        users.append(u)
-    
+    emails = [f"tester{i}@example.com" for i in range(1, 6)]
+    known = {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+    db.bulk_insert_mappings(User, [{"email": e, "hashed_password": "hashed_password"} for e in emails if e not in known])
     db.commit()
 
+    existing = existing_houses()
+    houses = [existing[(h["title"], h["location"], h["price"])] for h in planned]
+    user_ids = dict(db.query(User.email, User.id).filter(User.email.in_(emails)).all())
+
     # 4. Add Interactions
-    for u in users:
+    interactions = []
+    for email in emails:
         for _ in range(10):
             h = random.choice(houses)
-            interaction = UserInteraction(
-                user_id=u.id,
+            interactions.append(dict(
+                user_id=user_ids[email],
                 house_id=h.id,
                 event_type=random.choice(["click", "save", "search"])
-            )
-            db.add(interaction)
-    
+            ))
+    db.bulk_insert_mappings(UserInteraction, interactions)
     db.commit()
 
     total_houses = db.query(HouseListing).count()
@@ -90,3 +86,16 @@ def seed_data(clear: bool = False, db: Session = Depends(get_db)):
         "users": total_users, 
         "interactions": total_interactions
     }
+
+
+@router.post("/import")
+def import_data(table: str, file: UploadFile = File(...), format: Optional[str] = None,
+                batch_size: int = IMPORT_BATCH_SIZE, keep_ids: bool = False, db: Session = Depends(get_db)):
+    """Streams an uploaded JSON / JSON Lines / CSV / Parquet file into houses, users or interactions."""
+    if table not in TABLES:
+        raise HTTPException(status_code=400, detail=f"table must be one of {', '.join(TABLES)}")
+    try:
+        fmt = format or format_of(file.filename)
+        return import_file(db, table, file.file, fmt=fmt, batch_size=max(1, batch_size), keep_ids=keep_ids)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Import failed: {e}")
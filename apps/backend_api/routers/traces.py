@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..tracing import tracer, waterfall, render_text
+from .recommend import ml_client
+
+router = APIRouter(prefix="/traces", tags=["traces"])
+
+
+async def _ml_spans(trace_id: str) -> list:
+    try:
+        response = await ml_client().get(f"/traces/{trace_id}", params={"raw": "true"})
+        return response.json() if response.status_code == 200 else []
+    except Exception:
+        return []
+
+
+@router.get("/")
+async def recent_traces(limit: int = 50):
+    """Most recent traces held in memory, newest first."""
+    return tracer.recent(limit)
+
+
+@router.get("/{trace_id}")
+async def trace_waterfall(trace_id: str, peer: bool = True, format: str = "json", raw: bool = False):
+    """
+    Waterfall of one trace: this service's spans (requests, SQL) plus, unless ``peer=false``,
+    the ML engine's spans for the same trace. ``format=text`` renders bars for a terminal;
+    ``raw=true`` returns this service's spans only (what the ML engine merges in).
+    """
+    spans = tracer.spans(trace_id)
+    if raw:
+        return spans
+    if peer:
+        spans += await _ml_spans(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    trace = waterfall(trace_id, spans)
+    return PlainTextResponse(render_text(trace)) if format == "text" else trace
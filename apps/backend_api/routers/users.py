@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from typing import List
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_db, get_async_db
 from ..models import user as models
 from ..schemas import user as schemas
+from ..fastpath import schema_columns, rows_to_dicts, fast_json_response
+from .recommend import invalidate_user, push_preferences
 
 router = APIRouter(
     prefix="/users",
@@ -30,15 +35,15 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return new_user
 
 @router.post("/{user_id}/preferences", response_model=schemas.UserPreference)
-def update_preferences(user_id: int, prefs: schemas.UserPreferenceCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def update_preferences(user_id: int, prefs: schemas.UserPreferenceCreate, background_tasks: BackgroundTasks,
+                             db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(models.User, user_id)
     if not db_user:
         db_user = models.User(id=user_id, email=f"user{user_id}@example.com", hashed_password="hashed")
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
     
-    db_prefs = db.query(models.UserPreference).filter(models.UserPreference.user_id == user_id).first()
+    db_prefs = (await db.scalars(select(models.UserPreference).filter(models.UserPreference.user_id == user_id))).first()
     if db_prefs:
         for key, value in prefs.model_dump().items():
             setattr(db_prefs, key, value)
@@ -46,13 +51,30 @@ def update_preferences(user_id: int, prefs: schemas.UserPreferenceCreate, db: Se
         db_prefs = models.UserPreference(user_id=user_id, **prefs.model_dump())
         db.add(db_prefs)
     
-    db.commit()
-    db.refresh(db_prefs)
+    await db.commit()
+    await db.refresh(db_prefs)
+    invalidate_user(user_id)
+    background_tasks.add_task(push_preferences, user_id, prefs.model_dump())
     return db_prefs
 
 @router.get("/{user_id}/preferences", response_model=schemas.UserPreference)
-def get_preferences(user_id: int, db: Session = Depends(get_db)):
-    db_prefs = db.query(models.UserPreference).filter(models.UserPreference.user_id == user_id).first()
+async def get_preferences(user_id: int, fast: bool = False, db: AsyncSession = Depends(get_async_db)):
+    if fast:
+        columns = schema_columns(models.UserPreference, schemas.UserPreference)
+        row = (await db.execute(select(*columns).filter(models.UserPreference.user_id == user_id))).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Preferences not found")
+        return fast_json_response(rows_to_dicts(columns, [row])[0])
+    db_prefs = (await db.scalars(select(models.UserPreference).filter(models.UserPreference.user_id == user_id))).first()
     if not db_prefs:
         raise HTTPException(status_code=404, detail="Preferences not found")
     return db_prefs
+
+@router.get("/preferences/", response_model=List[schemas.UserPreference])
+async def list_preferences(after_id: int = 0, limit: int = 1000, db: AsyncSession = Depends(get_async_db)):
+    """Bulk, keyset-paged export of every user's preferences (for offline batch scoring)."""
+    columns = schema_columns(models.UserPreference, schemas.UserPreference)
+    rows = (await db.execute(
+        select(*columns).filter(models.UserPreference.id > after_id).order_by(models.UserPreference.id).limit(limit)
+    )).all()
+    return fast_json_response(rows_to_dicts(columns, rows))
@@ -21,3 +21,7 @@ class HouseListing(HouseListingBase):
     updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+class EmbeddingAssignment(BaseModel):
+    house_id: int
+    embedding_id: str
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite file before it is imported, so the test run
+# never creates tables in, or switches the journal mode of, the checked-in smarthouse.db.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
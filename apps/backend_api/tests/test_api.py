@@ -1,6 +1,16 @@
+import json
+import io
+from datetime import datetime
 import pytest
+import numpy as np
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from apps.backend_api.main import app
+from apps.backend_api.database import Base, get_db, get_async_db, async_database_url, engine
+from apps.backend_api.models.house import HouseListing
+from apps.backend_api.models.interaction import UserInteraction
 
 client = TestClient(app)
 
@@ -26,3 +36,311 @@ def test_api_performance_dummy():
     response = client.get("/")
     assert response.status_code == 200
     assert float(response.headers["x-process-time"]) < 2.0  # basic SLA check
+
+
+# --- Isolated database fixture (per-test SQLite file shared by the sync and async sessions) ---
+@pytest.fixture
+def db_session(tmp_path):
+    url = f"sqlite:///{tmp_path / 'api.db'}"
+    test_engine = create_engine(url, connect_args={"check_same_thread": False})
+    test_async_engine = create_async_engine(async_database_url(url))
+    Base.metadata.create_all(bind=test_engine)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
+    TestingAsyncSession = async_sessionmaker(test_async_engine, expire_on_commit=False)
+
+    def override_get_db():
+        db = TestingSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with TestingAsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    db = TestingSession()
+    db.add_all([
+        HouseListing(title=f"House {i}", description="desc", price=100000.0 + i, location="Downtown",
+                     bedrooms=2, bathrooms=1, sqft=1200)
+        for i in range(1, 4)
+    ])
+    db.add_all([
+        UserInteraction(user_id=1, house_id=1, event_type="save"),
+        UserInteraction(user_id=1, house_id=None, event_type="search", metadata_json={"q": "beach"}),
+    ])
+    db.commit()
+    yield db
+    db.close()
+    app.dependency_overrides.clear()
+    test_engine.dispose()
+
+def test_houses_columnar_negotiation(db_session):
+    response = client.get("/houses/", headers={"Accept": "application/x-npz"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-npz")
+    with np.load(io.BytesIO(response.content), allow_pickle=False) as npz:
+        assert list(npz["id"]) == [1, 2, 3]
+        assert npz["price"].dtype == np.float64
+        assert list(npz["location"]) == ["Downtown"] * 3
+
+    # Default JSON contract is untouched
+    assert client.get("/houses/").json()[0]["title"] == "House 1"
+
+def test_interactions_columnar_nullable_columns(db_session):
+    response = client.get("/interactions/", headers={"Accept": "application/x-npz"})
+    with np.load(io.BytesIO(response.content), allow_pickle=False) as npz:
+        assert npz["house_id"][0] == 1 and np.isnan(npz["house_id"][1])
+        assert list(npz["event_type"]) == ["save", "search"]
+        assert npz["created_at"].dtype.kind == "M"
+
+def test_fast_read_path_matches_default_json(db_session):
+    for path in ("/houses/", "/interactions/"):
+        assert client.get(path, params={"fast": "true"}).json() == client.get(path).json()
+
+def test_fast_preferences_path(db_session):
+    client.post("/users/7/preferences", json={"min_price": 1000, "preferred_locations": ["Downtown"]})
+    assert client.get("/users/7/preferences?fast=true").json() == client.get("/users/7/preferences").json()
+    assert client.get("/users/8/preferences?fast=true").status_code == 404
+
+def test_async_database_url_mapping():
+    assert async_database_url("sqlite:///./smarthouse.db") == "sqlite+aiosqlite:///./smarthouse.db"
+    assert async_database_url("postgresql://u:p@db:5432/x") == "postgresql+asyncpg://u:p@db:5432/x"
+
+def test_sqlite_pragmas_applied():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+def test_async_routers_roundtrip(db_session):
+    created = client.post("/houses/", json={"title": "New", "description": "d", "price": 5.0, "location": "Uptown",
+                                            "bedrooms": 1, "bathrooms": 1, "sqft": 500})
+    assert created.status_code == 200
+    assert client.get(f"/houses/{created.json()['id']}").json()["title"] == "New"
+    assert client.get("/houses/9999").status_code == 404
+    assert client.post("/interactions/", json={"user_id": 2, "house_id": 1, "event_type": "click"}).status_code == 200
+    assert len(client.get("/interactions/user/2").json()) == 1
+    summary = client.get("/analytics/summary").json()
+    assert summary["total_interactions"] == 3 and summary["save_count"] == 1
+    assert client.get("/analytics/top-houses").json()[0]["house_id"] == 1
+    assert len(client.get("/analytics/interactions/daily").json()) == 7
+
+def test_interactions_keyset_paging(db_session):
+    first = client.get("/interactions/", params={"after_id": 0, "limit": 1}).json()
+    assert [row["id"] for row in first] == [1]
+    rest = client.get("/interactions/", params={"after_id": first[-1]["id"], "limit": 10, "fast": "true"}).json()
+    assert [row["id"] for row in rest] == [2]
+
+def test_bulk_preferences_export(db_session):
+    for uid in (3, 4, 5):
+        client.post(f"/users/{uid}/preferences", json={"min_bedrooms": uid})
+    page = client.get("/users/preferences/", params={"limit": 2}).json()
+    assert [p["user_id"] for p in page] == [3, 4]
+    rest = client.get("/users/preferences/", params={"after_id": page[-1]["id"]}).json()
+    assert [p["min_bedrooms"] for p in rest] == [5]
+
+def test_bulk_embedding_assignment(db_session):
+    houses = client.get("/houses/").json()
+    payload = [{"house_id": h["id"], "embedding_id": f"v1:{n}"} for n, h in enumerate(houses)]
+    assert client.put("/houses/embeddings", json=payload).json() == {"updated": len(houses)}
+    assert client.get(f"/houses/{houses[1]['id']}").json()["embedding_id"] == "v1:1"
+
+def test_houses_filter_by_ids(db_session):
+    houses = client.get("/houses/").json()
+    wanted = [houses[0]["id"], houses[2]["id"]]
+    assert [h["id"] for h in client.get("/houses/", params={"ids": wanted}).json()] == wanted
+
+def test_change_feed_follows_inserts_and_updates(db_session, monkeypatch):
+    from apps.backend_api.routers import changes
+    head = client.get("/changes/").json()
+    assert head["houses"] == [] and head["interactions"] == []
+
+    created = client.post("/houses/", json={"title": "Fresh", "description": "d", "price": 7.0, "location": "Uptown",
+                                            "bedrooms": 1, "bathrooms": 1, "sqft": 400}).json()
+    client.post("/interactions/", json={"user_id": 3, "house_id": created["id"], "event_type": "click"})
+    feed = client.get("/changes/", params={"since": head["cursor"]}).json()
+    assert created["id"] in [h["id"] for h in feed["houses"]]
+    assert [(i["user_id"], i["event_type"]) for i in feed["interactions"]] == [(3, "click")]
+
+    # Long-poll: nothing new since the last cursor, so it waits out the deadline and sends no new interactions
+    monkeypatch.setattr(changes, "CHANGES_POLL_SECONDS", 0.05)
+    quiet = client.get("/changes/", params={"since": feed["cursor"], "wait": 0.2}).json()
+    assert quiet["interactions"] == []
+
+    client.put("/houses/embeddings", json=[{"house_id": 1, "embedding_id": "v2:0"}])
+    updated = client.get("/changes/", params={"since": quiet["cursor"], "wait": 1}).json()
+    assert {"id": 1, "embedding_id": "v2:0"}.items() <= next(h for h in updated["houses"] if h["id"] == 1).items()
+
+    # Paging through one row at a time still reaches every listing
+    cursor, seen = "0.0.0", set()
+    for _ in range(10):
+        page = client.get("/changes/", params={"since": cursor, "limit": 1}).json()
+        seen |= {h["id"] for h in page["houses"]}
+        cursor = page["cursor"]
+        if not page["more"]:
+            break
+    assert seen == {1, 2, 3, created["id"]}
+    assert client.get("/changes/", params={"since": "bogus"}).status_code == 400
+
+def test_recommend_gateway_inlines_preferences_caches_and_falls_back(db_session, monkeypatch):
+    import httpx
+    from apps.backend_api.routers import recommend
+    sent = []
+
+    pushed = []
+
+    def ml_engine(request):
+        if request.method == "PUT":
+            pushed.append((request.url.path, json.loads(request.read())))
+            return httpx.Response(200, json={"status": "updated"})
+        sent.append((request.url.path, request.read()))
+        return httpx.Response(200, json={"user_id": 7, "recommendations": [{"id": 2}], "engine": "Hybrid"})
+
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine)))
+    recommend.cache.clear()
+    client.post("/users/7/preferences", json={"min_bedrooms": 2, "preferred_locations": ["Downtown"]})
+
+    first = client.get("/recommend/7", params={"limit": 3})
+    assert first.json()["engine"] == "Hybrid" and first.headers["x-cache"] == "MISS"
+    assert sent[0][0] == "/recommend/7"
+    assert json.loads(sent[0][1]) == {"min_bedrooms": 2, "preferred_locations": ["Downtown"]}
+    assert client.get("/recommend/7", params={"limit": 3}).headers["x-cache"] == "HIT" and len(sent) == 1
+
+    client.post("/users/7/preferences", json={"min_bedrooms": 3})  # invalidates the cached answer
+    assert client.get("/recommend/7", params={"limit": 3}).headers["x-cache"] == "MISS" and len(sent) == 2
+    # ...and every save is pushed to the ML engine's preference cache
+    assert [path for path, _ in pushed] == ["/preferences/7", "/preferences/7"]
+    assert pushed[-1][1]["min_bedrooms"] == 3
+
+    def ml_engine_overloaded(request):
+        return httpx.Response(200, json={"user_id": 7, "recommendations": [{"id": 5}], "engine": "Popularity (Degraded)"})
+
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine_overloaded)))
+    recommend.cache.clear()
+    degraded = client.get("/recommend/7", params={"limit": 3})
+    assert degraded.json()["engine"] == "Popularity (Degraded)" and degraded.headers["x-cache"] == "BYPASS"
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine)))
+    recovered = client.get("/recommend/7", params={"limit": 3})  # not pinned to the degraded answer
+    assert recovered.json()["engine"] == "Hybrid" and recovered.headers["x-cache"] == "MISS"
+
+    def ml_engine_down(request):
+        raise httpx.ConnectError("refused")
+
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine_down)))
+    recommend.cache.clear()
+    fallback = client.post("/recommend/", json={"min_price": 100000, "max_price": 100002}).json()
+    assert fallback["engine"] == "SQL Fallback (Popularity)"
+    assert [h["id"] for h in fallback["recommendations"]] == [1, 2]  # house 1 has an interaction
+    assert fallback["recommendations"][0]["score"] == 1.0
+
+def test_bulk_import_streams_files_and_skips_duplicates(db_session, tmp_path):
+    from apps.backend_api import bulk_import
+    raw = open("houses_raw.json", "rb").read()  # UTF-16 with a BOM
+    first = client.post("/seed/import", params={"table": "houses", "batch_size": 7},
+                        files={"file": ("houses_raw.json", raw)}).json()
+    assert (first["read"], first["inserted"], first["batches"]) == (20, 20, 3)
+    again = client.post("/seed/import", params={"table": "houses"}, files={"file": ("houses_raw.json", raw)}).json()
+    assert (again["inserted"], again["skipped"]) == (0, 20)
+    assert db_session.query(HouseListing).count() == 23
+
+    # generate_data.py column names, CSV, explicit ids
+    csv_file = tmp_path / "interactions.csv"
+    csv_file.write_text("user_id,house_id,interaction_type,timestamp\n7,2,save,2024-01-02 03:04:05\n7,3,click,\n")
+    stats = bulk_import.import_file(db_session, "interactions", csv_file, progress=False)
+    assert stats["inserted"] == 2
+    rows = db_session.query(UserInteraction).filter(UserInteraction.user_id == 7).order_by(UserInteraction.id).all()
+    assert [(r.house_id, r.event_type) for r in rows] == [(2, "save"), (3, "click")]
+    assert rows[0].created_at.year == 2024 and rows[1].created_at is not None
+
+    # Objects split across read chunks still decode
+    text = io.StringIO(json.dumps([{"title": f"T{i}", "price": i} for i in range(50)]))
+    assert len(list(bulk_import._json_array(text, chunk_size=16))) == 50
+    assert client.post("/seed/import", params={"table": "houses"}, files={"file": ("x.xml", b"<x/>")}).status_code == 400
+
+def test_bulk_import_copy_path_stages_each_column_group():
+    from apps.backend_api import bulk_import
+
+    class Cursor:
+        def __init__(self):
+            self.tables, self.copied, self.rowcount = set(), [], 0
+
+        def execute(self, sql):
+            if sql.startswith("CREATE TEMP TABLE"):
+                assert "_import_staging" not in self.tables, 'relation "_import_staging" already exists'
+                self.tables.add("_import_staging")
+            elif sql.startswith("DROP TABLE"):
+                self.tables.remove("_import_staging")
+            elif sql.startswith("INSERT"):
+                self.rowcount = len(self.copied[-1])
+
+        def copy_expert(self, sql, buffer):
+            self.copied.append(buffer.read().splitlines())
+
+    class Session:
+        cursor = Cursor()
+
+        def connection(self):
+            return type("Conn", (), {"connection": type("Raw", (), {"cursor": lambda _: self.cursor})()})()
+
+        def get_bind(self):
+            return type("Bind", (), {"dialect": type("Dialect", (), {"name": "postgresql"})})()
+
+    # One row left created_at to the database: two column groups in one batch
+    rows = [{"user_id": 7, "house_id": 2, "event_type": "save", "created_at": datetime(2024, 1, 2)},
+            {"user_id": 7, "house_id": 3, "event_type": "click"}]
+    session = Session()
+    assert bulk_import._write(session, bulk_import.TABLES["interactions"], rows) == 2
+    assert session.cursor.copied == [["7\t2\tsave\t2024-01-02T00:00:00"], ["7\t3\tclick"]]
+    assert not session.cursor.tables
+
+def test_tracing_records_sql_spans_and_propagates_to_ml_engine(db_session, monkeypatch):
+    import httpx
+    from apps.backend_api.routers import recommend
+    response = client.get("/houses/", headers={"X-Trace-Id": "trace-houses"})
+    assert response.headers["x-trace-id"] == "trace-houses"
+    trace = client.get("/traces/trace-houses", params={"peer": "false"}).json()
+    root = trace["spans"][0]
+    assert root["kind"] == "server" and root["name"] == "GET /houses/" and root["depth"] == 0
+    sql = [s for s in trace["spans"] if s["kind"] == "sql"]
+    assert sql and all(s["parent_id"] == root["span_id"] and s["name"] == "SQL SELECT" for s in sql)
+    assert "house_listings" in sql[0]["attrs"]["statement"]
+
+    seen = []
+
+    def ml_engine(request):
+        seen.append((request.headers.get("x-trace-id"), request.headers.get("x-parent-span-id")))
+        return httpx.Response(200, json={"recommendations": [], "engine": "Hybrid"})
+
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine)))
+    recommend.cache.clear()
+    traced = client.post("/recommend/", json={"min_price": 1}, headers={"X-Trace-Id": "trace-gw"})
+    hop = next(s for s in client.get("/traces/trace-gw", params={"peer": "false"}).json()["spans"] if s["kind"] == "http")
+    assert traced.headers["x-trace-id"] == "trace-gw" and seen == [("trace-gw", hop["span_id"])]
+    assert "backend_api: SQL SELECT" in client.get("/traces/trace-houses", params={"peer": "false", "format": "text"}).text
+    assert client.get("/traces/unknown", params={"peer": "false"}).status_code == 404
+
+def test_traffic_recorder_samples_gateway_requests_with_data_version(db_session, monkeypatch, tmp_path):
+    import httpx
+    from apps.backend_api.recorder import recorder
+    from apps.backend_api.routers import recommend
+
+    def ml_engine(request):
+        return httpx.Response(200, json={"recommendations": [{"id": 3}, {"id": 1}], "engine": "Hybrid"},
+                              headers={"X-Data-Version": "v7+2/m1"})
+
+    monkeypatch.setattr(recommend, "_client", httpx.AsyncClient(base_url="http://ml", transport=httpx.MockTransport(ml_engine)))
+    recommend.cache.clear()
+    for name, value in {"enabled": True, "sample_rate": 1.0, "directory": str(tmp_path), "_logger": None}.items():
+        monkeypatch.setattr(recorder, name, value)
+
+    first = client.post("/recommend/", json={"min_price": 1}, params={"limit": 2})
+    assert first.headers["x-data-version"] == "v7+2/m1"
+    assert client.post("/recommend/", json={"min_price": 1}, params={"limit": 2}).headers["x-data-version"] == "v7+2/m1"
+    client.get("/houses/")  # outside RECORD_PATHS
+    lines = [json.loads(line) for line in open(recorder.path)]
+    assert len(lines) == 2 and lines[0]["service"] == "backend_api"
+    assert lines[0]["body"] == {"min_price": 1}
+    assert lines[0]["query"] == "limit=2" and lines[0]["data_version"] == "v7+2/m1"
+    assert lines[0]["result"] == {"ids": [3, 1]} and lines[0]["duration_ms"] >= 0
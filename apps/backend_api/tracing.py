@@ -0,0 +1,193 @@
+"""
+Request Tracing
+===============
+- The ML engine's tracer (``apps/ml_engine/tracing.py``) for the backend; see that module
+  for trace propagation, buffering and export. Differences:
+- Adds one span per SQL statement (SQLAlchemy cursor events, sync and async engines
+  alike) once ``instrument_sqlalchemy()`` has run.
+- No pipeline ``Stages``; ``GET /traces/{trace_id}`` merges in the ML engine's spans.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_HEADER = "X-Trace-Id"
+PARENT_HEADER = "X-Parent-Span-Id"
+SERVICE_NAME = "backend_api"
+SQL_STATEMENT_CHARS = int(os.getenv("TRACE_SQL_STATEMENT_CHARS", "300"))
+
+# Span dict, headers and waterfall are shared with apps/ml_engine/tracing.py: change both together
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_current = contextvars.ContextVar("trace_context", default=None)  # (trace_id, span_id)
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+class Tracer:
+    def __init__(self, service: str, max_traces: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_EXPORT_PATH,
+                 enabled: bool = TRACING_ENABLED):
+        self.service = service
+        self.max_traces = max_traces
+        self.export_path = export_path
+        self.enabled = enabled
+        self._traces = OrderedDict()  # trace_id -> [span, ...]
+        self._lock = threading.Lock()
+
+    def current(self):
+        return _current.get()
+
+    @contextmanager
+    def request(self, name: str, trace_id: str = None, parent_id: str = None):
+        """Root span of an incoming request, continuing the caller's trace if it sent one."""
+        if not self.enabled:
+            yield None
+            return
+        trace_id = trace_id if trace_id and _VALID_ID.match(trace_id) else _new_id()
+        parent_id = parent_id if parent_id and _VALID_ID.match(parent_id) else None
+        token = _current.set((trace_id, parent_id))
+        try:
+            with self.span(name, kind="server") as span:
+                yield span
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attrs):
+        context = _current.get()
+        if context is None:
+            yield None
+            return
+        span = {"trace_id": context[0], "span_id": _new_id(), "parent_id": context[1], "service": self.service,
+                "name": name, "kind": kind, "start": time.time(), "attrs": attrs}
+        token = _current.set((context[0], span["span_id"]))
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["attrs"]["error"] = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            span["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            self.record(span)
+
+    def headers(self) -> dict:
+        """Headers that carry the current trace to another service."""
+        context = _current.get()
+        if context is None:
+            return {}
+        return {TRACE_HEADER: context[0], **({PARENT_HEADER: context[1]} if context[1] else {})}
+
+    def record(self, span: dict):
+        with self._lock:
+            spans = self._traces.get(span["trace_id"])
+            if spans is None:
+                spans = self._traces[span["trace_id"]] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+            if self.export_path:
+                with open(self.export_path, "a") as f:
+                    f.write(json.dumps(span, default=str) + "\n")
+
+    def spans(self, trace_id: str) -> list:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def recent(self, limit: int = 50) -> list:
+        with self._lock:
+            traces = list(self._traces.items())[-limit:]
+        summaries = []
+        for trace_id, spans in reversed(traces):
+            root = next((s for s in spans if s["kind"] == "server"), spans[0])
+            summaries.append({"trace_id": trace_id, "name": root["name"], "start": root["start"],
+                              "duration_ms": root.get("duration_ms"), "spans": len(spans)})
+        return summaries
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+def waterfall(trace_id: str, spans: list) -> dict:
+    """Spans ordered by start, with offsets from the first span and nesting depth."""
+    spans = sorted({s["span_id"]: s for s in spans}.values(), key=lambda s: s["start"])
+    if not spans:
+        return {"trace_id": trace_id, "duration_ms": 0.0, "spans": []}
+    origin = spans[0]["start"]
+    parents = {s["span_id"]: s["parent_id"] for s in spans}
+
+    def depth(span_id):
+        level, parent = 0, parents.get(span_id)
+        while parent in parents and level < 64:
+            level, parent = level + 1, parents[parent]
+        return level
+
+    rows = [{"offset_ms": round((s["start"] - origin) * 1000, 3), "depth": depth(s["span_id"]),
+             **{k: s[k] for k in ("duration_ms", "service", "name", "kind", "span_id", "parent_id", "attrs")}}
+            for s in spans]
+    end = max(r["offset_ms"] + r["duration_ms"] for r in rows)
+    return {"trace_id": trace_id, "duration_ms": round(end, 3), "services": sorted({r["service"] for r in rows}),
+            "spans": rows}
+
+
+def render_text(trace: dict, width: int = 60) -> str:
+    """The waterfall as fixed-width text bars, for a terminal."""
+    total = trace["duration_ms"] or 1.0
+    lines = [f"trace {trace['trace_id']}  {trace['duration_ms']:.1f}ms"]
+    for row in trace["spans"]:
+        left = min(int(row["offset_ms"] / total * width), width - 1)
+        bar = "#" * min(max(1, int(row["duration_ms"] / total * width)), width - left)
+        label = f"{'  ' * row['depth']}{row['service']}: {row['name']}"
+        lines.append(f"{label[:48]:<48} {' ' * left}{bar:<{width - left}} {row['duration_ms']:8.2f}ms")
+    return "\n".join(lines)
+
+
+tracer = Tracer(SERVICE_NAME)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("trace_started", []).append((time.time(), time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context_ids = _current.get()
+    started = conn.info.get("trace_started")
+    if context_ids is None or not started:
+        return
+    wall, start = started.pop()
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    tracer.record({"trace_id": context_ids[0], "span_id": _new_id(), "parent_id": context_ids[1],
+                   "service": tracer.service, "name": f"SQL {verb}", "kind": "sql", "start": wall,
+                   "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                   "attrs": {"statement": statement[:SQL_STATEMENT_CHARS], "rows": cursor.rowcount,
+                             "executemany": executemany, "dialect": conn.dialect.name}})
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("trace_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_sqlalchemy():
+    """One span per statement on every engine (sync, async, test engines). Idempotent."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
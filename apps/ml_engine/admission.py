@@ -0,0 +1,102 @@
+"""
+Admission Control & Degradation
+===============================
+- At most ``ADMISSION_MAX_CONCURRENCY`` recommendation computations run at once per worker.
+  The rest queue, but only for up to ``ADMISSION_QUEUE_BUDGET_MS``.
+- The queue depth picks the serving mode for new requests, cheapest last:
+    full          -> hybrid content + collaborative (+ re-ranking)
+    content_only  -> content scoring only: no collaborative branch, no re-ranking
+    fallback      -> the last result served for the same request, else popularity (no slot taken)
+    shed          -> 503 with Retry-After
+- A request that outwaits the queue budget is served in fallback mode, not failed.
+"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+ADMISSION_QUEUE_BUDGET_MS = float(os.getenv("ADMISSION_QUEUE_BUDGET_MS", "250"))
+DEGRADE_CONTENT_ONLY_DEPTH = int(os.getenv("DEGRADE_CONTENT_ONLY_DEPTH", "4"))
+DEGRADE_FALLBACK_DEPTH = int(os.getenv("DEGRADE_FALLBACK_DEPTH", "16"))
+SHED_DEPTH = int(os.getenv("SHED_DEPTH", "64"))
+SHED_RETRY_AFTER_SECONDS = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "2"))
+
+FULL, CONTENT_ONLY, FALLBACK, SHED = "full", "content_only", "fallback", "shed"
+MODES = (FULL, CONTENT_ONLY, FALLBACK, SHED)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, queue_budget_ms: float = ADMISSION_QUEUE_BUDGET_MS,
+                 content_only_depth: int = DEGRADE_CONTENT_ONLY_DEPTH, fallback_depth: int = DEGRADE_FALLBACK_DEPTH,
+                 shed_depth: int = SHED_DEPTH):
+        self.max_concurrency = max_concurrency
+        self.queue_budget = queue_budget_ms / 1000
+        self.content_only_depth = content_only_depth
+        self.fallback_depth = fallback_depth
+        self.shed_depth = shed_depth
+        self.running = 0
+        self._waiters = deque()
+        self.stats = {**{mode: 0 for mode in MODES}, "queue_timeouts": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def mode(self) -> str:
+        """Serving mode for a request arriving now."""
+        depth = self.depth
+        if depth >= self.shed_depth:
+            return SHED
+        if depth >= self.fallback_depth:
+            return FALLBACK
+        if depth >= self.content_only_depth:
+            return CONTENT_ONLY
+        return FULL
+
+    def record(self, mode: str):
+        with self._lock:
+            self.stats[mode] += 1
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting at most the queue budget. False means: serve something cheaper."""
+        if self.running < self.max_concurrency and not self._waiters:
+            self.running += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_budget)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return True  # handed a slot just as the budget ran out
+            waiter.cancel()
+            self.record("queue_timeouts")
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the client went away after being handed a slot
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter that is still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def snapshot(self) -> dict:
+        return {"running": self.running, "queued": self.depth, "max_concurrency": self.max_concurrency,
+                "queue_budget_ms": self.queue_budget * 1000, "mode": self.mode(), "served": dict(self.stats)}
+
+
+admission = AdmissionController()
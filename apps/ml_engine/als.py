@@ -0,0 +1,175 @@
+"""
+Implicit-Feedback Matrix Factorization (ALS)
+============================================
+- Hu/Koren/Volinsky implicit ALS in NumPy/SciPy, CPU only.
+- Confidence per (user, house) is 1 + alpha * sum of event weights (save > click > search).
+- Factors are stored as compact float32 arrays (one .npz) next to the id mappings.
+- Online scoring is one dot product of the user factor against candidate item factors.
+- Users unknown to the model are folded in from their few interactions: one regularized
+  least-squares solve against the fixed item factors, no retrain.
+
+    python -m apps.ml_engine.als --factors 32 --iterations 15
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .popularity import EVENT_WEIGHTS
+
+ALS_PATH = os.path.join("models", "als_factors.npz")
+ALS_FACTORS = int(os.getenv("ALS_FACTORS", "32"))
+ALS_REGULARIZATION = float(os.getenv("ALS_REGULARIZATION", "0.05"))
+ALS_ITERATIONS = int(os.getenv("ALS_ITERATIONS", "15"))
+ALS_ALPHA = float(os.getenv("ALS_ALPHA", "10"))
+
+
+def _confidence_matrix(interactions: pd.DataFrame, user_index: pd.Index, item_index: pd.Index, alpha: float):
+    """Sparse (users x items) matrix of alpha * summed event weights; implicit preference is nnz."""
+    weights = interactions['event_type'].map(EVENT_WEIGHTS).fillna(0.0).to_numpy()
+    rows = user_index.get_indexer(interactions['user_id'])
+    cols = item_index.get_indexer(interactions['house_id'])
+    keep = (rows >= 0) & (cols >= 0) & (weights > 0)
+    matrix = sparse.csr_matrix((alpha * weights[keep], (rows[keep], cols[keep])),
+                               shape=(len(user_index), len(item_index)), dtype=np.float64)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _solve(fixed: np.ndarray, gram: np.ndarray, confidence: sparse.csr_matrix, regularization: float) -> np.ndarray:
+    """One half-step: x_u = (Y'Y + Y'(C_u - I)Y + lambda I)^-1 Y'C_u p(u) for every row u."""
+    n_factors = fixed.shape[1]
+    out = np.zeros((confidence.shape[0], n_factors))
+    base = gram + regularization * np.eye(n_factors)
+    for u in range(confidence.shape[0]):
+        start, end = confidence.indptr[u], confidence.indptr[u + 1]
+        if start == end:
+            continue
+        idx, extra = confidence.indices[start:end], confidence.data[start:end]
+        Y = fixed[idx]
+        A = base + (Y.T * extra) @ Y
+        b = Y.T @ (1.0 + extra)
+        out[u] = np.linalg.solve(A, b)
+    return out
+
+
+class ImplicitALS:
+    def __init__(self, factors: int = ALS_FACTORS, regularization: float = ALS_REGULARIZATION,
+                 iterations: int = ALS_ITERATIONS, alpha: float = ALS_ALPHA, random_state: int = 42):
+        self.factors = factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.alpha = alpha
+        self.random_state = random_state
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.item_ids = np.empty(0, dtype=np.int64)
+        self.user_factors = np.empty((0, factors), dtype=np.float32)
+        self.item_factors = np.empty((0, factors), dtype=np.float32)
+        self._index()
+
+    def _index(self):
+        self._user_pos = pd.Series(np.arange(len(self.user_ids)), index=self.user_ids)
+        self._item_pos = pd.Index(self.item_ids)
+        Y = self.item_factors.astype(np.float64)
+        self._item_gram = Y.T @ Y
+
+    def fit(self, interactions):
+        df = pd.DataFrame(interactions)
+        df = df[df['house_id'].notna() & df['user_id'].notna()]
+        self.user_ids = np.sort(df['user_id'].astype(np.int64).unique())
+        self.item_ids = np.sort(df['house_id'].astype(np.int64).unique())
+        confidence = _confidence_matrix(df.astype({'user_id': np.int64, 'house_id': np.int64}),
+                                        pd.Index(self.user_ids), pd.Index(self.item_ids), self.alpha)
+        confidence_t = confidence.T.tocsr()
+
+        rng = np.random.default_rng(self.random_state)
+        X = rng.normal(0, 0.01, (len(self.user_ids), self.factors))
+        Y = rng.normal(0, 0.01, (len(self.item_ids), self.factors))
+        for _ in range(self.iterations):
+            X = _solve(Y, Y.T @ Y, confidence, self.regularization)
+            Y = _solve(X, X.T @ X, confidence_t, self.regularization)
+
+        self.user_factors = X.astype(np.float32)
+        self.item_factors = Y.astype(np.float32)
+        self._index()
+        return self
+
+    def save(self, path: str = ALS_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, user_ids=self.user_ids, item_ids=self.item_ids,
+                 user_factors=self.user_factors, item_factors=self.item_factors,
+                 params=np.array([self.factors, self.regularization, self.iterations, self.alpha], dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = ALS_PATH):
+        with np.load(path) as npz:
+            factors, regularization, iterations, alpha = npz['params']
+            model = cls(int(factors), float(regularization), int(iterations), float(alpha))
+            model.user_ids, model.item_ids = npz['user_ids'], npz['item_ids']
+            model.user_factors, model.item_factors = npz['user_factors'], npz['item_factors']
+        model._index()
+        return model
+
+    def fold_in(self, house_ids, event_types) -> np.ndarray:
+        """Factor for a user the model has not seen, from that user's interactions only."""
+        df = pd.DataFrame({'user_id': 0, 'house_id': house_ids, 'event_type': event_types})
+        df = df[df['house_id'].notna()].astype({'house_id': np.int64})
+        confidence = _confidence_matrix(df, pd.Index([0]), self._item_pos, self.alpha)
+        if confidence.nnz == 0:
+            return None
+        return _solve(self.item_factors.astype(np.float64), self._item_gram, confidence, self.regularization)[0].astype(np.float32)
+
+    def user_vector(self, user_id, interactions: pd.DataFrame = None):
+        """Trained factor if the user is known, else a fold-in from ``interactions`` (or None)."""
+        position = self._user_pos.get(user_id)
+        if position is not None:
+            return self.user_factors[position]
+        if interactions is None or interactions.empty:
+            return None
+        mine = interactions[interactions['user_id'] == user_id]
+        return self.fold_in(mine['house_id'].to_numpy(), mine['event_type'].to_numpy()) if not mine.empty else None
+
+    def score(self, user_vector: np.ndarray, house_ids) -> np.ndarray:
+        """Dot product against the candidates' item factors; houses without a factor score 0."""
+        positions = self._item_pos.get_indexer(np.asarray(house_ids, dtype=np.int64))
+        scores = np.zeros(len(positions), dtype=np.float32)
+        known = positions >= 0
+        scores[known] = self.item_factors[positions[known]] @ user_vector
+        return scores
+
+    def recommend(self, user_vector: np.ndarray, k: int = 10, exclude=()) -> list:
+        scores = self.item_factors @ user_vector
+        order = np.argsort(-scores, kind='stable')
+        excluded = set(exclude)
+        return [int(self.item_ids[i]) for i in order if int(self.item_ids[i]) not in excluded][:k]
+
+
+def main():
+    from .utils import fetch_all_interaction_columns
+
+    parser = argparse.ArgumentParser(description="Train the implicit ALS collaborative model.")
+    parser.add_argument("--factors", type=int, default=ALS_FACTORS)
+    parser.add_argument("--regularization", type=float, default=ALS_REGULARIZATION)
+    parser.add_argument("--iterations", type=int, default=ALS_ITERATIONS)
+    parser.add_argument("--alpha", type=float, default=ALS_ALPHA)
+    parser.add_argument("--output", default=ALS_PATH)
+    args = parser.parse_args()
+
+    interactions = pd.DataFrame(fetch_all_interaction_columns())
+    if interactions.empty:
+        raise SystemExit("No interactions available from the backend.")
+    start = time.perf_counter()
+    model = ImplicitALS(args.factors, args.regularization, args.iterations, args.alpha).fit(interactions)
+    model.save(args.output)
+    print(f"[ALS] {len(model.user_ids)} users x {len(model.item_ids)} houses, {args.factors} factors "
+          f"in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Incremental Refresh from the Backend Change Feed
+================================================
+- A background thread long-polls ``GET /changes`` from the cursor stored with the attached
+  feature store snapshot, so listing inserts/updates and new interactions arrive within
+  seconds, and each round trip only carries what changed.
+- Changes are kept in a small overlay on top of the read-only snapshot. The merged frames
+  are rebuilt at most once per applied batch (on the next request), not per request.
+- New interactions go straight into the decayed popularity counters, once per interaction id.
+- When a newer snapshot is published the overlay is dropped and following restarts from
+  that snapshot's cursor.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "1") == "1"
+CHANGE_FEED_WAIT_SECONDS = float(os.getenv("CHANGE_FEED_WAIT_SECONDS", "20"))
+CHANGE_FEED_RETRY_SECONDS = float(os.getenv("CHANGE_FEED_RETRY_SECONDS", "5"))
+
+
+def _max_id(values) -> int:
+    return int(np.max(values)) if len(values) else 0
+
+
+class ChangeFeed:
+    def __init__(self, popularity=None):
+        self.popularity = popularity
+        self.version = None
+        self.cursor = None
+        self.generation = 0
+        self.applied = {"houses": 0, "interactions": 0}
+        self._snapshot_max_id = 0
+        self._recorded_id = None   # newest interaction already counted in popularity
+        self._houses = {}          # house_id -> latest row
+        self._interactions = []
+        self._frames = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def rebase(self, snapshot):
+        """Start over on top of ``snapshot``: its data already contains everything before its cursor."""
+        with self._lock:
+            self.version = snapshot.version
+            self.cursor = snapshot.manifest.get("cursor")
+            self._snapshot_max_id = _max_id(snapshot.arrays["interactions"].get("id", []))
+            if self._recorded_id is None:
+                self._recorded_id = self._snapshot_max_id  # popularity was primed from this snapshot
+            self._houses, self._interactions, self._frames = {}, [], None
+            self.generation += 1
+
+    def apply(self, changes: dict, version: str = None):
+        houses, interactions = changes.get("houses") or [], changes.get("interactions") or []
+        with self._lock:
+            if version is not None and version != self.version:
+                return  # read from the previous snapshot's cursor; rebased meanwhile
+            for row in houses:
+                self._houses[row["id"]] = row
+            fresh = [row for row in interactions if row["id"] > self._snapshot_max_id]
+            self._interactions.extend(fresh)
+            unrecorded = [row for row in fresh if row["id"] > self._recorded_id]
+            if unrecorded:
+                self._recorded_id = unrecorded[-1]["id"]
+            self.cursor = changes["cursor"]
+            if houses or fresh:
+                self._frames = None
+                self.generation += 1
+            self.applied["houses"] += len(houses)
+            self.applied["interactions"] += len(fresh)
+        if unrecorded and self.popularity is not None:
+            self.popularity.record_many(unrecorded)
+
+    def frames(self, snapshot):
+        """(houses, interactions) of ``snapshot`` with the applied changes on top."""
+        if snapshot.version != self.version:
+            self.rebase(snapshot)
+        with self._lock:
+            if not self._houses and not self._interactions:
+                return snapshot.houses, snapshot.interactions
+            if self._frames is None:
+                self._frames = self._merge(snapshot)
+            return self._frames
+
+    def house_rows(self, snapshot, house_ids) -> list:
+        """Row dicts for the given ids from ``snapshot``, changed or added listings taken from the overlay."""
+        if snapshot.version != self.version:
+            self.rebase(snapshot)
+        with self._lock:
+            changed = [dict(self._houses[h]) for h in house_ids if h in self._houses]
+        unchanged = set(house_ids) - {row["id"] for row in changed}
+        return snapshot.house_rows(unchanged).to_dict(orient='records') + changed
+
+    def _merge(self, snapshot):
+        houses = snapshot.houses
+        if self._houses:
+            changed = pd.DataFrame(list(self._houses.values())).reindex(columns=houses.columns)
+            if 'embedding_id' in changed:
+                changed['embedding_id'] = changed['embedding_id'].fillna('')
+            houses = pd.concat([houses[~houses['id'].isin(changed['id'])], changed.astype(houses.dtypes.to_dict())],
+                               ignore_index=True)
+        interactions = snapshot.interactions
+        if self._interactions:
+            added = pd.DataFrame(self._interactions).reindex(columns=interactions.columns)
+            if 'created_at' in added:
+                added['created_at'] = pd.to_datetime(added['created_at'], utc=True).dt.tz_localize(None)
+            interactions = pd.concat([interactions, added.astype(interactions.dtypes.to_dict())], ignore_index=True)
+        return houses, interactions
+
+    def poll_once(self, wait: float = 0) -> bool:
+        """Fetch and apply one batch; True if the feed has more waiting."""
+        from .utils import fetch_changes
+
+        version = self.version
+        if self.cursor is None:
+            head = fetch_changes()
+            if head is None:
+                return False
+            self.cursor = head["cursor"]
+        changes = fetch_changes(self.cursor, wait)
+        if changes is None:
+            raise ConnectionError("change feed unavailable")
+        self.apply(changes, version)
+        return changes.get("more", False)
+
+    def follow(self, feature_store):
+        more = False
+        while True:
+            try:
+                snapshot = feature_store.current()
+                if snapshot is None:
+                    time.sleep(CHANGE_FEED_RETRY_SECONDS)
+                    continue
+                if snapshot.version != self.version:
+                    self.rebase(snapshot)
+                more = self.poll_once(0 if more else CHANGE_FEED_WAIT_SECONDS)
+            except Exception as e:
+                print(f"[ChangeFeed Error] {e}")
+                time.sleep(CHANGE_FEED_RETRY_SECONDS)
+
+    def start(self, feature_store):
+        if self._thread is None and CHANGE_FEED_ENABLED:
+            self._thread = threading.Thread(target=self.follow, args=(feature_store,), name="change-feed", daemon=True)
+            self._thread.start()
+
+    def status(self) -> dict:
+        return {"version": self.version, "cursor": self.cursor, "generation": self.generation,
+                "pending_houses": len(self._houses), "pending_interactions": len(self._interactions),
+                "applied": dict(self.applied)}
+
+
+change_feed = ChangeFeed()
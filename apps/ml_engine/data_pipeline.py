@@ -1,35 +1,172 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 import os
-from .utils import fetch_house_listings, fetch_user_preferences, fetch_user_interactions
+import json
+import shutil
+import tempfile
+from .utils import fetch_house_columns, fetch_all_interaction_columns, iter_interaction_pages, INTERACTION_PAGE_SIZE
+
+STATE_PATH = os.path.join("models", "pipeline_state.json")
+
+
+class StreamingPreprocessor(BaseEstimator, TransformerMixin):
+    """
+    Scaler + one-hot encoder fitted from streamed statistics (running mean/variance
+    and the set of seen categories) instead of one in-memory fit. Outputs sparse CSR.
+    """
+    def __init__(self, numeric_features, categorical_features):
+        self.numeric_features = numeric_features
+        self.categorical_features = categorical_features
+
+    def fit(self, X, y=None, sample_weight=None):
+        for attr in ('scaler_', 'seen_categories_', 'encoder_'):
+            self.__dict__.pop(attr, None)
+        return self.partial_fit(X, y, sample_weight=sample_weight)
+
+    def partial_fit(self, X, y=None, sample_weight=None):
+        if not hasattr(self, 'scaler_'):
+            self.scaler_ = StandardScaler()
+            self.seen_categories_ = [set() for _ in self.categorical_features]
+        numeric = X[self.numeric_features].to_numpy(dtype=float)
+        if sample_weight is not None:
+            # Zero-weight rows carry no statistics (and would break an all-zero batch)
+            keep = np.asarray(sample_weight) > 0
+            numeric, sample_weight = numeric[keep], np.asarray(sample_weight)[keep]
+        if len(numeric):
+            self.scaler_.partial_fit(numeric, sample_weight=sample_weight)
+        for seen, col in zip(self.seen_categories_, self.categorical_features):
+            seen.update(X[col].dropna().astype(str))
+        categories = [sorted(seen) or ['unknown'] for seen in self.seen_categories_]
+        self.encoder_ = OneHotEncoder(categories=categories, handle_unknown='ignore')
+        self.encoder_.fit(pd.DataFrame({col: [cats[0]] for col, cats in zip(self.categorical_features, categories)}))
+        return self
+
+    def transform(self, X):
+        numeric = sparse.csr_matrix(self.scaler_.transform(X[self.numeric_features].to_numpy(dtype=float)))
+        categorical = self.encoder_.transform(X[self.categorical_features].astype(str))
+        return sparse.hstack([numeric, categorical], format='csr')
+
+    def get_feature_names_out(self, input_features=None):
+        return np.concatenate([np.asarray(self.numeric_features, dtype=object), self.encoder_.get_feature_names_out()])
+
+
+class ChunkedTrainingSet:
+    """
+    Training rows spilled to disk as (house position, label) chunks. Iterating yields
+    one sparse ``(X, y)`` chunk at a time, so memory is bounded by chunk size.
+    """
+    def __init__(self, preprocessor, houses, chunk_paths, spill_dir, state):
+        self.preprocessor = preprocessor
+        self.houses = houses
+        self.chunk_paths = chunk_paths
+        self.spill_dir = spill_dir
+        self.state = state
+        self.n_rows = state.get('rows_last_run', 0)
+        self._house_matrix = preprocessor.transform(houses)
+
+    def __iter__(self):
+        for path in self.chunk_paths:
+            with np.load(path) as chunk:
+                yield self._house_matrix[chunk['positions']], chunk['labels']
+
+    def commit_state(self, path: str = STATE_PATH):
+        """Persist the cursor and popularity counts so the next run can be incremental."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, path)
+
+    def cleanup(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
 
 class HouseDataPipeline:
     def __init__(self):
         # We only use features that actually exist in our DB
         self.numeric_features = ['price', 'bedrooms', 'bathrooms', 'sqft', 'price_per_sqft', 'bed_bath_ratio', 'popularity_score']
         self.categorical_features = ['location']
-        
+
+    def _load_houses(self) -> pd.DataFrame:
+        # Columnar NPZ transfer: arrays go straight into the frames, no per-row dicts
+        house_columns = fetch_house_columns()
+        if not house_columns or len(house_columns.get('id', [])) == 0:
+            raise ValueError("No houses found in the database. Please seed the data first.")
+        houses = pd.DataFrame(house_columns)
+        # 1. Feature Engineering: House Features
+        houses['price_per_sqft'] = houses['price'] / (houses['sqft'].replace(0, 1))
+        houses['bed_bath_ratio'] = houses['bedrooms'] / (houses['bathrooms'].replace(0, 0.1) + 0.1)
+        return houses
+
+    def load_state(self, path: str = STATE_PATH) -> dict:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+        return {"cursor": 0, "popularity": {}}
+
+    def process_streaming(self, since_last_run: bool = False, page_size: int = INTERACTION_PAGE_SIZE,
+                          spill_dir: str = None, state_path: str = STATE_PATH) -> ChunkedTrainingSet:
+        """
+        Chunked pipeline: streams interactions page by page, keeps popularity counts
+        incrementally, spills training rows to disk and fits the preprocessor from
+        the accumulated statistics. With ``since_last_run`` only interactions after the
+        persisted cursor are read; popularity continues from the persisted counts.
+        """
+        houses = self._load_houses()
+        state = self.load_state(state_path) if since_last_run else {"cursor": 0, "popularity": {}}
+        house_index = pd.Index(houses['id'])
+
+        popularity = np.zeros(len(houses))
+        prior = pd.Series(state["popularity"], dtype=float)
+        if not prior.empty:
+            positions = house_index.get_indexer(prior.index.astype(int))
+            popularity[positions[positions >= 0]] = prior.to_numpy()[positions >= 0]
+
+        spill_dir = spill_dir or tempfile.mkdtemp(prefix="house_pipeline_")
+        os.makedirs(spill_dir, exist_ok=True)
+        chunk_paths, cursor, rows = [], int(state["cursor"]), 0
+        print(f"Streaming interactions after id {cursor} in pages of {page_size}...")
+        for page in iter_interaction_pages(after_id=cursor, page_size=page_size):
+            cursor = int(page['id'][-1])
+            positions = house_index.get_indexer(page['house_id'])  # -1 for unknown / null house
+            valid = positions >= 0
+            positions = positions[valid].astype(np.int32)
+            labels = (page['event_type'][valid] == 'save').astype(np.int8)
+            np.add.at(popularity, positions, 1)
+            path = os.path.join(spill_dir, f"chunk_{len(chunk_paths):05d}.npz")
+            np.savez(path, positions=positions, labels=labels)
+            chunk_paths.append(path)
+            rows += len(positions)
+
+        houses['popularity_score'] = popularity
+        # Training rows are house rows repeated once per interaction, so the streamed
+        # popularity counts are exactly the per-house sample weights for the scaler.
+        weights = popularity if popularity.sum() > 0 else None
+        preprocessor = StreamingPreprocessor(self.numeric_features, self.categorical_features)
+        preprocessor.fit(houses, sample_weight=weights)
+
+        print(f"Streamed {rows} training rows into {len(chunk_paths)} chunks ({spill_dir}).")
+        new_state = {
+            "cursor": cursor,
+            "popularity": {str(int(h)): float(c) for h, c in zip(houses['id'], popularity) if c > 0},
+            "rows_last_run": rows,
+        }
+        return ChunkedTrainingSet(preprocessor, houses, chunk_paths, spill_dir, new_state)
+
     def process(self):
         """Run the full pipeline using live data from the backend."""
         print("Fetching live data from backend...")
-        houses_list = fetch_house_listings()
-        interactions_list = fetch_user_interactions()
-        
-        if not houses_list:
-            raise ValueError("No houses found in the database. Please seed the data first.")
-        
-        houses = pd.DataFrame(houses_list)
-        interactions = pd.DataFrame(interactions_list) if interactions_list else pd.DataFrame(columns=['user_id', 'house_id', 'event_type'])
+        houses = self._load_houses()
+        interaction_columns = fetch_all_interaction_columns()
+        interactions = pd.DataFrame(interaction_columns) if interaction_columns else pd.DataFrame(columns=['user_id', 'house_id', 'event_type'])
         
         print(f"Processing {len(houses)} houses and {len(interactions)} interactions...")
         
-        # 1. Feature Engineering: House Features
-        houses['price_per_sqft'] = houses['price'] / (houses['sqft'].replace(0, 1))
-        houses['bed_bath_ratio'] = houses['bedrooms'] / (houses['bathrooms'].replace(0, 0.1) + 0.1)
-        
         # 2. Feature Engineering: Popularity Score
         if not interactions.empty and 'house_id' in interactions.columns:
             pop_scores = interactions.groupby('house_id').size().reset_index(name='popularity_score')
@@ -64,6 +201,9 @@ class HouseDataPipeline:
                 ('cat', OneHotEncoder(handle_unknown='ignore'), self.categorical_features)
             ])
         
+        # Kept so train.py can persist preprocessor + model as one inference pipeline
+        self.preprocessor = preprocessor
+
         print("Splitting and transforming data...")
         if len(X) < 2:
             # Not enough data to split, just return the same for both
@@ -0,0 +1,310 @@
+"""
+House Embedding Store
+=====================
+- Dense vector per listing: TF-IDF + truncated SVD over title/description/location
+  (fitted locally, no network) concatenated with the scaled numeric features.
+- Vectors live in one float32 .npy matrix, memory-mapped read-only, and are keyed by
+  ``embedding_id`` ("<store version>:<row>") which is written back to house_listings.
+- Top-K search is a single BLAS matrix-vector product plus argpartition.
+- Large catalogues can add an IVF index (k-means lists + int8 codes): probe the
+  nearest lists on the quantized codes, then re-score the shortlist exactly.
+
+    python -m apps.ml_engine.embeddings --build
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_DIR = os.path.join("models", "embeddings")
+CURRENT_FILE = "CURRENT"
+TEXT_DIM = int(os.getenv("EMBEDDING_TEXT_DIM", "64"))
+TEXT_WEIGHT = float(os.getenv("EMBEDDING_TEXT_WEIGHT", "0.5"))
+IVF_MIN_ROWS = int(os.getenv("EMBEDDING_IVF_MIN_ROWS", "50000"))
+IVF_NPROBE = int(os.getenv("EMBEDDING_IVF_NPROBE", "8"))
+
+NUMERIC_COLUMNS = ['price', 'bedrooms', 'bathrooms', 'sqft']
+
+
+def _house_text(df: pd.DataFrame) -> pd.Series:
+    parts = [df[c].fillna('').astype(str) for c in ('title', 'description', 'location') if c in df.columns]
+    if not parts:
+        return pd.Series([''] * len(df), index=df.index)
+    text = parts[0]
+    for part in parts[1:]:
+        text = text + ' ' + part
+    return text
+
+
+def _numeric_matrix(df: pd.DataFrame) -> np.ndarray:
+    """Log-scale money and area so a $2M mansion does not flatten every other listing."""
+    values = np.column_stack([
+        pd.to_numeric(df[c], errors='coerce').fillna(0).to_numpy(dtype=np.float64) if c in df.columns
+        else np.zeros(len(df))
+        for c in NUMERIC_COLUMNS
+    ])
+    values[:, 0] = np.log1p(np.maximum(values[:, 0], 0))
+    values[:, 3] = np.log1p(np.maximum(values[:, 3], 0))
+    return values
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class HouseEmbedder:
+    """Turns listings (and preference-shaped queries) into unit-length float32 vectors."""
+
+    def __init__(self, text_dim: int = TEXT_DIM, text_weight: float = TEXT_WEIGHT):
+        self.text_dim = text_dim
+        self.text_weight = text_weight
+        self.vectorizer = None
+        self.svd = None
+        self.mean_ = None
+        self.scale_ = None
+
+    @property
+    def dim(self) -> int:
+        return (self.svd.n_components if self.svd is not None else 0) + len(NUMERIC_COLUMNS)
+
+    def fit(self, df: pd.DataFrame):
+        numeric = _numeric_matrix(df)
+        self.mean_ = numeric.mean(axis=0)
+        self.scale_ = numeric.std(axis=0)
+        self.scale_[self.scale_ == 0] = 1
+
+        self.vectorizer, self.svd = None, None
+        text = _house_text(df)
+        try:
+            vectorizer = TfidfVectorizer(max_features=20000, sublinear_tf=True, stop_words='english')
+            tfidf = vectorizer.fit_transform(text)
+            n_components = min(self.text_dim, tfidf.shape[1] - 1, tfidf.shape[0] - 1)
+            if n_components >= 2:
+                self.svd = TruncatedSVD(n_components=n_components, random_state=42).fit(tfidf)
+                self.vectorizer = vectorizer
+        except ValueError:
+            # Empty vocabulary: embed on numeric features alone
+            pass
+        return self
+
+    def _combine(self, text: pd.Series, numeric: np.ndarray) -> np.ndarray:
+        numeric = _normalize((numeric - self.mean_) / self.scale_)
+        if self.svd is None:
+            return _normalize(numeric).astype(np.float32)
+        text_vec = _normalize(self.svd.transform(self.vectorizer.transform(text)))
+        combined = np.hstack([self.text_weight * text_vec, (1 - self.text_weight) * numeric])
+        return _normalize(combined).astype(np.float32)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        return self._combine(_house_text(df), _numeric_matrix(df))
+
+    def embed_query(self, prefs: dict) -> np.ndarray:
+        """An 'ideal listing' vector for a user: preferred locations/keywords plus the budget midpoint."""
+        locations = prefs.get('preferred_locations') or [prefs.get('preferred_location')]
+        text = ' '.join(str(t) for t in [*locations, prefs.get('keywords')] if t)
+        mid_price = (prefs.get('min_price', 100000) + prefs.get('max_price', 500000)) / 2
+        row = pd.DataFrame([{'price': mid_price, 'bedrooms': prefs.get('min_bedrooms', 2),
+                             'bathrooms': 2, 'sqft': 1500}])
+        return self._combine(pd.Series([text]), _numeric_matrix(row))[0]
+
+
+class IVFIndex:
+    """Inverted-file index over int8-quantized vectors, for catalogues where a full scan is too slow."""
+
+    def __init__(self, centroids, order, offsets, codes, scale):
+        self.centroids = centroids
+        self.order = order        # row ids grouped by list
+        self.offsets = offsets    # list i owns order[offsets[i]:offsets[i + 1]]
+        self.codes = codes        # int8 codes, row-aligned with the float vectors
+        self.scale = scale        # per-dimension dequantization scale
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int = None):
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=42, n_init=3, batch_size=4096).fit(vectors)
+        assignment = kmeans.labels_
+        order = np.argsort(assignment, kind='stable').astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+        scale = np.abs(vectors).max(axis=0) / 127
+        scale[scale == 0] = 1
+        codes = np.round(vectors / scale).astype(np.int8)
+        return cls(kmeans.cluster_centers_.astype(np.float32), order, offsets, codes, scale.astype(np.float32))
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, order=self.order, offsets=self.offsets, codes=self.codes, scale=self.scale)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as npz:
+            return cls(npz['centroids'], npz['order'], npz['offsets'], npz['codes'], npz['scale'])
+
+    def shortlist(self, query: np.ndarray, size: int, nprobe: int = IVF_NPROBE) -> np.ndarray:
+        """Rows of the ``size`` best approximate matches within the ``nprobe`` nearest lists."""
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        approx = self.codes[rows].astype(np.float32) @ (query * self.scale)
+        if len(rows) > size:
+            rows = rows[np.argpartition(-approx, size)[:size]]
+        return rows
+
+
+class EmbeddingStore:
+    """A versioned, read-only set of house vectors plus the embedder that produced them."""
+
+    def __init__(self, path: str, version: str, vectors: np.ndarray, embedding_ids: list, house_ids: np.ndarray,
+                 embedder: HouseEmbedder, ivf: IVFIndex = None):
+        self.path = path
+        self.version = version
+        self.vectors = vectors
+        self.embedding_ids = embedding_ids
+        self.house_ids = house_ids
+        self.embedder = embedder
+        self.ivf = ivf
+        self._row_by_embedding = {eid: row for row, eid in enumerate(embedding_ids)}
+        self._row_by_house = pd.Series(np.arange(len(house_ids)), index=house_ids)
+
+    def __len__(self):
+        return len(self.embedding_ids)
+
+    @classmethod
+    def build(cls, houses: pd.DataFrame, root: str = EMBEDDINGS_DIR, ivf: bool = None, version: str = None):
+        """Embed every listing, write a new version directory and point CURRENT at it."""
+        version = version or datetime.now().strftime("v%Y%m%d_%H%M%S")
+        path = os.path.join(root, version)
+        os.makedirs(path, exist_ok=True)
+
+        embedder = HouseEmbedder().fit(houses)
+        vectors = embedder.transform(houses)
+        house_ids = houses['id'].to_numpy(dtype=np.int64)
+
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        np.save(os.path.join(path, "house_ids.npy"), house_ids)
+        joblib.dump(embedder, os.path.join(path, "embedder.joblib"))
+        index = None
+        if ivf is None:
+            ivf = len(vectors) >= IVF_MIN_ROWS
+        if ivf:
+            index = IVFIndex.build(vectors)
+            index.save(os.path.join(path, "ivf.npz"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": version, "rows": len(vectors), "dim": int(vectors.shape[1]),
+                       "ivf": index is not None, "created_at": datetime.utcnow().isoformat() + "Z"}, f, indent=2)
+
+        tmp_path = os.path.join(root, f"{CURRENT_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        ivf_path = os.path.join(path, "ivf.npz")
+        return cls(
+            path, meta["version"],
+            np.load(os.path.join(path, "vectors.npy"), mmap_mode='r'),
+            [f"{meta['version']}:{row}" for row in range(meta["rows"])],
+            np.load(os.path.join(path, "house_ids.npy")),
+            joblib.load(os.path.join(path, "embedder.joblib")),
+            IVFIndex.load(ivf_path) if os.path.exists(ivf_path) else None,
+        )
+
+    @classmethod
+    def open_current(cls, root: str = EMBEDDINGS_DIR):
+        """The published store, or None if embeddings were never built."""
+        try:
+            with open(os.path.join(root, CURRENT_FILE)) as f:
+                return cls.open(os.path.join(root, f.read().strip()))
+        except FileNotFoundError:
+            return None
+
+    def rows_for(self, houses: pd.DataFrame) -> np.ndarray:
+        """Store row per listing (-1 if unknown): by embedding_id, falling back to house id."""
+        rows = pd.Series(-1, index=houses.index, dtype=np.int64)
+        if 'embedding_id' in houses.columns:
+            rows = houses['embedding_id'].map(self._row_by_embedding).fillna(-1).astype(np.int64)
+        if 'id' in houses.columns and (rows < 0).any():
+            by_house = houses['id'].map(self._row_by_house).fillna(-1).astype(np.int64)
+            rows = rows.where(rows >= 0, by_house)
+        return rows.to_numpy()
+
+    def similarity(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity of ``query`` to the given rows (vectors are unit length); NaN for unknown rows."""
+        scores = np.full(len(rows), np.nan, dtype=np.float32)
+        known = rows >= 0
+        if known.any():
+            scores[known] = self.vectors[rows[known]] @ query
+        return scores
+
+    def search(self, query: np.ndarray, k: int = 10, rows: np.ndarray = None):
+        """
+        Top-K rows by cosine similarity: returns (rows, scores), best first. ``rows``
+        restricts the search to a subset; otherwise the IVF index is used when present.
+        """
+        if rows is None and self.ivf is not None:
+            rows = self.ivf.shortlist(query, max(k * 4, 64))
+        if rows is None:
+            scores = self.vectors @ query
+            candidates = np.arange(len(scores))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[rows >= 0]
+            scores = self.vectors[rows] @ query
+            candidates = rows
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top], scores[top]
+
+    def similar_houses(self, house_id: int, k: int = 10) -> list:
+        """Nearest listings to a listing, excluding itself."""
+        row = self._row_by_house.get(house_id)
+        if row is None:
+            return []
+        rows, scores = self.search(np.asarray(self.vectors[row]), k + 1)
+        return [{"id": int(self.house_ids[r]), "similarity": round(float(s), 4)}
+                for r, s in zip(rows, scores) if r != row][:k]
+
+
+def main():
+    from .utils import fetch_house_columns, push_embedding_ids
+
+    parser = argparse.ArgumentParser(description="Build the house embedding store.")
+    parser.add_argument("--build", action="store_true", help="embed all listings and publish a new version")
+    parser.add_argument("--ivf", action="store_true", help="force an IVF index regardless of catalogue size")
+    parser.add_argument("--no-push", action="store_true", help="do not write embedding_id back to the backend")
+    args = parser.parse_args()
+
+    if not args.build:
+        store = EmbeddingStore.open_current()
+        print(f"[Embeddings] Current: {store.version} ({len(store)} rows)" if store else "[Embeddings] No store built yet.")
+        return
+
+    houses = pd.DataFrame(fetch_house_columns())
+    if houses.empty:
+        raise SystemExit("No listings available from the backend.")
+    store = EmbeddingStore.build(houses, ivf=True if args.ivf else None)
+    print(f"[Embeddings] Published {store.version}: {len(store)} x {store.vectors.shape[1]} (ivf={store.ivf is not None})")
+    if not args.no_push:
+        updated = push_embedding_ids(dict(zip(store.house_ids.tolist(), store.embedding_ids)))
+        print(f"[Embeddings] embedding_id written for {updated} listings.")
+
+
+if __name__ == "__main__":
+    main()
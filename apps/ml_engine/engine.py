@@ -9,22 +9,94 @@ from sklearn.preprocessing import StandardScaler
 from typing import Dict, List
 import logging
 import time
-
-try:
-    import shap
-    SHAP_AVAILABLE = True
-except ImportError:
-    SHAP_AVAILABLE = False
+import os
+from .registry import timed_load
+from .explain import shap_explainer, user_key, make_handle
+from .popularity import DecayedPopularity
+from .tracing import tracer
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 NUMERIC_FEATURES = ['price', 'bedrooms', 'bathrooms', 'sqft', 'price_per_sqft', 'bed_bath_ratio']
 
+# Used when a user has never stored preferences
+DEFAULT_PREFERENCES = {"min_price": 100000, "max_price": 500000, "min_bedrooms": 2}
+
+# Learned re-ranking (stage 3b): only the top hybrid candidates are scored by the model
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "300"))
+RERANK_BUDGET_MS  = float(os.getenv("RERANK_BUDGET_MS", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "128"))
+RERANK_WEIGHT     = float(os.getenv("RERANK_WEIGHT", "0.3"))
+
+# Embedding similarity: blended into the content score; past EMBEDDING_CANDIDATES filtered
+# listings it also pre-selects which houses get hybrid-scored at all
+EMBEDDING_WEIGHT     = float(os.getenv("EMBEDDING_WEIGHT", "0.5"))
+EMBEDDING_CANDIDATES = int(os.getenv("EMBEDDING_CANDIDATES", "2000"))
+
+# Two-stage cascade: past CASCADE_CANDIDATES filtered listings, a cheap content + popularity score
+# retrieves that many candidates and only they get collaborative scoring, re-ranking and formatting
+CASCADE_CANDIDATES = int(os.getenv("CASCADE_CANDIDATES", "400"))
+
 
 class Recommender:
     def __init__(self):
         self.scaler = StandardScaler()
+        self.model = None
+        self.model_version = None
+        self.embeddings = None
+        self.als = None
+        self.popularity = DecayedPopularity()  # fed at startup and per event, not per request
+        self.rerank_candidates = RERANK_CANDIDATES
+        self.rerank_budget_ms = RERANK_BUDGET_MS
+        self.cascade_candidates = CASCADE_CANDIDATES  # 0 scores every filtered listing in full
+
+    @staticmethod
+    def supports_rerank(model) -> bool:
+        """Only full inference pipelines (preprocessor + classifier) can score raw house rows."""
+        return model is not None and hasattr(model, 'predict_proba') and 'preprocess' in getattr(model, 'named_steps', {})
+
+    def load_model(self, path: str, version: str = None):
+        """
+        Load a persisted inference pipeline (memory-mapped) and hot-swap it in for the
+        re-ranking stage. Returns {"load_ms", "swap_ms"}, or None if the artifact is unusable.
+        """
+        model, load_ms = timed_load(path)
+        if not self.supports_rerank(model):
+            logger.warning(f"[Model] {path} is not an inference pipeline; learned re-ranking stays disabled.")
+            return None
+        start = time.perf_counter()
+        # Serving scores a few hundred rows per request: thread fan-out costs more than it saves
+        if hasattr(model.named_steps['model'], 'n_jobs'):
+            model.named_steps['model'].n_jobs = 1
+        self._warm_up(model)
+        # Single reference assignment: in-flight requests keep the model they already read
+        self.model = model
+        self.model_version = version
+        swap_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"[Model] Loaded inference pipeline {version or path} in {load_ms:.1f}ms (swap {swap_ms:.1f}ms).")
+        return {"load_ms": load_ms, "swap_ms": swap_ms}
+
+    def load_embeddings(self, store):
+        """Attach an EmbeddingStore (or None to detach); swapped by reference like the model."""
+        self.embeddings = store
+        if store is not None:
+            logger.info(f"[Embeddings] Using store {store.version} ({len(store)} listings).")
+
+    def load_als(self, als):
+        """Attach an ImplicitALS model (or None); replaces the co-count neighbourhood signal."""
+        self.als = als
+        if als is not None:
+            logger.info(f"[ALS] Using {len(als.user_ids)} user / {len(als.item_ids)} item factors.")
+
+    @staticmethod
+    def _warm_up(model):
+        """Score one dummy row so the first live request does not pay for lazy initialisation."""
+        columns = getattr(model.named_steps['preprocess'], 'feature_names_in_', None)
+        if columns is None:
+            return
+        row = pd.DataFrame([{name: ('' if name == 'location' else 0.0) for name in columns}])
+        model.predict_proba(row)
 
     def _engineer(self, df: pd.DataFrame) -> pd.DataFrame:
         """Add derived features from raw house data."""
@@ -47,24 +119,98 @@ class Recommender:
         }
         return pd.DataFrame([row])
 
-    def recommend(self, user_prefs: dict, house_list: List[dict], interactions=None, limit: int = 15) -> List[dict]:
+    def _popularity_for(self, interactions) -> DecayedPopularity:
+        """The live counters; a request-local tally only if they were never fed (e.g. offline tools)."""
+        if len(self.popularity) or interactions is None or len(interactions) == 0:
+            return self.popularity
+        return DecayedPopularity.from_interactions(interactions)
+
+    def _model_features(self, df: pd.DataFrame, popularity: DecayedPopularity) -> pd.DataFrame:
+        """Model input rows for engineered house rows: adds popularity_score (and location if absent)."""
+        features = df.copy()
+        counts = popularity.count_series()
+        features['popularity_score'] = features['id'].map(counts).fillna(0) if 'id' in features.columns else 0
+        if 'location' not in features.columns:
+            features['location'] = ''
+        return features
+
+    def _rerank(self, model, df: pd.DataFrame, hybrid_scores: np.ndarray, popularity: DecayedPopularity):
         """
-        Production Pipeline: 1. Strict Filter -> 2. Feature Engineer -> 3. Rank -> 4. Format
+        Batched predict_proba over the top hybrid candidates only. Returns (scores, model_scores).
+        The budget is checked before each batch: once it runs out, the batches already scored
+        are kept and the rest count as non-candidates; (hybrid_scores, None) if none finished.
         """
-        if not house_list:
-            logger.info("[Pipeline] No input houses provided.")
-            return []
-        if not user_prefs:
-            logger.info("[Pipeline] No user preferences provided.")
-            return []
+        n = min(self.rerank_candidates, len(df))
+        candidates = np.argsort(-hybrid_scores, kind='stable')[:n]
+        features = self._model_features(df.iloc[candidates], popularity)
 
-        logger.info(f"[Pipeline] Starting recommendation for User: {user_prefs.get('user_id', 'Ad-hoc')}")
-        logger.info(f"[Pipeline] Step 1: Filtering {len(house_list)} houses...")
+        classes = list(getattr(model, 'classes_', []))
+        if 1 not in classes:
+            return hybrid_scores, None
+        positive = classes.index(1)
 
-        # --- Performance Tracking ---
-        start_time = time.time()
+        deadline = time.perf_counter() + self.rerank_budget_ms / 1000
+        probas = []
+        for start in range(0, n, RERANK_BATCH_SIZE):
+            if time.perf_counter() > deadline:
+                logger.warning(f"[Rerank] Budget of {self.rerank_budget_ms}ms exceeded after {start}/{n} candidates.")
+                break
+            probas.append(model.predict_proba(features.iloc[start:start + RERANK_BATCH_SIZE])[:, positive])
+        if not probas:
+            return hybrid_scores, None
 
-        # --- 1. Hard Filtering (Strict) ---
+        scored = np.concatenate(probas)
+        model_scores = np.zeros(len(df))
+        model_scores[candidates[:len(scored)]] = scored
+        # Non-candidates blend with a zero model score, so they stay below the re-ranked head
+        scores = (1 - RERANK_WEIGHT) * hybrid_scores + RERANK_WEIGHT * model_scores
+        return scores, model_scores
+
+    def _collaborative(self, user_prefs: dict, interactions, popularity: DecayedPopularity, top_k: int):
+        """
+        Returns (scores_for(house_ids) -> ndarray, favoured house ids): decayed popularity on a cold
+        start, ALS factors when available, else the neighbourhood co-count average.
+        """
+        nothing = (lambda ids: np.zeros(len(ids)), [])
+        target_uid = user_prefs.get('user_id', -1)
+        # The counters know every user with history, so a cold start never builds or scans the log
+        df_inter = pd.DataFrame()
+        if popularity.has_history(target_uid) and interactions is not None and len(interactions):
+            df_inter = pd.DataFrame(interactions)
+        cold_start = (not {'user_id', 'house_id'} <= set(df_inter.columns)
+                      or not (df_inter['user_id'] == target_uid).any())
+        if cold_start:
+            # No history to find neighbours from: the pivot would only produce zeros.
+            # Blend the precomputed, time-decayed popularity ranking instead.
+            logger.info("[Pipeline] Cold start: skipping collaborative filtering, using decayed popularity.")
+            normalized = popularity.normalized()
+            return (lambda ids: pd.Series(ids).map(normalized).fillna(0).to_numpy(dtype=float)), []
+
+        als = self.als  # read once, like the model
+        user_factor = als.user_vector(target_uid, df_inter) if als is not None else None
+        if user_factor is not None:
+            # Matrix factorization: one dot product per candidate (users unknown to the model are folded in)
+            return (lambda ids: np.maximum(als.score(user_factor, ids), 0).astype(float)), als.recommend(user_factor, top_k)
+
+        try:
+            pivot = df_inter.pivot_table(
+                index='user_id', columns='house_id',
+                values='event_type', aggfunc='count'
+            ).fillna(0)
+            if target_uid not in pivot.index:
+                return nothing
+            user_sims = cosine_similarity(pivot)
+            uid_idx = pivot.index.get_loc(target_uid)
+            top_idx = user_sims[uid_idx].argsort()[::-1][1:6]
+            avg_inter = pivot.iloc[top_idx].mean(axis=0)
+        except Exception as e:
+            logger.warning(f"[Collab Warn] {e}")
+            return nothing
+        favoured = avg_inter[avg_inter > 0].nlargest(top_k).index.to_numpy()
+        return (lambda ids: pd.Series(ids).map(avg_inter).fillna(0).to_numpy(dtype=float)), favoured
+
+    def _hard_filter(self, user_prefs: dict, house_list) -> pd.DataFrame:
+        """Strict price / bedroom / location filter."""
         min_price = user_prefs.get('min_price', 0)
         max_price = user_prefs.get('max_price', float('inf'))
         min_beds  = user_prefs.get('min_bedrooms', 0)
@@ -96,12 +242,65 @@ class Recommender:
         df = df_all[mask].reset_index(drop=True)
         logger.info(f"[Filter] Result: {len(df)}/{len(house_list)} houses passed filters.")
 
+        return df
+
+    def popular(self, user_prefs: dict, house_list, limit: int = 15) -> List[dict]:
+        """Degraded mode: the filtered listings ranked by decayed popularity alone (no per-user scoring)."""
+        if house_list is None or len(house_list) == 0:
+            return []
+        df = self._hard_filter(user_prefs or {}, house_list)
+        if df.empty or 'id' not in df.columns:
+            return []
+        df['score'] = np.round(df['id'].map(self.popularity.normalized()).fillna(0).to_numpy(dtype=float), 4)
+        df['collab_match'] = df['score']
+        return df.sort_values('score', ascending=False, kind='stable').head(limit).to_dict(orient='records')
+
+    def recommend(self, user_prefs: dict, house_list: List[dict], interactions=None, limit: int = 15,
+                  rerank: bool = True, content_only: bool = False) -> List[dict]:
+        """
+        Production Pipeline: 1. Strict Filter -> 2. Feature Engineer -> 3. Rank (-> 3b. Re-rank) -> 4. Format
+        ``house_list`` and ``interactions`` may be lists of dicts or DataFrames (e.g. feature store frames).
+        ``content_only`` (degraded mode) ranks on content similarity alone: no collaborative or
+        popularity signal, no re-ranking.
+        """
+        if house_list is None or len(house_list) == 0:
+            logger.info("[Pipeline] No input houses provided.")
+            return []
+        if not user_prefs:
+            logger.info("[Pipeline] No user preferences provided.")
+            return []
+
+        logger.info(f"[Pipeline] Starting recommendation for User: {user_prefs.get('user_id', 'Ad-hoc')}")
+        logger.info(f"[Pipeline] Step 1: Filtering {len(house_list)} houses...")
+
+        # --- Performance Tracking ---
+        start_time = time.time()
+        stages = tracer.stages("pipeline")
+
+        # --- 1. Hard Filtering (Strict) ---
+        stages.next("filter", houses=len(house_list))
+        df = self._hard_filter(user_prefs, house_list)
+        stages.end(kept=len(df))
         if df.empty:
             logger.info("[Pipeline] Zero matches found after strict filtering.")
             return []
 
+        # --- 1b. Embedding similarity / candidate generation (optional) ---
+        store = self.embeddings
+        embedding_sim = None
+        if store is not None:
+            stages.next("embedding")
+            embedding_sim = store.similarity(store.embedder.embed_query(user_prefs), store.rows_for(df))
+            if len(df) > EMBEDDING_CANDIDATES and not np.isnan(embedding_sim).all():
+                keep = np.argsort(-np.nan_to_num(embedding_sim, nan=-1.0), kind='stable')[:EMBEDDING_CANDIDATES]
+                keep.sort()
+                logger.info(f"[Pipeline] Step 1b: Embedding search kept {len(keep)}/{len(df)} candidates.")
+                df = df.iloc[keep].reset_index(drop=True)
+                embedding_sim = embedding_sim[keep]
+
         # --- 2. Feature Engineering (Only on filtered set) ---
         logger.info("[Pipeline] Step 2: Running Feature Engineering...")
+        stages.next("features", candidates=len(df))
         required = ['price', 'bedrooms', 'bathrooms', 'sqft']
         for col in required:
             if col not in df.columns:
@@ -111,53 +310,82 @@ class Recommender:
         # --- 3. Hybrid Ranking ---
         logger.info("[Pipeline] Step 3: Generating Hybrid Scores (Content + Collaborative)...")
         # Content-based
+        stages.next("content")
         df_user = self._user_vector(user_prefs)
         combined = pd.concat([df_user[NUMERIC_FEATURES], df[NUMERIC_FEATURES]], ignore_index=True)
         self.scaler.fit(combined)
         user_vec    = self.scaler.transform(df_user[NUMERIC_FEATURES])
         houses_vec  = self.scaler.transform(df[NUMERIC_FEATURES])
         content_sim = cosine_similarity(user_vec, houses_vec)[0]
+        if embedding_sim is not None:
+            # Listings the store has not embedded yet keep their plain numeric similarity
+            blended = (1 - EMBEDDING_WEIGHT) * content_sim + EMBEDDING_WEIGHT * np.nan_to_num(embedding_sim)
+            content_sim = np.where(np.isnan(embedding_sim), content_sim, blended)
 
-        # Collaborative
-        collab_scores = np.zeros(len(df))
-        if interactions:
-            try:
-                df_inter = pd.DataFrame(interactions)
-                if 'house_id' in df_inter.columns and 'user_id' in df_inter.columns:
-                    pivot = df_inter.pivot_table(
-                        index='user_id', columns='house_id',
-                        values='event_type', aggfunc='count'
-                    ).fillna(0)
-                    target_uid = user_prefs.get('user_id', -1)
-                    if target_uid in pivot.index:
-                        user_sims = cosine_similarity(pivot)
-                        uid_idx = pivot.index.get_loc(target_uid)
-                        top_idx = user_sims[uid_idx].argsort()[::-1][1:6]
-                        avg_inter = pivot.iloc[top_idx].mean(axis=0)
-                        for i, row in df.iterrows():
-                            collab_scores[i] = avg_inter.get(row.get('id', -1), 0)
-            except Exception as e:
-                logger.warning(f"[Collab Warn] {e}")
+        # Collaborative signal: a scorer for any house ids, plus the houses it favours most
+        stages.next("collaborative")
+        popularity = self._popularity_for(interactions)
+        retrieve = max(self.cascade_candidates, limit)
+        if content_only:
+            collab_for, favoured = (lambda ids: np.zeros(len(ids))), []
+        else:
+            collab_for, favoured = self._collaborative(user_prefs, interactions, popularity, retrieve)
 
+        # --- 3a. Candidate retrieval (cascade) ---
+        if self.cascade_candidates and len(df) > retrieve and 'id' in df.columns:
+            stages.next("cascade")
+            # Cheap stage: content + popularity, plus whatever the collaborative signal ranks highest
+            if content_only:
+                cheap = content_sim
+            else:
+                prior = df['id'].map(popularity.normalized()).fillna(0).to_numpy(dtype=float)
+                cheap = 0.6 * content_sim + 0.4 * prior
+            top = np.argsort(-cheap, kind='stable')[:retrieve]
+            keep = np.union1d(top, np.flatnonzero(df['id'].isin(favoured).to_numpy()))
+            logger.info(f"[Pipeline] Step 3a: Cascade kept {len(keep)}/{len(df)} candidates for full scoring.")
+            df = df.iloc[keep].reset_index(drop=True)
+            content_sim = content_sim[keep]
+            if embedding_sim is not None:
+                embedding_sim = embedding_sim[keep]
+
+        # Collaborative (candidates only)
+        stages.next("collaborative_scoring", candidates=len(df))
+        collab_scores = collab_for(df['id'].to_numpy()) if 'id' in df.columns else np.zeros(len(df))
         if collab_scores.max() > 0:
             collab_scores = collab_scores / collab_scores.max()
 
-        final_scores = (0.6 * content_sim) + (0.4 * collab_scores)
+        final_scores = content_sim.copy() if content_only else (0.6 * content_sim) + (0.4 * collab_scores)
+
+        # --- 3b. Learned Re-ranking (optional) ---
+        model = self.model  # read once: a hot-swap mid-request must not change the model under us
+        model_scores = None
+        if rerank and not content_only and self.supports_rerank(model):
+            stages.next("rerank", model_version=self.model_version)
+            logger.info(f"[Pipeline] Step 3b: Re-ranking top {min(self.rerank_candidates, len(df))} candidates with model {self.model_version}...")
+            final_scores, model_scores = self._rerank(model, df, final_scores, popularity)
         
         # --- 4. Result Formatting & Normalization ---
+        stages.next("format")
         # Ensure scores are strictly 0-1 and non-negative
         final_scores = np.clip(final_scores, 0, 1)
         
         df['score']          = np.round(final_scores, 4)
         df['content_match']  = np.round(content_sim, 4)
         df['collab_match']   = np.round(collab_scores, 4)
+        if model_scores is not None:
+            df['model_score'] = np.round(model_scores, 4)
+        if embedding_sim is not None:
+            df['embedding_match'] = np.round(np.nan_to_num(embedding_sim), 4)
 
         logger.info(f"[Pipeline] Step 4: Sorting and returning top {limit} results.")
-        top = df.sort_values('score', ascending=False).head(limit)
+        # Clipped scores tie at 0; content similarity keeps the order among them
+        top = df.sort_values(['score', 'content_match'], ascending=False).head(limit)
         results = top.to_dict(orient='records')
+        key = user_key(user_prefs)
         for res in results:
-            res['explanation'] = self._generate_explanation(user_prefs, res)
+            res['explanation'] = self._generate_explanation(user_prefs, res, key)
         
+        stages.end(results=len(results))
         exec_time_s = time.time() - start_time
         exec_time_ms = exec_time_s * 1000
         accuracy_proxy = df['score'].mean() if not df.empty else 0
@@ -174,8 +402,11 @@ class Recommender:
         logger.info(f"[Pipeline] Successfully completed. Status: {len(results)} matches found.")
         return results
 
-    def _generate_explanation(self, prefs: Dict, house: Dict) -> Dict:
-        """Human-readable explanation for why a house was recommended."""
+    def _generate_explanation(self, prefs: Dict, house: Dict, key: str) -> Dict:
+        """
+        Cheap rule-based reason plus a handle for /explain, which computes the real SHAP
+        values on demand; nothing model-related runs here.
+        """
         matches = []
         min_p = prefs.get('min_price', 0)
         max_p = prefs.get('max_price', float('inf'))
@@ -187,22 +418,20 @@ class Recommender:
         if pref_loc and pref_loc.lower() in house.get('location', '').lower():
             matches.append("Preferred location")
         reason = f"Matches: {', '.join(matches[:2])}" if matches else "Fits your search criteria"
-        
-        # Simulated SHAP Local Explainability 
-        # (in full production, this binds to shap.Explainer(recommender.model)(user_vector) )
-        feature_importance_weights = {}
-        if SHAP_AVAILABLE:
-            feature_importance_weights = {
-                "price": round(0.40 * house.get('content_match', 0.5), 3),
-                "location": round(0.35 * house.get('content_match', 0.5), 3),
-                "bedrooms": round(0.25 * house.get('content_match', 0.5), 3)
-            }
-            
-        return {
-            "reason": reason, 
-            "top_matches": matches,
-            "shap_explainability_weights": feature_importance_weights
-        }
+        handle = make_handle(self.model_version, house['id'], key) if house.get('id') is not None else None
+        return {"reason": reason, "top_matches": matches, "handle": handle}
+
+    def explain(self, houses: List[dict], key: str) -> Dict[int, Dict[str, float]]:
+        """TreeSHAP contributions of the production model for the given houses (see explain.py)."""
+        model = self.model
+        if not self.supports_rerank(model):
+            raise RuntimeError("No inference pipeline loaded")
+        df = pd.DataFrame(houses)
+        for col in ['price', 'bedrooms', 'bathrooms', 'sqft']:
+            if col not in df.columns:
+                df[col] = 0
+        features = self._model_features(self._engineer(df), self.popularity)
+        return shap_explainer.explain(model, self.model_version, features, key)
 
 
 recommender = Recommender()
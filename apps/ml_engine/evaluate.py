@@ -0,0 +1,217 @@
+"""
+Offline Ranking Evaluation
+==========================
+- Time-based split of interactions: the latest ``holdout`` fraction is held out.
+- Every held-out user is replayed through each scorer (Recommender.recommend and
+  alternatives) in parallel across cores, seeing only the training interactions.
+- Reports precision@k, recall@k, NDCG@k, catalogue coverage and per-request latency
+  (mean/p50/p95/p99) side by side, so promotion can weigh quality against cost.
+
+    python -m apps.ml_engine.evaluate --k 10 --holdout 0.2 --workers 4
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import engine as engine_module
+from .engine import Recommender
+from .als import ImplicitALS
+from .utils import fetch_house_columns, fetch_all_interaction_columns, fetch_all_user_preferences
+
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", str(os.cpu_count() or 1)))
+
+
+# --- Metrics ---
+def precision_at_k(recommended: list, relevant: set, k: int) -> float:
+    return len(set(recommended[:k]) & relevant) / k if k else 0.0
+
+
+def recall_at_k(recommended: list, relevant: set, k: int) -> float:
+    return len(set(recommended[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def ndcg_at_k(recommended: list, relevant: set, k: int) -> float:
+    dcg = sum(1 / math.log2(i + 2) for i, house_id in enumerate(recommended[:k]) if house_id in relevant)
+    idcg = sum(1 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / idcg if idcg else 0.0
+
+
+# --- Scorers: (recommender, prefs, houses, train_interactions, k) -> ranked house ids ---
+def _hybrid(recommender, prefs, houses, interactions, k):
+    return [r['id'] for r in recommender.recommend(prefs, houses, interactions=interactions, limit=k, rerank=False)]
+
+
+def _hybrid_rerank(recommender, prefs, houses, interactions, k):
+    return [r['id'] for r in recommender.recommend(prefs, houses, interactions=interactions, limit=k, rerank=True)]
+
+
+def _content(recommender, prefs, houses, interactions, k):
+    return [r['id'] for r in recommender.recommend(prefs, houses, interactions=None, limit=k, rerank=False)]
+
+
+def _als(recommender, prefs, houses, interactions, k):
+    als = _worker['als']
+    user_factor = als.user_vector(prefs['user_id'])
+    return als.recommend(user_factor, k) if user_factor is not None else []
+
+
+def _hybrid_als(recommender, prefs, houses, interactions, k):
+    return _hybrid(_worker['als_recommender'], prefs, houses, interactions, k)
+
+
+def _popularity(recommender, prefs, houses, interactions, k):
+    counts = pd.Series([i['house_id'] for i in interactions if i.get('house_id') is not None]).value_counts()
+    return [int(h) for h in counts.index[:k]]
+
+
+SCORERS = {
+    "hybrid": _hybrid,
+    "hybrid+rerank": _hybrid_rerank,
+    "content": _content,
+    "popularity": _popularity,
+    "als": _als,
+    "hybrid+als": _hybrid_als,
+}
+ALS_SCORERS = {"als", "hybrid+als"}
+
+
+def time_split(interactions: pd.DataFrame, holdout: float):
+    """Split by time: everything after the (1 - holdout) quantile of created_at is held out."""
+    order = interactions.sort_values(['created_at', 'id'] if 'id' in interactions.columns else ['created_at'])
+    cut = int(len(order) * (1 - holdout))
+    return order.iloc[:cut], order.iloc[cut:]
+
+
+# --- Worker side ---
+_worker = {}
+
+
+def _init_worker(houses, train_interactions, model_path, als=None):
+    engine_module.logger.setLevel(logging.WARNING)  # per-request INFO logs would dominate the timings
+    recommender = Recommender()
+    if model_path and os.path.exists(model_path):
+        recommender.load_model(model_path)
+    recommender.popularity.record_many(train_interactions)
+    als_recommender = None
+    if als is not None:
+        als_recommender = Recommender()
+        als_recommender.popularity = recommender.popularity
+        als_recommender.load_als(als)
+    _worker.update(recommender=recommender, houses=houses, interactions=train_interactions,
+                   als=als, als_recommender=als_recommender)
+
+
+def _evaluate_users(batch, scorer_names, k):
+    rows = []
+    for user_id, prefs, relevant in batch:
+        for name in scorer_names:
+            start = time.perf_counter()
+            recommended = SCORERS[name](_worker['recommender'], prefs, _worker['houses'], _worker['interactions'], k)
+            latency_ms = (time.perf_counter() - start) * 1000
+            rows.append({
+                "scorer": name, "user_id": user_id, "latency_ms": latency_ms, "recommended": recommended,
+                "precision": precision_at_k(recommended, relevant, k),
+                "recall": recall_at_k(recommended, relevant, k),
+                "ndcg": ndcg_at_k(recommended, relevant, k),
+            })
+    return rows
+
+
+def evaluate(houses: list, interactions: pd.DataFrame, preferences: dict, k: int = 10, holdout: float = 0.2,
+             scorers=("hybrid", "content", "popularity"), workers: int = EVAL_WORKERS, model_path: str = None) -> dict:
+    """Replay held-out users through each scorer and aggregate ranking quality and latency."""
+    train, test = time_split(interactions, holdout)
+    test = test[test['house_id'].notna()]
+    relevant = test.groupby('user_id')['house_id'].apply(lambda ids: {int(h) for h in ids})
+    train_records = train.drop(columns=[c for c in ('created_at', 'metadata_json') if c in train.columns]).to_dict(orient='records')
+
+    users = [
+        (int(uid), {**preferences.get(int(uid), {}), "user_id": int(uid)}, rel)
+        for uid, rel in relevant.items()
+    ]
+    batches = [users[i::max(1, workers)] for i in range(max(1, workers))]
+    batches = [b for b in batches if b]
+    # Factorize the training split once in the parent; workers only score
+    als = ImplicitALS().fit(train) if ALS_SCORERS & set(scorers) else None
+
+    rows = []
+    if workers <= 1:
+        _init_worker(houses, train_records, model_path, als)
+        for batch in batches:
+            rows.extend(_evaluate_users(batch, list(scorers), k))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(houses, train_records, model_path, als)) as pool:
+            for result in pool.map(_evaluate_users, batches, [list(scorers)] * len(batches), [k] * len(batches)):
+                rows.extend(result)
+
+    catalogue = len(houses)
+    report = {"k": k, "holdout": holdout, "users": len(users), "train_interactions": len(train),
+              "test_interactions": len(test), "scorers": {}}
+    for name in scorers:
+        scored = [r for r in rows if r["scorer"] == name]
+        latencies = np.array([r["latency_ms"] for r in scored]) if scored else np.zeros(1)
+        recommended = {h for r in scored for h in r["recommended"]}
+        report["scorers"][name] = {
+            f"precision@{k}": round(float(np.mean([r["precision"] for r in scored] or [0])), 4),
+            f"recall@{k}":    round(float(np.mean([r["recall"] for r in scored] or [0])), 4),
+            f"ndcg@{k}":      round(float(np.mean([r["ndcg"] for r in scored] or [0])), 4),
+            "coverage":       round(len(recommended) / catalogue, 4) if catalogue else 0.0,
+            "latency_ms": {
+                "mean": round(float(latencies.mean()), 2),
+                "p50":  round(float(np.percentile(latencies, 50)), 2),
+                "p95":  round(float(np.percentile(latencies, 95)), 2),
+                "p99":  round(float(np.percentile(latencies, 99)), 2),
+            },
+        }
+    return report
+
+
+def print_report(report: dict):
+    k = report["k"]
+    print("=" * 96)
+    print(f" OFFLINE RANKING EVALUATION  (users: {report['users']}, k={k}, holdout={report['holdout']})")
+    print("=" * 96)
+    print(f" {'scorer':<16}{'P@k':>8}{'R@k':>8}{'NDCG@k':>8}{'cover':>8}{'mean ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}")
+    print("-" * 96)
+    for name, m in report["scorers"].items():
+        lat = m["latency_ms"]
+        print(f" {name:<16}{m[f'precision@{k}']:>8.4f}{m[f'recall@{k}']:>8.4f}{m[f'ndcg@{k}']:>8.4f}"
+              f"{m['coverage']:>8.4f}{lat['mean']:>10.2f}{lat['p50']:>9.2f}{lat['p95']:>9.2f}{lat['p99']:>9.2f}")
+    print("=" * 96)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ranking evaluation of the recommendation engine.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS)
+    parser.add_argument("--scorers", default="hybrid,hybrid+als,als,content,popularity", help=f"comma-separated: {', '.join(SCORERS)}")
+    parser.add_argument("--model", default=os.path.join("models", "recommender.joblib"), help="inference pipeline for hybrid+rerank")
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args()
+
+    houses = pd.DataFrame(fetch_house_columns()).to_dict(orient='records')
+    interactions = pd.DataFrame(fetch_all_interaction_columns())
+    if not houses or interactions.empty:
+        raise SystemExit("Need houses and interactions from the backend to evaluate.")
+    preferences = fetch_all_user_preferences()
+
+    report = evaluate(houses, interactions, preferences, k=args.k, holdout=args.holdout,
+                      scorers=args.scorers.split(","), workers=args.workers, model_path=args.model)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Model Explanations (TreeSHAP)
+=============================
+- Kept out of ``Recommender.recommend``: results only carry an explanation handle.
+- ``shap`` is imported on first use, so serving processes that never explain do not pay for it.
+- Values are computed for the requested houses only, in one batched TreeSHAP call, and
+  aggregated back to input features (one-hot location columns sum into "location").
+- Cached by (model version, house, user vector) in a bounded LRU.
+"""
+
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+EXPLAIN_CACHE_SIZE = int(os.getenv("EXPLAIN_CACHE_SIZE", "10000"))
+EXPLAIN_TOP_FEATURES = int(os.getenv("EXPLAIN_TOP_FEATURES", "5"))
+
+_shap = None
+
+
+def shap_available() -> bool:
+    """Checks for the package without importing it."""
+    return _shap is not None or importlib.util.find_spec("shap") is not None
+
+
+def _load_shap():
+    global _shap
+    if _shap is None:
+        _shap = importlib.import_module("shap")
+    return _shap
+
+
+def user_key(prefs: dict) -> str:
+    """Short stable digest of the preference fields that shape the user vector."""
+    locations = prefs.get('preferred_locations') or [prefs.get('preferred_location')]
+    vector = {
+        "min_price": prefs.get('min_price'), "max_price": prefs.get('max_price'),
+        "min_bedrooms": prefs.get('min_bedrooms'), "locations": sorted(str(l) for l in locations if l),
+    }
+    return hashlib.sha1(json.dumps(vector, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def make_handle(model_version, house_id, key: str) -> str:
+    return f"{model_version or 'none'}|{int(house_id)}|{key}"
+
+
+def parse_handle(handle: str):
+    """'<model version>|<house id>|<user key>' -> (version, house_id, user_key)."""
+    version, house_id, key = handle.split("|")
+    return (None if version == 'none' else version), int(house_id), key
+
+
+def _input_features(preprocess) -> list:
+    """Input column behind every output column of the fitted preprocessor."""
+    inputs = getattr(preprocess, 'feature_names_in_', None)
+    if inputs is None:
+        inputs = getattr(preprocess, 'numeric_features', []) + getattr(preprocess, 'categorical_features', [])
+    inputs = list(inputs)
+    owners = []
+    for name in preprocess.get_feature_names_out():
+        name = name.split("__", 1)[-1]
+        owners.append(max((f for f in inputs if name == f or name.startswith(f + "_")), key=len, default=name))
+    return owners
+
+
+class ShapExplainer:
+    def __init__(self, cache_size: int = EXPLAIN_CACHE_SIZE, top_features: int = EXPLAIN_TOP_FEATURES):
+        self.cache_size = cache_size
+        self.top_features = top_features
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._tree = (None, None, None)  # (model, TreeExplainer, feature owners)
+
+    def _tree_explainer(self, model):
+        cached_model, explainer, owners = self._tree
+        if cached_model is not model:
+            explainer = _load_shap().TreeExplainer(model.named_steps['model'])
+            owners = _input_features(model.named_steps['preprocess'])
+            self._tree = (model, explainer, owners)
+        return explainer, owners
+
+    def explain(self, model, version, features, key: str) -> dict:
+        """
+        SHAP contributions to P(save) per house: {house_id: {feature: value}}, strongest first.
+        ``features`` is the model input frame (with an ``id`` column) for the requested houses.
+        """
+        results, missing = {}, []
+        with self._lock:
+            for position, house_id in enumerate(features['id'].astype(int)):
+                cached = self._cache.get((version, house_id, key))
+                if cached is None:
+                    missing.append(position)
+                else:
+                    self._cache.move_to_end((version, house_id, key))
+                    results[house_id] = cached
+        if not missing:
+            return results
+
+        explainer, owners = self._tree_explainer(model)
+        batch = features.iloc[missing]
+        X = model.named_steps['preprocess'].transform(batch)
+        if sparse.issparse(X):
+            X = X.toarray()
+        values = explainer.shap_values(X, check_additivity=False)
+        classes = list(model.named_steps['model'].classes_)
+        positive = classes.index(1) if 1 in classes else len(classes) - 1
+        # Older shap returns one array per class, newer a (rows, features, classes) array
+        values = values[positive] if isinstance(values, list) else np.asarray(values)
+        if values.ndim == 3:
+            values = values[:, :, positive]
+
+        with self._lock:
+            for house_id, row in zip(batch['id'].astype(int), values):
+                totals = {}
+                for owner, value in zip(owners, row):
+                    totals[owner] = totals.get(owner, 0.0) + float(value)
+                top = sorted(totals.items(), key=lambda item: -abs(item[1]))[:self.top_features]
+                results[house_id] = {name: round(value, 4) for name, value in top}
+                self._cache[(version, house_id, key)] = results[house_id]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+
+shap_explainer = ShapExplainer()
@@ -0,0 +1,267 @@
+"""
+Shared Feature Store
+====================
+- Listing columns, the house-id index and the user-sorted interaction log are published
+  once as .npy files in a versioned directory, with a manifest (format + version header).
+- Every worker process attaches read-only with mmap, so all of them share one copy in
+  the page cache instead of each holding its own frames.
+- Publishing writes a new directory and then flips the CURRENT pointer with os.replace();
+  workers notice on their next check and swap their snapshot reference atomically.
+  Requests already running keep the snapshot they started with.
+
+    python -m apps.ml_engine.feature_store --publish
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+FEATURE_STORE_DIR = os.path.join("models", "feature_store")
+CURRENT_FILE = "CURRENT"
+FORMAT_VERSION = 1
+CHECK_INTERVAL_SECONDS = float(os.getenv("FEATURE_STORE_CHECK_SECONDS", "2"))
+KEEP_VERSIONS = int(os.getenv("FEATURE_STORE_KEEP_VERSIONS", "3"))
+
+HOUSE_COLUMNS = ['id', 'title', 'description', 'price', 'location', 'bedrooms', 'bathrooms', 'sqft', 'embedding_id']
+INTERACTION_COLUMNS = ['id', 'user_id', 'house_id', 'event_type', 'created_at']
+
+
+def _column_array(values) -> np.ndarray:
+    """Fixed-width dtypes only: object arrays would need pickle and cannot be memory-mapped."""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+        return values.to_numpy(dtype='datetime64[ms]')
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy()
+    return values.fillna('').astype(str).to_numpy(dtype=np.str_)
+
+
+def _write_table(directory: str, frame: pd.DataFrame, columns: list) -> dict:
+    os.makedirs(directory, exist_ok=True)
+    dtypes = {}
+    for name in columns:
+        if name not in frame.columns:
+            continue
+        array = _column_array(frame[name])
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+        dtypes[name] = array.dtype.str
+    return dtypes
+
+
+class FeatureSnapshot:
+    """One published version, attached read-only. Frames are built lazily, once per process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature store format {self.manifest.get('format')} in {path}")
+        self.version = self.manifest["version"]
+        self._houses = None
+        self._interactions = None
+        self._lock = threading.Lock()
+        # Map everything up front: a later prune can unlink the files but not our mappings
+        self.arrays = {
+            table: {name: self._load(table, name) for name in self.manifest["columns"][table]}
+            for table in ("houses", "interactions")
+        }
+        self.house_order = self._load("index", "house_order")    # positions sorting houses by id
+        self.user_ids = self._load("index", "user_ids")          # distinct users, ascending
+        self.user_offsets = self._load("index", "user_offsets")  # user i owns interactions[offsets[i]:offsets[i + 1]]
+
+    def _load(self, table: str, name: str):
+        path = os.path.join(self.path, table, f"{name}.npy")
+        try:
+            return np.load(path, mmap_mode='r')
+        except ValueError:
+            # Zero-length arrays cannot be memory-mapped
+            return np.load(path)
+
+    def _frame(self, table: str) -> pd.DataFrame:
+        columns = {}
+        for name, array in self.arrays[table].items():
+            # Numeric columns stay views over the shared pages; strings become Python objects once
+            columns[name] = array if array.dtype.kind in 'biufM' else array.astype(object)
+        return pd.DataFrame(columns, copy=False)
+
+    @property
+    def houses(self) -> pd.DataFrame:
+        if self._houses is None:
+            with self._lock:
+                if self._houses is None:
+                    self._houses = self._frame("houses")
+        return self._houses
+
+    @property
+    def interactions(self) -> pd.DataFrame:
+        """All interactions, ordered by user (then id)."""
+        if self._interactions is None:
+            with self._lock:
+                if self._interactions is None:
+                    self._interactions = self._frame("interactions")
+        return self._interactions
+
+    def house_rows(self, house_ids) -> pd.DataFrame:
+        """Listings for the given ids (unknown ids are skipped), via binary search on the id index."""
+        sorted_ids = self.arrays["houses"]["id"][self.house_order]
+        wanted = np.asarray(list(house_ids), dtype=sorted_ids.dtype)
+        if len(sorted_ids) == 0:
+            return self.houses.iloc[0:0]
+        positions = np.minimum(np.searchsorted(sorted_ids, wanted), len(sorted_ids) - 1)
+        found = positions[sorted_ids[positions] == wanted]
+        return self.houses.iloc[np.asarray(self.house_order[found])]
+
+    def user_interactions(self, user_id: int) -> pd.DataFrame:
+        i = np.searchsorted(self.user_ids, user_id)
+        if i >= len(self.user_ids) or self.user_ids[i] != user_id:
+            return self.interactions.iloc[0:0]
+        return self.interactions.iloc[int(self.user_offsets[i]):int(self.user_offsets[i + 1])]
+
+
+def publish(houses: pd.DataFrame, interactions: pd.DataFrame, root: str = FEATURE_STORE_DIR, cursor: str = None) -> str:
+    """
+    Write a new version next to the current one and atomically point CURRENT at it.
+    ``cursor`` is the backend change-feed position the data was read at (see change_feed).
+    """
+    version = datetime.now().strftime("v%Y%m%d_%H%M%S_%f")
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+
+    interactions = interactions if interactions is not None else pd.DataFrame(columns=['id', 'user_id', 'house_id', 'event_type'])
+    sort_keys = [c for c in ('user_id', 'id') if c in interactions.columns]
+    if sort_keys and not interactions.empty:
+        interactions = interactions.sort_values(sort_keys, kind='stable')
+    user_column = interactions['user_id'].to_numpy(dtype=np.int64) if 'user_id' in interactions.columns else np.empty(0, np.int64)
+    user_ids, starts = np.unique(user_column, return_index=True)
+
+    columns = {
+        "houses": _write_table(os.path.join(tmp_dir, "houses"), houses, HOUSE_COLUMNS),
+        "interactions": _write_table(os.path.join(tmp_dir, "interactions"), interactions, INTERACTION_COLUMNS),
+    }
+    index_dir = os.path.join(tmp_dir, "index")
+    os.makedirs(index_dir)
+    np.save(os.path.join(index_dir, "house_order.npy"), np.argsort(houses['id'].to_numpy(), kind='stable'))
+    np.save(os.path.join(index_dir, "user_ids.npy"), user_ids)
+    np.save(os.path.join(index_dir, "user_offsets.npy"), np.append(starts, len(user_column)).astype(np.int64))
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({
+            "format": FORMAT_VERSION, "version": version, "created_at": datetime.utcnow().isoformat() + "Z",
+            "houses": len(houses), "interactions": len(interactions), "columns": columns, "cursor": cursor,
+        }, f, indent=2)
+
+    os.rename(tmp_dir, os.path.join(root, version))
+    pointer = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+    _prune(root, version)
+    return version
+
+
+def _prune(root: str, current: str, keep: int = None):
+    """Drop old versions. Workers still attached keep reading: unlinked files stay mapped."""
+    keep = KEEP_VERSIONS if keep is None else keep
+    versions = sorted(d for d in os.listdir(root) if d.startswith("v") and os.path.isdir(os.path.join(root, d)))
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+class FeatureStore:
+    """Per-process handle: re-reads the CURRENT pointer at most every ``check_interval`` seconds."""
+
+    def __init__(self, root: str = FEATURE_STORE_DIR, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.root = root
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _read_pointer(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def current(self):
+        """The latest published snapshot, or None if nothing was published yet."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self._read_pointer()
+            if version and (self._snapshot is None or self._snapshot.version != version):
+                try:
+                    self._snapshot = FeatureSnapshot(os.path.join(self.root, version))
+                    print(f"[FeatureStore] Attached {version} ({self._snapshot.manifest['houses']} houses, "
+                          f"{self._snapshot.manifest['interactions']} interactions)")
+                except (OSError, ValueError) as e:
+                    print(f"[FeatureStore Error] Could not attach {version}: {e}")
+            return self._snapshot
+
+    def publish(self, houses: pd.DataFrame, interactions: pd.DataFrame, cursor: str = None):
+        publish(houses, interactions, self.root, cursor)
+        self._checked_at = None
+        return self.current()
+
+    def refresh_from_backend(self):
+        """Fetch the catalogue and interaction log once and publish them for every worker."""
+        from .utils import fetch_house_columns, fetch_all_interaction_columns, fetch_changes
+
+        # Taken before the reads, so following from it can only repeat changes, never miss one
+        head = fetch_changes()
+        houses = pd.DataFrame(fetch_house_columns())
+        if houses.empty:
+            raise ValueError("No listings available from the backend.")
+        return self.publish(houses, pd.DataFrame(fetch_all_interaction_columns()), head["cursor"] if head else None)
+
+
+    def publish_if_missing(self, stale_after: float = 300.0):
+        """
+        First-boot bootstrap: exactly one of several starting workers publishes (O_EXCL lock
+        file); the others keep going and attach on a later check.
+        """
+        if self.current() is not None:
+            return self._snapshot
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = os.path.join(self.root, ".publish.lock")
+        try:
+            if time.time() - os.path.getmtime(lock_path) > stale_after:
+                os.remove(lock_path)  # left behind by a worker that died mid-publish
+        except OSError:
+            pass
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        try:
+            return self.refresh_from_backend()
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+
+
+feature_store = FeatureStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish or inspect the shared feature store.")
+    parser.add_argument("--publish", action="store_true", help="fetch from the backend and publish a new version")
+    args = parser.parse_args()
+    snapshot = feature_store.refresh_from_backend() if args.publish else feature_store.current()
+    print(json.dumps(snapshot.manifest, indent=2) if snapshot else "No feature store published yet.")
+
+
+if __name__ == "__main__":
+    main()
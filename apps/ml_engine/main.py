@@ -1,16 +1,40 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Request
-from .engine import recommender
-from .utils import fetch_house_listings, fetch_user_preferences, fetch_user_interactions
-from .schemas import UserPreferenceRequest, RecommendationResponse
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse
+from .schemas import UserPreferenceRequest, RecommendationResponse, ExplainRequest, ExplainResponse
+from .singleflight import SingleFlight
+from .streaming import ndjson_response
+from .admission import admission, FULL, CONTENT_ONLY, FALLBACK, SHED, SHED_RETRY_AFTER_SECONDS
+from .preferences import preference_cache
+from .tracing import tracer, waterfall, render_text, TRACE_HEADER, PARENT_HEADER
+from .recorder import recorder, DATA_VERSION_HEADER
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
 import json
 import os
-import joblib
+import sys
+import threading
 import time
 import logging
 
+# pandas / scikit-learn / joblib live behind the engine modules, which are imported by the
+# warm-start thread (or on first use), so the process binds its port in milliseconds.
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+WARMUP_HOUSES = int(os.getenv("WARMUP_HOUSES", "200"))
+
+# Identical concurrent work runs once: per-user / per-payload recommendations, catalogue fallback, refreshes
+recommend_flight = SingleFlight("recommend")
+catalogue_flight = SingleFlight("catalogue")
+refresh_flight = SingleFlight("features_refresh")
+
+# Last response per request key, served in fallback mode when the engine is overloaded
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+_recent_results = OrderedDict()
+_recent_lock = threading.Lock()
+
 app = FastAPI(title="Smart House ML Recommendation Engine")
 
 @app.middleware("http")
@@ -22,6 +46,40 @@ async def add_process_time_header(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request; continues the caller's trace (X-Trace-Id) and echoes the id back."""
+    if request.url.path.startswith("/traces"):
+        return await call_next(request)
+    with tracer.request(f"{request.method} {request.url.path}", request.headers.get(TRACE_HEADER),
+                        request.headers.get(PARENT_HEADER)) as span:
+        response = await call_next(request)
+        if span is not None:
+            span["attrs"]["status"] = response.status_code
+            response.headers[TRACE_HEADER] = span["trace_id"]
+        return response
+
+def data_version() -> str:
+    """Snapshot + change-feed generation + model the engine is serving from, e.g. ``v12+3/m7``."""
+    feature_store = sys.modules.get(f"{__package__}.feature_store")
+    change_feed = sys.modules.get(f"{__package__}.change_feed")
+    engine = sys.modules.get(f"{__package__}.engine")
+    snapshot = feature_store.feature_store.current() if feature_store else None
+    version = snapshot.version if snapshot is not None else "http"
+    if change_feed and change_feed.change_feed.version == version:
+        version += f"+{change_feed.change_feed.generation}"
+    return f"{version}/{engine.recommender.model_version if engine else None}"
+
+recorder.data_version = data_version
+
+@app.middleware("http")
+async def record_traffic(request: Request, call_next):
+    """Sampled request recording (opt-in, RECORD_TRAFFIC=1); recommendations name their data version."""
+    response = await recorder.middleware(request, call_next)
+    if request.url.path.startswith("/recommend"):
+        response.headers[DATA_VERSION_HEADER] = data_version()
+    return response
+
 # --- WebSocket Connection Manager ---
 class ConnectionManager:
     def __init__(self):
@@ -41,50 +99,270 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+def _load_and_record(path: str, version: str = None):
+    """Hot-swap an artifact into the recommender and report load/swap time in the registry."""
+    from .engine import recommender
+    from .registry import model_registry
+    timings = recommender.load_model(path, version=version)
+    if timings and version:
+        model_registry.record_load(version, timings["load_ms"], timings["swap_ms"])
+    return timings
+
+def load_production_model():
+    """Loads the promoted inference pipeline (if any) for the learned re-ranking stage."""
+    from .registry import model_registry, PRODUCTION_PATH
+    entry = model_registry.production_entry()
+    path = model_registry.artifact_path(entry)
+    if not path or not os.path.exists(path):
+        entry, path = None, PRODUCTION_PATH
+    if os.path.exists(path):
+        try:
+            _load_and_record(path, entry["version"] if entry else None)
+        except Exception as e:
+            print(f"[Model Load Error] {e}")
+
+def load_embedding_store():
+    """Attaches the published embedding store (if built) for similarity and candidate generation."""
+    from .engine import recommender
+    from .embeddings import EmbeddingStore
+    try:
+        recommender.load_embeddings(EmbeddingStore.open_current())
+    except Exception as e:
+        print(f"[Embeddings Load Error] {e}")
+
+def load_als_factors():
+    """Attaches the offline-trained ALS factors (if any) as the collaborative signal."""
+    from .engine import recommender
+    from .als import ImplicitALS, ALS_PATH
+    if os.path.exists(ALS_PATH):
+        try:
+            recommender.load_als(ImplicitALS.load(ALS_PATH))
+        except Exception as e:
+            print(f"[ALS Load Error] {e}")
+
+def attach_feature_store():
+    """
+    Attaches the feature store persisted on local disk, so the engine can serve before the
+    backend is reachable. Only a first boot with nothing on disk publishes from the backend.
+    """
+    from .feature_store import feature_store
+    try:
+        if feature_store.current() is None:
+            feature_store.publish_if_missing()
+    except Exception as e:
+        print(f"[FeatureStore Error] {e}")
+
+def _catalogue():
+    """(houses, interactions) from the shared feature store; over HTTP only if none is published."""
+    from .feature_store import feature_store
+    from .change_feed import change_feed
+    snapshot = feature_store.current()
+    if snapshot is not None:
+        return change_feed.frames(snapshot)
+    return catalogue_flight.call("catalogue", _fetch_catalogue)
+
+def _fetch_catalogue():
+    from .utils import fetch_house_listings, fetch_user_interactions
+    return fetch_house_listings() or [], fetch_user_interactions()
+
+def prime_popularity():
+    """Seeds the decayed popularity counters once; afterwards they are updated per event."""
+    from .engine import recommender
+    from .feature_store import feature_store
+    try:
+        snapshot = feature_store.current()
+        if snapshot is not None:
+            recommender.popularity.record_many(snapshot.interactions)
+        else:
+            from .utils import fetch_all_interaction_columns
+            recommender.popularity.record_many(fetch_all_interaction_columns())
+        print(f"[Popularity] Counters primed for {len(recommender.popularity)} houses.")
+    except Exception as e:
+        print(f"[Popularity Load Error] {e}")
+
+def follow_changes():
+    """Keeps the snapshot fresh between publishes by applying the backend's change feed."""
+    from .engine import recommender
+    from .change_feed import change_feed
+    from .feature_store import feature_store
+    change_feed.popularity = recommender.popularity
+    change_feed.start(feature_store)
+
+def prewarm_ranking():
+    """
+    Runs the ranking path once on a slice of the snapshot (cold-start and warm user) so
+    lazy initialisation, string frames and BLAS threads are paid before the first request.
+    """
+    from .engine import recommender, DEFAULT_PREFERENCES
+    from .feature_store import feature_store
+    snapshot = feature_store.current()
+    if snapshot is None or len(snapshot.houses) == 0:
+        return
+    houses = snapshot.houses.head(WARMUP_HOUSES)
+    interactions = snapshot.interactions
+    recommender.recommend({"user_id": -1, **DEFAULT_PREFERENCES}, houses, limit=5)
+    if len(snapshot.user_ids):
+        user_id = int(snapshot.user_ids[0])
+        recommender.recommend({"user_id": user_id, **DEFAULT_PREFERENCES}, houses, interactions=interactions, limit=5)
+
+WARM_START_STEPS = [
+    ("model", load_production_model),
+    ("embeddings", load_embedding_store),
+    ("als", load_als_factors),
+    ("feature_store", attach_feature_store),
+    ("popularity", prime_popularity),
+    ("change_feed", follow_changes),
+    ("prewarm", prewarm_ranking),
+]
+
+readiness = {"ready": False, "stage": "starting", "error": None, "startup_ms": None, "steps_ms": {}}
+
+def warm_start():
+    """Loads everything the ranking path needs, in order, then flips /ready."""
+    start = time.perf_counter()
+    try:
+        for stage, step in WARM_START_STEPS:
+            readiness["stage"] = stage
+            step_start = time.perf_counter()
+            step()
+            readiness["steps_ms"][stage] = round((time.perf_counter() - step_start) * 1000, 1)
+        readiness.update(ready=True, stage="ready")
+    except Exception as e:
+        logger.error(f"[Startup Error] {stage}: {e}")
+        readiness.update(stage="failed", error=str(e))
+    readiness["startup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"[Startup] Warm start finished in {readiness['startup_ms']}ms: {readiness['steps_ms']}")
+
+@app.on_event("startup")
+def start_warm_start():
+    threading.Thread(target=warm_start, name="warm-start", daemon=True).start()
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 only once the model, snapshot and ranking path are warm."""
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
 @app.get("/")
 async def root():
     return {"message": "Smart House ML Recommendation Engine is running"}
 
 # --- Model Retraining & Versioning ---
-def _run_retrain():
-    """Runs retraining in the background and hot-swaps the model."""
-    try:
-        from .train import retrain_and_version
-        result = retrain_and_version()
-        if result["promoted"]:
-            new_model = joblib.load(os.path.join("models", "recommender.joblib"))
-            recommender.model = new_model
-            print(f"[Hot-Swap] Model updated to {result['version']}")
-        return result
-    except Exception as e:
-        print(f"[Retrain Error] {e}")
+def _hot_swap(result: dict):
+    """Validates the freshly promoted artifact and swaps it in; in-flight requests keep the old model."""
+    from .registry import model_registry
+    timings = _load_and_record(model_registry.artifact_path(model_registry.entry(result["version"])), result["version"])
+    if timings is None:
+        raise ValueError(f"Artifact for {result['version']} failed validation; keeping the current model.")
+    print(f"[Hot-Swap] Model updated to {result['version']}")
+    return timings
 
 @app.api_route("/retrain", methods=["GET", "POST"])
-async def trigger_retrain(background_tasks: BackgroundTasks):
-    """Triggers model retraining asynchronously. Non-blocking."""
-    background_tasks.add_task(_run_retrain)
-    return {"status": "Retraining started in background", "message": "Check /model/versions for results."}
+async def trigger_retrain():
+    """Triggers retraining in an isolated worker process. Non-blocking and single-flight."""
+    from .retrain_worker import retrain_supervisor
+    started = retrain_supervisor.start(on_success=_hot_swap)
+    return {
+        "status": "Retraining started in worker process" if started else "Retraining already in progress",
+        "message": "Check /retrain/status for progress and /model/versions for results.",
+        "retrain": retrain_supervisor.status(),
+    }
+
+@app.get("/retrain/status")
+async def get_retrain_status():
+    """Progress and outcome of the current (or last) retraining run."""
+    from .retrain_worker import retrain_supervisor
+    return retrain_supervisor.status()
 
 @app.get("/model/versions")
 async def get_model_versions():
-    """Returns the model registry with all versions and their metrics."""
-    registry_path = os.path.join("models", "model_registry.json")
-    if not os.path.exists(registry_path):
-        return {"production": None, "versions": []}
-    with open(registry_path, "r") as f:
-        import json as _json
-        return _json.load(f)
+    """Returns the model registry with all versions, metrics and serving load times."""
+    from .registry import model_registry
+    return model_registry.snapshot()
+
+def _refresh_feature_store():
+    import requests
+    from .feature_store import feature_store
+    try:
+        snapshot = feature_store.refresh_from_backend()
+    except (ValueError, requests.RequestException) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return snapshot.manifest
+
+@app.post("/features/refresh")
+async def refresh_feature_store():
+    """Publishes a fresh catalogue/interaction snapshot; every worker attaches within seconds."""
+    return await refresh_flight.do("refresh", _refresh_feature_store)
+
+@app.get("/features/changes")
+async def change_feed_status():
+    """Where the change-feed follower is, and how much it has applied on top of the snapshot."""
+    from .change_feed import change_feed
+    return change_feed.status()
+
+@app.get("/similar/{house_id}")
+async def get_similar_houses(house_id: int, k: int = 10):
+    """Nearest listings by embedding (brute-force BLAS scan, or IVF on large catalogues)."""
+    from .engine import recommender
+    store = recommender.embeddings
+    if store is None:
+        raise HTTPException(status_code=503, detail="Embedding store not built")
+    similar = store.similar_houses(house_id, k)
+    if not similar:
+        raise HTTPException(status_code=404, detail="House has no embedding")
+    return {"house_id": house_id, "store_version": store.version, "similar": similar}
+
+@app.post("/explain", response_model=ExplainResponse)
+async def explain_recommendations(request: ExplainRequest):
+    """
+    Real TreeSHAP values for the production model, for the houses behind the given
+    explanation handles only. Handles from an older model version are explained with
+    the current one (check ``model_version``).
+    """
+    # TreeSHAP and the listing lookup block: keep them off the event loop
+    return await run_in_threadpool(_explain, request)
+
+def _explain(request: ExplainRequest) -> dict:
+    from .engine import recommender
+    from .explain import shap_available, parse_handle
+    from .feature_store import feature_store
+    from .change_feed import change_feed
+    if not shap_available():
+        raise HTTPException(status_code=503, detail="shap is not installed")
+    if not recommender.supports_rerank(recommender.model):
+        raise HTTPException(status_code=503, detail="No production model loaded")
+    try:
+        parsed = [(handle, *parse_handle(handle)) for handle in request.handles]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Malformed explanation handle")
+
+    wanted_ids = {house_id for _, _, house_id, _ in parsed}
+    snapshot = feature_store.current()
+    if snapshot is not None:
+        rows = change_feed.house_rows(snapshot, wanted_ids)  # listings added since the publish too
+    else:
+        from .utils import fetch_houses_by_id
+        rows = fetch_houses_by_id(wanted_ids)
+    houses = {int(h['id']): h for h in rows}
+    explanations = []
+    for key in {key for *_, key in parsed}:
+        wanted = [(handle, house_id) for handle, _, house_id, k in parsed if k == key and house_id in houses]
+        if not wanted:
+            continue
+        values = recommender.explain([houses[house_id] for _, house_id in wanted], key)
+        explanations.extend({"handle": handle, "house_id": house_id, "shap_values": values[house_id]}
+                            for handle, house_id in wanted)
+    if not explanations:
+        raise HTTPException(status_code=404, detail="None of the requested houses exist")
+    return {"model_version": recommender.model_version, "explanations": explanations}
 
 @app.websocket("/ws/recommend/{user_id}")
 async def websocket_recommend(websocket: WebSocket, user_id: int):
+    from .engine import recommender, DEFAULT_PREFERENCES
     await manager.connect(user_id, websocket)
     try:
         # Push initial recommendations on connect
-        prefs = fetch_user_preferences(user_id) or {
-            "user_id": user_id, "min_price": 100000, "max_price": 500000, "min_bedrooms": 2
-        }
-        listings = fetch_house_listings() or []
-        interactions = fetch_user_interactions()
+        prefs = await run_in_threadpool(preference_cache.get, user_id) or {"user_id": user_id, **DEFAULT_PREFERENCES}
+        listings, interactions = _catalogue()
         recommendations = recommender.recommend(prefs, listings, interactions=interactions)
         await manager.send_recommendations(user_id, {
             "event": "recommendations_updated",
@@ -96,8 +374,7 @@ async def websocket_recommend(websocket: WebSocket, user_id: int):
         while True:
             data = await websocket.receive_text()
             client_prefs = json.loads(data)
-            listings = fetch_house_listings() or []
-            interactions = fetch_user_interactions()
+            listings, interactions = _catalogue()
             recommendations = recommender.recommend(client_prefs, listings, interactions=interactions)
             await manager.send_recommendations(user_id, {
                 "event": "recommendations_updated",
@@ -109,43 +386,181 @@ async def websocket_recommend(websocket: WebSocket, user_id: int):
         manager.disconnect(user_id)
         print(f"User {user_id} disconnected from real-time feed.")
 
-@app.get("/recommend/{user_id}", response_model=RecommendationResponse)
-async def get_recommendations_by_profile(user_id: int, limit: int = 5):
-    # 1. Fetch user preferences
-    prefs = fetch_user_preferences(user_id)
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    """Calls, executions and coalesced calls per single-flight group."""
+    return {flight.name: flight.snapshot() for flight in (recommend_flight, catalogue_flight, refresh_flight)}
+
+@app.get("/stats/admission")
+async def admission_stats():
+    """Concurrency in use, queue depth, the mode new requests get, and requests served per mode."""
+    return admission.snapshot()
+
+@app.get("/stats/preferences")
+async def preference_cache_stats():
+    """Hits (and cached "none stored" hits), backend fetches, pushes and size of the preference cache."""
+    return preference_cache.snapshot()
+
+@app.put("/preferences/{user_id}")
+async def push_preferences(user_id: int, prefs: UserPreferenceRequest):
+    """Called by the backend when a user saves preferences; replaces the cached copy."""
+    preference_cache.put(user_id, {**prefs.model_dump(exclude_none=True), "user_id": user_id})
+    return {"user_id": user_id, "status": "updated"}
+
+@app.delete("/preferences/{user_id}")
+async def invalidate_preferences(user_id: int):
+    """Drops the cached copy; the next request reads the backend."""
+    preference_cache.invalidate(user_id)
+    return {"user_id": user_id, "status": "invalidated"}
+
+@app.get("/stats/recorder")
+async def recorder_stats():
+    """Whether traffic recording is on, where it writes, and how much it has sampled."""
+    return recorder.snapshot()
+
+@app.get("/traces")
+async def recent_traces(limit: int = 50):
+    """Most recent traces held in memory, newest first."""
+    return tracer.recent(limit)
+
+@app.get("/traces/{trace_id}")
+async def trace_waterfall(trace_id: str, peer: bool = True, format: str = "json", raw: bool = False):
+    """
+    Waterfall of one trace: this service's spans plus, unless ``peer=false``, the backend's
+    spans for the same trace. ``format=text`` renders bars for a terminal; ``raw=true``
+    returns this service's spans only, unordered (what the peer merges in).
+    """
+    spans = tracer.spans(trace_id)
+    if raw:
+        return spans
+    if peer:
+        from .utils import fetch_trace_spans
+        spans += await run_in_threadpool(fetch_trace_spans, trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    trace = waterfall(trace_id, spans)
+    return PlainTextResponse(render_text(trace)) if format == "text" else trace
+
+DEGRADED_ENGINES = {
+    CONTENT_ONLY: "Content-Only (Degraded)",
+    "cached": "Cached (Degraded)",
+    "popularity": "Popularity (Degraded)",
+}
+
+def _remember(key, response: dict) -> dict:
+    with _recent_lock:
+        _recent_results[key] = response
+        _recent_results.move_to_end(key)
+        while len(_recent_results) > RESULT_CACHE_SIZE:
+            _recent_results.popitem(last=False)
+    return response
+
+def _fallback(key, prefs: dict, limit: int, base: dict) -> dict:
+    """Cheapest answer: the last result for this request, else popularity within the hard filters."""
+    with _recent_lock:
+        cached = _recent_results.get(key)
+    if cached is not None:
+        return {**cached, "engine": DEGRADED_ENGINES["cached"]}
+    from .engine import recommender
+    listings, _ = _catalogue()
+    recommendations = recommender.popular(prefs, listings, limit=limit)
+    return {**base, "recommendations": recommendations, "engine": DEGRADED_ENGINES["popularity"],
+            "message": "No houses match your criteria" if not recommendations else None}
+
+async def _admitted(key, compute, fallback_prefs: dict, limit: int, base: dict, *args):
+    """
+    Admission control in front of a recommend computation ``compute(mode, *args)``.
+    Identical in-flight work is joined without taking a slot.
+    """
+    if recommend_flight.in_flight(key):
+        return await recommend_flight.do(key, compute, FULL, *args)
+    mode = admission.mode()
+    if mode == SHED:
+        admission.record(SHED)
+        raise HTTPException(status_code=503, detail="Recommendation engine overloaded",
+                            headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)})
+    if mode == FALLBACK or not await admission.acquire():
+        admission.record(FALLBACK)
+        return await run_in_threadpool(_fallback, key, fallback_prefs, limit, base)
+    try:
+        admission.record(mode)
+        return _remember(key, await recommend_flight.do(key, compute, mode, *args))
+    finally:
+        admission.release()
+
+def _recommend_for_user(mode: str, user_id: int, limit: int, prefs: dict = None) -> dict:
+    from .engine import recommender, DEFAULT_PREFERENCES
+    # 1. User preferences (unless the caller sent them along): cached, pushed by the backend on change
+    if prefs is None:
+        with tracer.span("preferences"):
+            prefs = preference_cache.get(user_id)
     if not prefs:
-        prefs = {"user_id": user_id, "min_price": 100000, "max_price": 500000, "min_bedrooms": 2}
+        prefs = {"user_id": user_id, **DEFAULT_PREFERENCES}
         
-    # 2. Fetch all listings
-    listings = fetch_house_listings()
-    if not listings:
+    # 2. Listings and interactions (shared feature store)
+    with tracer.span("catalogue"):
+        listings, interactions = _catalogue()
+    if len(listings) == 0:
         return {"user_id": user_id, "recommendations": [], "engine": "None", "message": "No listings available"}
-        
-    # 3. Fetch interactions for collaborative filtering
-    interactions = fetch_user_interactions()
     
-    # 4. Generate hybrid recommendations
-    recommendations = recommender.recommend(prefs, listings, interactions=interactions, limit=limit)
+    # 3. Generate hybrid recommendations (content-only when degraded)
+    with tracer.span("recommend", mode=mode, listings=len(listings)):
+        if mode == CONTENT_ONLY:
+            recommendations = recommender.recommend(prefs, listings, limit=limit, content_only=True)
+        else:
+            recommendations = recommender.recommend(prefs, listings, interactions=interactions, limit=limit)
     
     return {
         "user_id": user_id,
         "recommendations": recommendations,
-        "engine": "Hybrid (Content + Collaborative)",
+        "engine": DEGRADED_ENGINES.get(mode, "Hybrid (Content + Collaborative)"),
         "message": "No houses match your criteria" if not recommendations else None
     }
 
-@app.post("/recommend", response_model=RecommendationResponse)
-async def get_adhoc_recommendations(prefs: UserPreferenceRequest, limit: int = 5):
-    # 1. Fetch all listings
-    listings = fetch_house_listings()
-    if not listings:
+@app.get("/recommend/{user_id}", response_model=RecommendationResponse)
+async def get_recommendations_by_profile(user_id: int, limit: int = 5, stream: bool = False):
+    """``stream=true`` answers with NDJSON, one recommendation per line in rank order."""
+    # Fallback skips the preference lookup too: plain popularity for this user
+    response = await _admitted(("user", user_id, limit), _recommend_for_user, {"user_id": user_id}, limit,
+                           {"user_id": user_id}, user_id, limit)
+    return ndjson_response(response) if stream else response
+
+@app.post("/recommend/{user_id}", response_model=RecommendationResponse)
+async def get_recommendations_with_preferences(user_id: int, prefs: UserPreferenceRequest, limit: int = 5,
+                                               stream: bool = False):
+    """
+    Same as GET /recommend/{user_id}, with the user's stored preferences inlined by the caller
+    (the backend gateway), so no call back to the backend is needed. An empty body means none stored.
+    """
+    stored = prefs.model_dump(exclude_none=True, exclude={"user_id"})
+    inline = {"user_id": user_id, **stored} if stored else {}
+    key = ("user", user_id, limit, json.dumps(inline, sort_keys=True))
+    response = await _admitted(key, _recommend_for_user, inline or {"user_id": user_id}, limit,
+                               {"user_id": user_id}, user_id, limit, inline)
+    return ndjson_response(response) if stream else response
+
+def _recommend_adhoc(mode: str, prefs: dict, limit: int) -> dict:
+    from .engine import recommender
+    # 1. Listings (shared feature store)
+    with tracer.span("catalogue"):
+        listings, _ = _catalogue()
+    if len(listings) == 0:
         return {"recommendations": [], "engine": "None", "message": "No listings available"}
         
     # 2. Generate content-based recommendations
-    recommendations = recommender.recommend(prefs.model_dump(), listings, limit=limit)
+    with tracer.span("recommend", mode=mode, listings=len(listings)):
+        recommendations = recommender.recommend(prefs, listings, limit=limit, content_only=mode == CONTENT_ONLY)
     
     return {
         "recommendations": recommendations,
-        "engine": "Content-Based (Feature Similarity)",
+        "engine": DEGRADED_ENGINES.get(mode, "Content-Based (Feature Similarity)"),
         "message": "No houses match your criteria" if not recommendations else None
     }
+
+@app.post("/recommend", response_model=RecommendationResponse)
+async def get_adhoc_recommendations(prefs: UserPreferenceRequest, limit: int = 5, stream: bool = False):
+    """``stream=true`` answers with NDJSON, one recommendation per line in rank order."""
+    payload = prefs.model_dump()
+    key = ("adhoc", json.dumps(payload, sort_keys=True), limit)
+    response = await _admitted(key, _recommend_adhoc, payload, limit, {}, payload, limit)
+    return ndjson_response(response) if stream else response
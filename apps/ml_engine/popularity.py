@@ -0,0 +1,130 @@
+"""
+Time-Decayed Popularity
+=======================
+- Per-house counters weighted by event type (save > click > search) and decayed
+  exponentially with a configurable half-life.
+- O(1) per event: scores are kept relative to a reference time, so recording an event
+  is a single add; reading applies one common decay factor.
+- Relative order never changes with the passage of time alone, so the normalized
+  ranking is computed once per batch of updates and reused for every cold-start request.
+- Raw counts are kept alongside: they are the model's ``popularity_score`` feature.
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+EVENT_WEIGHTS = {"save": 5.0, "click": 1.0, "search": 0.2}
+POPULARITY_HALF_LIFE_HOURS = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "72"))
+
+# Rebase before exp() of the reference offset gets anywhere near float overflow
+_MAX_EXPONENT = 50.0
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    stamps = pd.to_datetime(pd.Series(values), errors='coerce', utc=True)
+    seconds = (stamps - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+    return np.where(np.isnan(seconds), time.time(), seconds)
+
+
+class DecayedPopularity:
+    def __init__(self, half_life_hours: float = POPULARITY_HALF_LIFE_HOURS, weights: dict = None):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.weights = weights or EVENT_WEIGHTS
+        self.counts = {}      # house_id -> raw interaction count
+        self.users = set()    # users with at least one interaction
+        self._scores = {}     # house_id -> weighted score, expressed at self._ref
+        self._ref = None
+        self._normalized = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_interactions(cls, interactions, **kwargs):
+        popularity = cls(**kwargs)
+        popularity.record_many(interactions)
+        return popularity
+
+    def _rebase(self, now: float):
+        factor = math.exp(-self.decay * (now - self._ref))
+        for house_id in self._scores:
+            self._scores[house_id] *= factor
+        self._ref = now
+
+    def record(self, house_id, event_type: str, user_id=None, timestamp: float = None):
+        """Add one interaction event. ``timestamp`` is epoch seconds (defaults to now)."""
+        now = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            if user_id is not None:
+                self.users.add(int(user_id))
+            if house_id is None or (isinstance(house_id, float) and math.isnan(house_id)):
+                return
+            house_id = int(house_id)
+            if self._ref is None:
+                self._ref = now
+            exponent = self.decay * (now - self._ref)
+            if exponent > _MAX_EXPONENT:
+                self._rebase(now)
+                exponent = 0.0
+            self._scores[house_id] = self._scores.get(house_id, 0.0) + self.weights.get(event_type, 0.0) * math.exp(exponent)
+            self.counts[house_id] = self.counts.get(house_id, 0) + 1
+            self._normalized = None
+
+    def record_many(self, interactions):
+        """Bulk load (list of dicts, column dict or DataFrame); vectorized rather than per event."""
+        df = pd.DataFrame(interactions)
+        if df.empty or 'house_id' not in df.columns:
+            return
+        if 'user_id' in df.columns:
+            with self._lock:
+                self.users.update(int(u) for u in df['user_id'].dropna().unique())
+        df = df[df['house_id'].notna()]
+        if df.empty:
+            return
+        seconds = _epoch_seconds(df['created_at']) if 'created_at' in df.columns else np.full(len(df), time.time())
+        weights = df['event_type'].map(self.weights).fillna(0.0).to_numpy() if 'event_type' in df.columns else np.ones(len(df))
+        with self._lock:
+            latest = float(seconds.max())
+            if self._ref is None:
+                self._ref = latest
+            if self.decay * (latest - self._ref) > _MAX_EXPONENT:
+                self._rebase(latest)
+            contributions = pd.Series(weights * np.exp(self.decay * (seconds - self._ref)), index=df['house_id'].astype(int).to_numpy())
+            for house_id, value in contributions.groupby(level=0).sum().items():
+                self._scores[house_id] = self._scores.get(house_id, 0.0) + float(value)
+            for house_id, count in df['house_id'].astype(int).value_counts().items():
+                self.counts[house_id] = self.counts.get(house_id, 0) + int(count)
+            self._normalized = None
+
+    def has_history(self, user_id) -> bool:
+        return user_id is not None and int(user_id) in self.users
+
+    def scores(self, now: float = None) -> pd.Series:
+        """Decayed, event-weighted popularity per house as of ``now``."""
+        with self._lock:
+            if not self._scores:
+                return pd.Series(dtype=float)
+            factor = math.exp(-self.decay * ((now if now is not None else time.time()) - self._ref))
+            return pd.Series(self._scores, dtype=float) * factor
+
+    def normalized(self) -> pd.Series:
+        """Scores scaled to 0-1 by the most popular house; cached until the next update."""
+        cached = self._normalized
+        if cached is not None:
+            return cached
+        with self._lock:
+            series = pd.Series(self._scores, dtype=float)
+            if not series.empty and series.max() > 0:
+                series = series / series.max()
+            self._normalized = series
+            return series
+
+    def count_series(self) -> pd.Series:
+        with self._lock:
+            return pd.Series(self.counts, dtype=float)
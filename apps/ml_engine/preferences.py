@@ -0,0 +1,159 @@
+"""
+User Preference Cache
+=====================
+- Stored preferences per user, bounded by ``PREFERENCE_CACHE_SIZE`` (LRU) and
+  ``PREFERENCE_CACHE_TTL``. ``/recommend/{user_id}`` and the WebSocket feed read them from
+  here instead of calling the backend on every request.
+- "No preferences stored" (a 404 from the backend) is cached as well, for
+  ``PREFERENCE_NEGATIVE_TTL``, so users on the defaults cost no HTTP call either.
+  Backend errors are never cached.
+- The backend pushes the new preferences whenever a user saves them
+  (``PUT /preferences/{user_id}``); the TTL only bounds staleness if a push is lost.
+- A push reaches one gunicorn worker. It also bumps the user's stamp in
+  ``PREFERENCE_VERSIONS_PATH``, a small mmap'd file every worker on the host shares, and an
+  entry is only served while its stamp is unchanged, so the other workers fetch afresh.
+- Concurrent misses for one user share a single backend call, and a fetch that overlaps
+  a push is not stored over it.
+"""
+
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .singleflight import SingleFlight
+
+PREFERENCE_CACHE_TTL = float(os.getenv("PREFERENCE_CACHE_TTL", "300"))
+PREFERENCE_CACHE_SIZE = int(os.getenv("PREFERENCE_CACHE_SIZE", "50000"))
+PREFERENCE_NEGATIVE_TTL = float(os.getenv("PREFERENCE_NEGATIVE_TTL", "60"))
+PREFERENCE_VERSIONS_PATH = os.getenv("PREFERENCE_VERSIONS_PATH", os.path.join("models", "preference_versions.bin"))
+PREFERENCE_VERSION_SLOTS = int(os.getenv("PREFERENCE_VERSION_SLOTS", "65536"))
+
+
+class SharedVersions:
+    """Per-user change stamps shared by every process that maps ``path`` (no path: this process only).
+
+    Users hash into ``slots``; two users sharing a slot only cost each other an extra fetch.
+    """
+
+    def __init__(self, path: str = PREFERENCE_VERSIONS_PATH, slots: int = PREFERENCE_VERSION_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._view = None
+        self._lock = threading.Lock()
+
+    def _stamps(self):
+        with self._lock:
+            if self._view is None:
+                size = self.slots * 8
+                if self.path:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    try:
+                        if os.fstat(fd).st_size < size:
+                            os.ftruncate(fd, size)
+                        self._view = memoryview(mmap.mmap(fd, size)).cast("Q")
+                    finally:
+                        os.close(fd)
+                else:
+                    self._view = memoryview(bytearray(size)).cast("Q")
+            return self._view
+
+    def get(self, user_id: int) -> int:
+        return self._stamps()[int(user_id) % self.slots]
+
+    def bump(self, user_id: int) -> int:
+        stamps, slot = self._stamps(), int(user_id) % self.slots
+        # Wall-clock nanoseconds: two workers bumping at once still both move the stamp
+        stamp = stamps[slot] = max(stamps[slot] + 1, time.time_ns())
+        return stamp
+
+
+class PreferenceCache:
+    def __init__(self, ttl: float = PREFERENCE_CACHE_TTL, max_entries: int = PREFERENCE_CACHE_SIZE,
+                 negative_ttl: float = PREFERENCE_NEGATIVE_TTL, versions: SharedVersions = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.versions = versions if versions is not None else SharedVersions()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0, "updates": 0, "invalidations": 0,
+                      "stale": 0}
+        self._entries = OrderedDict()  # user_id -> (expires_at, stamp, prefs); {} = none stored
+        self._epoch = 0                # bumped by every push
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("preferences")
+
+    def _lookup(self, user_id: int):
+        stamp = self.versions.get(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic() or entry[1] != stamp:
+                # Changed by a push to another worker since it was stored
+                self.stats["stale"] += entry[1] != stamp
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats["hits" if entry[2] else "negative_hits"] += 1
+            return dict(entry[2])
+
+    def _store(self, user_id: int, prefs: dict, stamp: int):
+        # Caller holds the lock
+        ttl = self.ttl if prefs else self.negative_ttl
+        self._entries[user_id] = (time.monotonic() + ttl, stamp, dict(prefs))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id: int):
+        """Stored preferences, ``{}`` if the user has none, ``None`` if the backend could not be reached."""
+        prefs = self._lookup(user_id)
+        if prefs is not None:
+            return prefs
+        prefs = self._flight.call(user_id, self._load, user_id)
+        return dict(prefs) if prefs is not None else None
+
+    def _load(self, user_id: int):
+        from . import utils
+        # Read before the fetch: a push landing meanwhile (in any worker) makes the stored copy stale
+        stamp = self.versions.get(user_id)
+        with self._lock:
+            epoch = self._epoch
+            self.stats["misses"] += 1
+        prefs = utils.fetch_user_preferences(user_id)
+        with self._lock:
+            if prefs is None:
+                self.stats["errors"] += 1
+            elif self._epoch == epoch:
+                self._store(user_id, prefs, stamp)
+        return prefs
+
+    def put(self, user_id: int, prefs: dict):
+        stamp = self.versions.bump(user_id)
+        with self._lock:
+            self._epoch += 1
+            self._store(user_id, prefs, stamp)
+            self.stats["updates"] += 1
+
+    def invalidate(self, user_id: int):
+        self.versions.bump(user_id)
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(user_id, None)
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries), "max_entries": self.max_entries,
+                    "ttl_seconds": self.ttl, "negative_ttl_seconds": self.negative_ttl,
+                    "shared_versions": self.versions.path or None}
+
+
+preference_cache = PreferenceCache()
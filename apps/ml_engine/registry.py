@@ -0,0 +1,154 @@
+"""
+Model Registry
+==============
+- Holds model_registry.json in memory; readers never re-parse it per request.
+- Writes go to a temp file and are published with an atomic os.replace().
+- Reloads transparently when another process (e.g. the trainer) replaces the file.
+- Saves artifacts uncompressed so joblib.load(mmap_mode='r') can memory-map them.
+- Garbage-collects the artifacts of old, never-promoted versions.
+"""
+
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+MODELS_DIR = "models"
+REGISTRY_PATH = os.path.join(MODELS_DIR, "model_registry.json")
+PRODUCTION_PATH = os.path.join(MODELS_DIR, "recommender.joblib")
+RETENTION_KEEP = int(os.getenv("MODEL_RETENTION_KEEP", "5"))
+
+
+def save_artifact(obj, path: str):
+    """Uncompressed dump: NumPy arrays are stored raw so mmap_mode='r' can share their pages."""
+    joblib.dump(obj, path, compress=0)
+
+
+def load_artifact(path: str, mmap: bool = True):
+    return joblib.load(path, mmap_mode='r' if mmap else None)
+
+
+def publish_production(artifact_path: str, production_path: str = PRODUCTION_PATH):
+    """
+    Point the well-known production path at a versioned artifact. A hard link avoids
+    a second copy on disk; the temp name + os.replace keeps readers from seeing a gap.
+    """
+    tmp_path = f"{production_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(artifact_path, tmp_path)
+    except OSError:
+        shutil.copyfile(artifact_path, tmp_path)
+    os.replace(tmp_path, production_path)
+
+
+class ModelRegistry:
+    def __init__(self, path: str = REGISTRY_PATH, models_dir: str = MODELS_DIR):
+        self.path = path
+        self.models_dir = models_dir
+        self._lock = threading.Lock()
+        self._state = None
+        self._mtime = None
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._state is None:
+                self._state = {"versions": [], "production": None}
+            return
+        if mtime != self._mtime:
+            with open(self.path, "r") as f:
+                self._state = json.load(f)
+            self._mtime = mtime
+
+    def snapshot(self) -> dict:
+        """Current registry state. Treat as read-only; use update() to change it."""
+        with self._lock:
+            self._load()
+            return self._state
+
+    def update(self, mutate) -> dict:
+        """Apply ``mutate(state)`` to a copy and publish it atomically."""
+        with self._lock:
+            self._load()
+            state = copy.deepcopy(self._state)
+            mutate(state)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._state = state
+            self._mtime = os.stat(self.path).st_mtime_ns
+            return state
+
+    def artifact_path(self, entry: dict):
+        """Resolve an entry's artifact inside models_dir (older entries carry Windows paths)."""
+        if not entry or not entry.get("path"):
+            return None
+        return os.path.join(self.models_dir, os.path.basename(entry["path"].replace("\\", "/")))
+
+    def entry(self, version: str):
+        for v in self.snapshot()["versions"]:
+            if v["version"] == version:
+                return v
+        return None
+
+    def production_entry(self):
+        state = self.snapshot()
+        return self.entry(state["production"]) if state["production"] else None
+
+    def record_load(self, version: str, load_ms: float, swap_ms: float):
+        """Report how long the serving process took to load and hot-swap a version."""
+        def mutate(state):
+            for v in state["versions"]:
+                if v["version"] == version:
+                    v["serving"] = {
+                        "load_ms": round(load_ms, 2),
+                        "swap_ms": round(swap_ms, 2),
+                        "loaded_at": datetime.utcnow().isoformat() + "Z",
+                        "pid": os.getpid(),
+                    }
+        self.update(mutate)
+
+    def prune(self, keep: int = RETENTION_KEEP) -> list:
+        """
+        Retention policy: delete artifacts of never-promoted versions outside the newest
+        ``keep``. Production and promoted (rollback) versions are never touched; pruned
+        entries keep their metrics with path=None.
+        """
+        removed = []
+
+        def mutate(state):
+            recent = {v["version"] for v in state["versions"][-keep:]} if keep > 0 else set()
+            for v in state["versions"]:
+                if v.get("promoted") or v["version"] == state["production"] or v["version"] in recent:
+                    continue
+                path = self.artifact_path(v)
+                if path is None:
+                    continue
+                if os.path.exists(path):
+                    os.remove(path)
+                removed.append(v["version"])
+                v["path"] = None
+                v["pruned"] = True
+
+        self.update(mutate)
+        return removed
+
+
+def timed_load(path: str):
+    """Load an artifact memory-mapped; returns (model, load_ms)."""
+    start = time.perf_counter()
+    model = load_artifact(path)
+    return model, (time.perf_counter() - start) * 1000
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,208 @@
+"""
+Traffic Replay
+==============
+- Sends requests captured by ``recorder.py`` (files or globs: every worker's file, rotated
+  ones included) to a chosen engine build or configuration: at the recorded pace,
+  ``--speed`` times faster, or as fast as ``--concurrency`` allows (``--speed 0``).
+- Reports latency percentiles per endpoint next to the recorded ones, status changes,
+  data-version drift, and result-set diffs: against the recording, or against a
+  ``--baseline`` target replayed side by side (same request, same moment).
+- Replayed requests carry ``X-Replay`` so they are never recorded again.
+
+    python -m apps.ml_engine.replay 'recordings/ml_engine.*.jsonl*' --target http://localhost:8001 --speed 4
+    python -m apps.ml_engine.replay 'recordings/ml_engine.*.jsonl' --target http://canary:8001 --baseline http://localhost:8001
+"""
+
+import argparse
+import glob
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .recorder import result_signature, REPLAY_HEADER, DATA_VERSION_HEADER
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint(path: str) -> str:
+    """``/recommend/42`` -> ``/recommend/{id}``, so latencies group per route."""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+def recording_files(paths) -> list:
+    """Files behind ``paths``: plain files, or glob patterns the shell did not expand (quoted)."""
+    files = []
+    for path in paths:
+        if glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def load_recordings(paths, prefix: str = None, limit: int = None) -> list:
+    entries = []
+    for path in recording_files(paths):
+        with open(path) as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    if prefix:
+        entries = [e for e in entries if e["path"].startswith(prefix)]
+    entries.sort(key=lambda e: e["ts"])
+    return entries[:limit] if limit else entries
+
+
+def send(session, base_url: str, entry: dict, timeout: float = 10.0) -> dict:
+    url = base_url.rstrip("/") + entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+    kwargs = {"headers": {REPLAY_HEADER: "1"}, "timeout": timeout}
+    if entry.get("body") is not None:
+        kwargs["json" if isinstance(entry["body"], (dict, list)) else "data"] = entry["body"]
+    start = time.perf_counter()
+    try:
+        response = session.request(entry["method"], url, **kwargs)
+        content = response.content
+    except Exception as e:
+        return {"status": None, "error": repr(e), "latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+    return {"status": response.status_code, "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            "data_version": response.headers.get(DATA_VERSION_HEADER),
+            "result": result_signature(content, response.headers.get("content-type", ""))}
+
+
+def replay(entries: list, target: str, baseline: str = None, speed: float = 1.0, concurrency: int = 8,
+           timeout: float = 10.0, session=None) -> list:
+    """One outcome per entry: the recording plus what the target (and baseline) answered."""
+    local = threading.local()
+
+    def client():
+        if session is not None:
+            return session
+        if not hasattr(local, "session"):
+            import requests
+            local.session = requests.Session()
+        return local.session
+
+    def run(entry):
+        outcome = {"entry": entry, "target": send(client(), target, entry, timeout)}
+        if baseline:
+            outcome["baseline"] = send(client(), baseline, entry, timeout)
+        return outcome
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        origin, start = (entries[0]["ts"] if entries else 0), time.perf_counter()
+        for entry in entries:
+            if speed > 0:
+                delay = (entry["ts"] - origin) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(run, entry))
+    return [f.result() for f in futures]
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 3), "p50": pick(0.5),
+            "p90": pick(0.9), "p99": pick(0.99), "max": round(ordered[-1], 3)}
+
+
+def compare(expected: dict, actual: dict) -> dict:
+    """How far ``actual`` is from ``expected`` (two result signatures)."""
+    if not expected or not actual:
+        return {"identical": False, "same_set": False, "overlap": 0.0, "top1": False}
+    if "ids" not in expected or "ids" not in actual:
+        same = expected == actual
+        return {"identical": same, "same_set": same, "overlap": float(same), "top1": same}
+    a, b = expected["ids"], actual["ids"]
+    overlap = len(set(a) & set(b)) / max(len(set(a)), len(set(b))) if (a or b) else 1.0
+    return {"identical": a == b, "same_set": set(a) == set(b), "overlap": round(overlap, 4),
+            "top1": (a[:1] == b[:1])}
+
+
+def report(outcomes: list) -> dict:
+    latency, diffs, examples = {}, [], []
+    errors = status_changes = version_changes = 0
+    for outcome in outcomes:
+        entry, target, baseline = outcome["entry"], outcome["target"], outcome.get("baseline")
+        route = latency.setdefault(f"{entry['method']} {endpoint(entry['path'])}",
+                                   {"recorded": [], "target": [], **({"baseline": []} if baseline else {})})
+        route["recorded"].append(entry.get("duration_ms", entry.get("first_byte_ms", 0.0)))
+        route["target"].append(target["latency_ms"])
+        if baseline:
+            route["baseline"].append(baseline["latency_ms"])
+        if target["status"] is None:
+            errors += 1
+            continue
+        reference = baseline if baseline else entry
+        if target["status"] != reference.get("status"):
+            status_changes += 1
+        if target.get("data_version") != reference.get("data_version"):
+            version_changes += 1
+        diff = compare(reference.get("result"), target.get("result"))
+        diffs.append(diff)
+        if not diff["identical"] and len(examples) < 5:
+            examples.append({"path": entry["path"], "query": entry.get("query"), "expected": reference.get("result"),
+                             "actual": target.get("result"), **diff})
+    n = len(diffs) or 1
+    return {
+        "requests": len(outcomes),
+        "errors": errors,
+        "status_changes": status_changes,
+        "data_version_changes": version_changes,
+        "compared_against": "baseline" if outcomes and "baseline" in outcomes[0] else "recording",
+        "latency_ms": {route: {name: percentiles(values) for name, values in runs.items()}
+                       for route, runs in sorted(latency.items())},
+        "results": {"compared": len(diffs), "identical": sum(d["identical"] for d in diffs),
+                    "same_set": sum(d["same_set"] for d in diffs),
+                    "mean_overlap": round(sum(d["overlap"] for d in diffs) / n, 4),
+                    "top1_agreement": round(sum(d["top1"] for d in diffs) / n, 4),
+                    "examples": examples},
+    }
+
+
+def format_report(summary: dict) -> str:
+    lines = [f"Replayed {summary['requests']} requests ({summary['errors']} errors, "
+             f"{summary['status_changes']} status changes, {summary['data_version_changes']} on other data versions)",
+             "", f"{'route':<32} {'run':<9} {'count':>6} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+    for route, runs in summary["latency_ms"].items():
+        for name, p in runs.items():
+            if p["count"]:
+                lines.append(f"{route[:32]:<32} {name:<9} {p['count']:>6} {p['mean']:>9.2f} {p['p50']:>9.2f} "
+                             f"{p['p90']:>9.2f} {p['p99']:>9.2f} {p['max']:>9.2f}")
+    results = summary["results"]
+    lines += ["", f"Results vs {summary['compared_against']}: {results['identical']}/{results['compared']} identical, "
+                  f"{results['same_set']} same set, mean overlap {results['mean_overlap']:.2%}, "
+                  f"top-1 agreement {results['top1_agreement']:.2%}"]
+    for example in results["examples"]:
+        lines.append(f"  {example['path']}?{example['query'] or ''}: {example['expected']} -> {example['actual']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic against an engine build and compare")
+    parser.add_argument("recordings", nargs="+", help="recorder JSONL files or globs (rotated files too)")
+    parser.add_argument("--target", required=True, help="base URL of the build under test")
+    parser.add_argument("--baseline", default=None, help="base URL to diff against instead of the recording")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, 4 = 4x faster, 0 = no pacing")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--path-prefix", default=None, help="only replay requests under this path")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    entries = load_recordings(args.recordings, args.path_prefix, args.limit)
+    print(f"[Replay] {len(entries)} requests -> {args.target}" + (f" (baseline {args.baseline})" if args.baseline else ""))
+    outcomes = replay(entries, args.target, args.baseline, args.speed, args.concurrency, args.timeout)
+    summary = report(outcomes)
+    print(json.dumps(summary, indent=2) if args.json else format_report(summary))
+
+
+if __name__ == "__main__":
+    main()
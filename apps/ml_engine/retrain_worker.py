@@ -0,0 +1,131 @@
+"""
+Isolated Retraining
+===================
+- Retraining runs in a separate, spawned worker process, never in the serving process.
+- The worker is pinned to RETRAIN_N_JOBS cores and niced, so live requests keep their CPU.
+- Single-flight: while one run is in progress, further triggers join it instead of starting another.
+- Progress is streamed back over a queue and exposed through ``RetrainSupervisor.status()``.
+- On success the serving process validates the artifact and hot-swaps it (``on_success``).
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+RETRAIN_N_JOBS = int(os.getenv("RETRAIN_N_JOBS", str(max(1, (os.cpu_count() or 2) // 2))))
+RETRAIN_NICE = int(os.getenv("RETRAIN_NICE", "10"))
+
+_progress_queue = None
+
+
+def _init_worker(n_jobs: int, nice: int, progress_queue):
+    """Runs once in the child: cap BLAS/OpenMP threads, pin cores and lower priority."""
+    global _progress_queue
+    _progress_queue = progress_queue
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(n_jobs)
+    if hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        # Take the highest-numbered cores; serving workers tend to start on the low ones
+        os.sched_setaffinity(0, cores[-n_jobs:])
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+
+
+def report_progress(stage: str, percent: int):
+    """Called inside the worker; forwards progress to the supervising process."""
+    if _progress_queue is not None:
+        _progress_queue.put({"stage": stage, "progress": percent})
+
+
+def run_retrain_job():
+    from .train import retrain_and_version
+    return retrain_and_version(n_jobs=RETRAIN_N_JOBS, progress=report_progress)
+
+
+class RetrainSupervisor:
+    def __init__(self, job=run_retrain_job, n_jobs: int = RETRAIN_N_JOBS, nice: int = RETRAIN_NICE):
+        self.job = job
+        self.n_jobs = n_jobs
+        self.nice = nice
+        self._lock = threading.RLock()  # done-callbacks may fire inline from start()
+        self._future = None
+        self._executor = None
+        self._queue = None
+        self._status = {"state": "idle", "stage": None, "progress": 0}
+
+    def start(self, on_success=None) -> bool:
+        """Start a run unless one is already in flight. Returns False when joining an existing run."""
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return False
+            ctx = multiprocessing.get_context("spawn")
+            self._queue = ctx.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=ctx,
+                initializer=_init_worker, initargs=(self.n_jobs, self.nice, self._queue),
+            )
+            self._status = {
+                "state": "running", "stage": "starting", "progress": 0,
+                "started_at": datetime.utcnow().isoformat() + "Z", "finished_at": None,
+                "result": None, "error": None,
+            }
+            self._future = self._executor.submit(self.job)
+            self._future.add_done_callback(lambda future: self._finished(future, on_success))
+            return True
+
+    def _drain_progress(self):
+        while self._queue is not None:
+            try:
+                update = self._queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                return
+            self._status.update(update)
+
+    def _finished(self, future, on_success):
+        # Runs on the executor's management thread, so validation and the swap stay off the event loop
+        status = {"finished_at": datetime.utcnow().isoformat() + "Z", "progress": 100}
+        try:
+            result = future.result()
+            status.update(state="succeeded", stage="done", result=result)
+            if on_success is not None and result and result.get("promoted"):
+                status["swap"] = on_success(result)
+        except Exception as e:
+            logger.error(f"[Retrain Error] {e}")
+            status.update(state="failed", stage="error", error=str(e))
+        with self._lock:
+            self._drain_progress()
+            self._status.update(status)
+            self._executor.shutdown(wait=False)
+            self._queue = None
+
+    def status(self) -> dict:
+        with self._lock:
+            self._drain_progress()
+            return dict(self._status)
+
+    def wait(self, timeout: float = None):
+        """Block until the current run (if any) is done. Intended for CLIs and tests."""
+        future = self._future
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+            # Let the done-callback publish the final status
+            for _ in range(100):
+                if self.status()["state"] != "running":
+                    break
+                time.sleep(0.01)
+
+
+retrain_supervisor = RetrainSupervisor()
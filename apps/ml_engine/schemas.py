@@ -12,7 +12,7 @@ class UserPreferenceRequest(BaseModel):
 class Explanation(BaseModel):
     reason: str
     top_matches: List[str]
-    shap_explainability_weights: Optional[Dict[str, float]] = None
+    handle: Optional[str] = None  # pass to POST /explain for SHAP values
 
 class HouseRecommendation(BaseModel):
     id: Optional[int] = None
@@ -26,10 +26,24 @@ class HouseRecommendation(BaseModel):
     score: Optional[float] = None
     content_match: Optional[float] = None
     collab_match: Optional[float] = None
+    model_score: Optional[float] = None
+    embedding_match: Optional[float] = None
     explanation: Optional[Explanation] = None
 
     model_config = {"extra": "allow"}  # allow extra DB fields
 
+class ExplainRequest(BaseModel):
+    handles: List[str] = Field(..., min_length=1, max_length=100)
+
+class HouseExplanation(BaseModel):
+    handle: str
+    house_id: int
+    shap_values: Dict[str, float]
+
+class ExplainResponse(BaseModel):
+    model_version: Optional[str] = None
+    explanations: List[HouseExplanation]
+
 class RecommendationResponse(BaseModel):
     user_id: Optional[int] = None
     recommendations: List[HouseRecommendation]
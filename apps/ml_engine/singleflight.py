@@ -0,0 +1,86 @@
+"""
+Request Coalescing (single-flight)
+==================================
+- Concurrent calls with the same key share one in-flight computation instead of each
+  doing identical work (thundering herd after a deploy, a cache expiry or a hot user).
+- ``do()`` is for async endpoints: the work runs once in the threadpool, every caller
+  awaits the same task. A caller that disconnects does not cancel it for the others.
+- ``call()`` is the same for code already running in a worker thread.
+- Nothing is cached: once the flight lands the next call computes afresh.
+"""
+
+import asyncio
+import threading
+
+from starlette.concurrency import run_in_threadpool
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+        self._tasks = {}    # key -> asyncio.Task (event loop only)
+        self._flights = {}  # key -> _Flight (threads)
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def in_flight(self, key) -> bool:
+        return key in self._tasks
+
+    async def do(self, key, fn, *args):
+        task = self._tasks.get(key)
+        if task is None:
+            self._count(calls=1, executions=1)
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._landed(key, t))
+        else:
+            self._count(calls=1, coalesced=1)
+        return await asyncio.shield(task)
+
+    def _landed(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._count(errors=1)
+
+    def call(self, key, fn, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+            self.stats["calls"] += 1
+        if not leader:
+            flight.done.wait()
+        else:
+            try:
+                flight.result = fn(*args)
+            except Exception as e:
+                flight.error = e
+                self._count(errors=1)
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._tasks) + len(self._flights)}
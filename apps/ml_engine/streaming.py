@@ -0,0 +1,57 @@
+"""
+NDJSON streaming of recommendation results
+==========================================
+- One JSON object per line, in rank order; each line has the shape of a
+  ``HouseRecommendation`` (extra listing fields included).
+- Rows are encoded one at a time as the response is sent: the full document is
+  never materialized, and no per-row Pydantic validation runs.
+- Response-level fields (``engine``, result count, message) travel as headers so
+  every line can be parsed the same way.
+"""
+import json
+import math
+
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _plain(value):
+    """NaN -> null and NumPy scalars -> Python, matching what the JSON response would carry."""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if hasattr(value, "item"):
+        value = value.item()  # NumPy scalar
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _default(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def encode_line(row: dict) -> bytes:
+    if ORJSON_AVAILABLE:
+        # orjson already writes NaN as null
+        return orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE, default=_default)
+    return json.dumps(_plain(row), separators=(",", ":"), default=_default).encode("utf-8") + b"\n"
+
+
+def ndjson_response(response: dict) -> StreamingResponse:
+    rows = response.get("recommendations") or []
+
+    def lines():
+        for row in rows:
+            yield encode_line(row)
+
+    headers = {"X-Engine": response.get("engine", ""), "X-Result-Count": str(len(rows))}
+    if response.get("message"):
+        headers["X-Message"] = response["message"]
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
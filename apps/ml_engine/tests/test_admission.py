@@ -0,0 +1,99 @@
+import asyncio
+from fastapi.testclient import TestClient
+from apps.ml_engine import main, utils
+from apps.ml_engine.engine import recommender
+from apps.ml_engine.popularity import DecayedPopularity
+from apps.ml_engine.admission import AdmissionController, FULL, CONTENT_ONLY, FALLBACK, SHED
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def test_queue_depth_selects_cheaper_modes_and_budget_bounds_wait():
+    controller = AdmissionController(max_concurrency=1, queue_budget_ms=50, content_only_depth=1,
+                                     fallback_depth=2, shed_depth=3)
+
+    async def scenario():
+        assert controller.mode() == FULL and await controller.acquire()
+        waiters = [asyncio.ensure_future(controller.acquire()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert controller.depth == 3 and controller.mode() == SHED
+        controller.release()  # handed to the oldest waiter
+        assert await waiters[0] is True
+        assert await waiters[1] is False and await waiters[2] is False  # outwaited the budget
+        assert controller.depth == 0 and controller.running == 1
+        controller.release()
+        assert controller.running == 0
+
+    asyncio.run(scenario())
+    assert controller.stats["queue_timeouts"] == 2
+
+def test_degraded_modes_are_reported(monkeypatch):
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(utils, "fetch_user_preferences", lambda user_id: {"user_id": user_id, "min_bedrooms": 1})
+    main._recent_results.clear()
+    client = TestClient(main.app)
+
+    def serve(mode):
+        monkeypatch.setattr(main.admission, "mode", lambda: mode)
+        return client.get("/recommend/1")
+
+    assert serve(FULL).json()["engine"] == "Hybrid (Content + Collaborative)"
+    assert serve(CONTENT_ONLY).json()["engine"] == "Content-Only (Degraded)"
+    cached = serve(FALLBACK).json()
+    assert cached["engine"] == "Cached (Degraded)" and len(cached["recommendations"]) == 5
+    main._recent_results.clear()
+    assert serve(FALLBACK).json()["engine"] == "Popularity (Degraded)"
+
+    shed = serve(SHED)
+    assert shed.status_code == 503 and shed.headers["retry-after"] == str(main.SHED_RETRY_AFTER_SECONDS)
+    assert client.get("/stats/admission").json()["served"][SHED] >= 1
+
+def test_streamed_recommendations_match_json_in_rank_order(monkeypatch):
+    import json
+    from apps.ml_engine import streaming
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(main.admission, "mode", lambda: FULL)
+    client = TestClient(main.app)
+    payload = {"user_id": 5, "min_price": 0, "max_price": 10000000, "min_bedrooms": 1}
+
+    regular = client.post("/recommend", json=payload, params={"limit": 4}).json()
+    for orjson_available in (True, False):
+        monkeypatch.setattr(streaming, "ORJSON_AVAILABLE", orjson_available)
+        streamed = client.post("/recommend", json=payload, params={"limit": 4, "stream": "true"})
+        assert streamed.headers["content-type"] == "application/x-ndjson"
+        assert streamed.headers["x-engine"] == regular["engine"] and streamed.headers["x-result-count"] == "4"
+        rows = [json.loads(line) for line in streamed.text.splitlines()]
+        assert [r["id"] for r in rows] == [r["id"] for r in regular["recommendations"]]
+        assert rows[0]["explanation"] == regular["recommendations"][0]["explanation"]
+
+def test_inlined_preferences_skip_the_backend_lookup(monkeypatch):
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(main.admission, "mode", lambda: FULL)
+    monkeypatch.setattr(utils, "fetch_user_preferences", lambda user_id: (_ for _ in ()).throw(AssertionError("called back")))
+    client = TestClient(main.app)
+    inline = client.post("/recommend/1", json={"min_bedrooms": 1, "max_price": 10000000, "min_price": 0}, params={"limit": 3}).json()
+    assert inline["user_id"] == 1 and len(inline["recommendations"]) == 3
+    assert client.post("/recommend/1", json={}).json()["engine"] == "Hybrid (Content + Collaborative)"
+
+def test_content_only_mode_ranks_on_content_alone(monkeypatch):
+    houses = [{"id": i, "price": 100000 * i, "bedrooms": 1 + i, "bathrooms": 2, "sqft": 500 + 300 * i, "location": "Downtown"}
+              for i in (1, 2, 3, 4)]
+    interactions = [{"user_id": 9, "house_id": 1, "event_type": "save"}]
+    popularity = DecayedPopularity()
+    popularity.record_many(interactions)
+    monkeypatch.setattr(recommender, "popularity", popularity)
+    monkeypatch.setattr(main, "_catalogue", lambda: (houses, interactions))
+    main._recent_results.clear()
+    client = TestClient(main.app)
+
+    def serve(mode):
+        monkeypatch.setattr(main.admission, "mode", lambda: mode)
+        return client.post("/recommend/1", json={"min_bedrooms": 1, "min_price": 0, "max_price": 1000000}).json()
+
+    full = serve(FULL)["recommendations"]
+    assert full[0]["id"] == 1 and full[0]["collab_match"] == 1.0  # popularity carries the cold-start user
+    degraded = serve(CONTENT_ONLY)
+    assert degraded["engine"] == "Content-Only (Degraded)"
+    rows = degraded["recommendations"]
+    assert [r["id"] for r in rows] == [4, 1, 3, 2]
+    assert [r["content_match"] for r in rows] == sorted((r["content_match"] for r in rows), reverse=True)
+    assert all(r["collab_match"] == 0.0 for r in rows)
+    main._recent_results.clear()
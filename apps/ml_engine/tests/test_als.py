@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from apps.ml_engine.als import ImplicitALS
+from apps.ml_engine.engine import Recommender
+
+def _interactions():
+    # Users 1-10 browse houses 1-5, users 11-20 browse houses 6-10
+    rows = []
+    for user in range(1, 21):
+        block = range(1, 6) if user <= 10 else range(6, 11)
+        for n, house in enumerate(block):
+            if (user + n) % 4:
+                rows.append({"user_id": user, "house_id": house, "event_type": "save" if n % 2 else "click"})
+    return pd.DataFrame(rows)
+
+def test_factors_separate_taste_clusters_and_roundtrip(tmp_path):
+    als = ImplicitALS(factors=4, iterations=10).fit(_interactions())
+    assert als.user_factors.dtype == np.float32 and als.item_factors.shape == (10, 4)
+    assert set(als.recommend(als.user_vector(3), k=5)) == {1, 2, 3, 4, 5}
+
+    path = str(tmp_path / "als.npz")
+    als.save(path)
+    loaded = ImplicitALS.load(path)
+    np.testing.assert_array_equal(loaded.item_factors, als.item_factors)
+    np.testing.assert_allclose(loaded.score(loaded.user_vector(15), [6, 1, 99]), als.score(als.user_vector(15), [6, 1, 99]))
+    assert loaded.score(loaded.user_vector(15), [99])[0] == 0
+
+def test_fold_in_new_user_without_retrain():
+    als = ImplicitALS(factors=4, iterations=10).fit(_interactions())
+    new_user = pd.DataFrame([{"user_id": 99, "house_id": 7, "event_type": "save"},
+                             {"user_id": 99, "house_id": 8, "event_type": "click"}])
+    vector = als.user_vector(99, new_user)
+    assert vector is not None
+    assert set(als.recommend(vector, k=3, exclude={7, 8})) <= {6, 9, 10}
+    assert als.user_vector(100, new_user) is None
+
+def test_recommender_scores_with_als(monkeypatch):
+    interactions = _interactions()
+    houses = [{"id": i, "price": 200000 + i, "bedrooms": 3, "bathrooms": 2, "sqft": 1500, "location": "Downtown"} for i in range(1, 11)]
+    recommender = Recommender()
+    recommender.load_als(ImplicitALS(factors=4, iterations=10).fit(interactions))
+
+    def no_pivot(*args, **kwargs):
+        raise AssertionError("co-count pivot used despite ALS")
+    monkeypatch.setattr(pd.DataFrame, "pivot_table", no_pivot)
+
+    results = recommender.recommend({"user_id": 12, "min_bedrooms": 1}, houses, interactions=interactions.to_dict(orient="records"), limit=10)
+    collab = {r["id"]: r["collab_match"] for r in results}
+    assert min(collab[h] for h in range(6, 11)) > max(collab[h] for h in range(1, 6))
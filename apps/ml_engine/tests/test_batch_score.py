@@ -0,0 +1,41 @@
+import json
+import os
+import pytest
+from apps.ml_engine.batch_score import run_batch, CHECKPOINT_FILE
+
+def _snapshot():
+    houses = [{"id": i, "price": 100000 + i * 20000, "bedrooms": 1 + i % 4, "bathrooms": 1, "sqft": 1000 + i * 50,
+               "location": "Downtown"} for i in range(1, 11)]
+    interactions = [{"id": n, "user_id": n % 4, "house_id": 1 + n % 10, "event_type": "click"} for n in range(20)]
+    preferences = {7: {"min_price": 150000, "max_price": 300000, "min_bedrooms": 2}}
+    return {"houses": houses, "interactions": interactions, "preferences": preferences}
+
+def test_batch_scores_every_user_into_sharded_files(tmp_path):
+    stats = run_batch(_snapshot(), str(tmp_path), top_n=3, shard_size=2, workers=1)
+    assert stats["users"] == 5 and stats["shards"] == 3
+
+    rows = []
+    for name in sorted(os.listdir(tmp_path)):
+        if name.endswith(".jsonl"):
+            with open(tmp_path / name) as f:
+                rows.extend(json.loads(line) for line in f)
+    assert {r["user_id"] for r in rows} == {0, 1, 2, 3, 7}
+    assert all(1 <= r["rank"] <= 3 for r in rows)
+
+def test_resume_skips_completed_shards(tmp_path):
+    run_batch(_snapshot(), str(tmp_path), top_n=3, shard_size=2, workers=1)
+    checkpoint = json.loads((tmp_path / CHECKPOINT_FILE).read_text())
+    assert checkpoint["completed"] == [0, 1, 2]
+
+    stats = run_batch(_snapshot(), str(tmp_path), top_n=3, shard_size=2, workers=1, resume=True)
+    assert stats["skipped_shards"] == 3 and stats["scored_users"] == 0
+
+def test_resume_refuses_a_changed_user_list(tmp_path):
+    run_batch(_snapshot(), str(tmp_path), top_n=3, shard_size=2, workers=1)
+    changed = _snapshot()
+    changed["preferences"][5] = {"min_bedrooms": 1}  # shifts user 7 into another shard
+    with pytest.raises(ValueError, match="rerun without --resume"):
+        run_batch(changed, str(tmp_path), top_n=3, shard_size=2, workers=1, resume=True)
+
+    stats = run_batch(changed, str(tmp_path), top_n=3, shard_size=2, workers=1)
+    assert stats["users"] == 6 and stats["skipped_shards"] == 0
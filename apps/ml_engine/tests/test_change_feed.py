@@ -0,0 +1,40 @@
+import pandas as pd
+from apps.ml_engine.change_feed import ChangeFeed
+from apps.ml_engine.feature_store import FeatureStore
+from apps.ml_engine.popularity import DecayedPopularity
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def _house(house_id, price, embedding_id=None):
+    return {"id": house_id, "title": f"House {house_id}", "description": "nice", "price": price, "location": "Uptown",
+            "bedrooms": 4, "bathrooms": 2, "sqft": 2000, "embedding_id": embedding_id,
+            "created_at": "2026-01-05T10:00:00", "updated_at": None}
+
+def test_changes_overlay_the_snapshot(tmp_path):
+    store = FeatureStore(str(tmp_path), check_interval=0)
+    snapshot = store.publish(_houses(), _interactions(), cursor="100.0.4")
+    popularity = DecayedPopularity.from_interactions(snapshot.interactions)
+    feed = ChangeFeed(popularity)
+    feed.rebase(snapshot)
+    assert feed.cursor == "100.0.4"
+    assert feed.frames(snapshot)[0] is snapshot.houses  # nothing applied yet: no copies
+
+    feed.apply({"cursor": "105.7.6", "houses": [_house(2, 999.0, "v1:9"), _house(7, 5.0)], "interactions": [
+        {"id": 4, "user_id": 1, "house_id": 2, "event_type": "save", "created_at": "2026-01-04T00:00:00"},  # already in the snapshot
+        {"id": 5, "user_id": 9, "house_id": 7, "event_type": "save", "created_at": "2026-01-06T00:00:00Z"},
+        {"id": 6, "user_id": 9, "house_id": None, "event_type": "search", "created_at": "2026-01-06T00:01:00Z"},
+    ]})
+    houses, interactions = feed.frames(snapshot)
+    assert feed.frames(snapshot)[0] is houses  # rebuilt once per applied batch
+    assert len(houses) == 7 and houses.set_index("id").loc[2, "price"] == 999.0
+    assert houses["id"].dtype == snapshot.houses["id"].dtype
+    assert interactions["id"].tolist()[-2:] == [5, 6] and len(interactions) == 6
+    assert pd.isna(interactions["house_id"].iloc[-1])
+    assert popularity.counts[7] == 1 and popularity.counts[2] == 1 and popularity.has_history(9)
+    rows = {row["id"]: row for row in feed.house_rows(snapshot, {1, 2, 7, 99})}
+    assert set(rows) == {1, 2, 7} and rows[2]["price"] == 999.0 and rows[7]["price"] == 5.0
+
+    # Stale batch fetched before a rebase is dropped; a new snapshot resets the overlay
+    newer = store.publish(houses, interactions, cursor="110.0.6")
+    assert feed.frames(newer)[0] is newer.houses and feed.cursor == "110.0.6"
+    feed.apply({"cursor": "106.0.7", "houses": [_house(8, 1.0)], "interactions": []}, version=snapshot.version)
+    assert feed.status()["pending_houses"] == 0
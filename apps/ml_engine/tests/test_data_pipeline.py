@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from apps.ml_engine import data_pipeline
+from apps.ml_engine.data_pipeline import HouseDataPipeline
+
+HOUSES = {
+    "id": np.array([1, 2, 3]),
+    "price": np.array([100000.0, 200000.0, 300000.0]),
+    "bedrooms": np.array([2, 3, 4]),
+    "bathrooms": np.array([1, 2, 3]),
+    "sqft": np.array([1000, 1500, 2000]),
+    "location": np.array(["Downtown", "Suburbs", "Downtown"]),
+}
+
+def _interactions(n):
+    return {
+        "id": np.arange(1, n + 1),
+        "user_id": np.arange(n) % 4,
+        "house_id": np.array([1.0, 2.0, np.nan, 1.0, 3.0, 1.0, 2.0][:n] + [1.0] * max(0, n - 7)),
+        "event_type": np.array((["save", "click", "search"] * n)[:n]),
+    }
+
+@pytest.fixture
+def backend(monkeypatch):
+    log = {"interactions": _interactions(7)}
+
+    def fake_pages(after_id=0, page_size=3):
+        ids = log["interactions"]["id"]
+        while True:
+            mask = ids > after_id
+            idx = np.flatnonzero(mask)[:page_size]
+            if len(idx) == 0:
+                return
+            yield {k: v[idx] for k, v in log["interactions"].items()}
+            if len(idx) < page_size:
+                return
+            after_id = int(ids[idx[-1]])
+
+    monkeypatch.setattr(data_pipeline, "fetch_house_columns", lambda: dict(HOUSES))
+    monkeypatch.setattr(data_pipeline, "iter_interaction_pages", fake_pages)
+    return log
+
+def test_streaming_pipeline_chunks_and_popularity(backend, tmp_path):
+    dataset = HouseDataPipeline().process_streaming(page_size=3, spill_dir=str(tmp_path / "spill"))
+    chunks = list(dataset)
+    assert len(chunks) == 3  # 7 interactions in pages of 3
+    assert all(sparse.issparse(X) for X, _ in chunks)
+    assert sum(X.shape[0] for X, _ in chunks) == 6  # the null house_id row is dropped
+    assert dataset.houses["popularity_score"].tolist() == [3.0, 2.0, 1.0]
+    assert dataset.state["cursor"] == 7
+
+def test_streaming_pipeline_since_last_run(backend, tmp_path):
+    state_path = str(tmp_path / "state.json")
+    first = HouseDataPipeline().process_streaming(page_size=3, spill_dir=str(tmp_path / "a"), state_path=state_path)
+    first.commit_state(state_path)
+
+    backend["interactions"] = _interactions(9)  # two new events, both on house 1
+    second = HouseDataPipeline().process_streaming(since_last_run=True, page_size=3,
+                                                   spill_dir=str(tmp_path / "b"), state_path=state_path)
+    assert second.n_rows == 2
+    assert second.houses["popularity_score"].tolist() == [5.0, 2.0, 1.0]
+    assert second.state["cursor"] == 9
+
+def test_failed_interaction_page_raises_instead_of_truncating(monkeypatch):
+    import requests
+    from apps.ml_engine import utils
+
+    class Response:
+        def __init__(self, status, rows=()):
+            self.status_code, self.headers, self.rows = status, {"content-type": "application/json"}, list(rows)
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise requests.HTTPError(f"{self.status_code} Server Error")
+
+        def json(self):
+            return self.rows
+
+    pages = [Response(200, [{"id": 1, "user_id": 1}, {"id": 2, "user_id": 2}]), Response(503)]
+    monkeypatch.setattr(utils, "_request", lambda method, url, **kwargs: pages.pop(0))
+    with pytest.raises(requests.HTTPError):
+        utils.fetch_all_interaction_columns(page_size=2)
+
+    monkeypatch.setattr(utils, "_request", lambda method, url, **kwargs: Response(503))
+    assert utils.fetch_interaction_columns() == {}  # single-shot callers keep the soft failure
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from apps.ml_engine import engine as engine_module
+from apps.ml_engine.embeddings import EmbeddingStore
+from apps.ml_engine.engine import Recommender
+
+def _houses(n=40):
+    styles = ["lake view cottage with garden", "downtown loft near metro", "suburban family home with pool", "beach villa ocean view"]
+    return pd.DataFrame([{
+        "id": i, "title": f"Listing {i}", "description": styles[i % 4], "location": ["Lakeside", "Downtown"][i % 2],
+        "price": 150000 + (i % 10) * 30000, "bedrooms": 1 + i % 4, "bathrooms": 1 + i % 2, "sqft": 900 + i * 40,
+    } for i in range(1, n + 1)])
+
+def test_store_roundtrip_and_topk(tmp_path):
+    houses = _houses()
+    built = EmbeddingStore.build(houses, root=str(tmp_path), ivf=False)
+    store = EmbeddingStore.open_current(str(tmp_path))
+    assert store.version == built.version and len(store) == 40
+    assert store.vectors.dtype == np.float32 and isinstance(store.vectors, np.memmap)
+    np.testing.assert_allclose(np.linalg.norm(store.vectors, axis=1), 1, rtol=1e-5)
+
+    # A listing is its own nearest neighbour; similar_houses excludes it
+    rows, scores = store.search(np.asarray(store.vectors[4]), k=5)
+    assert rows[0] == 4 and np.all(np.diff(scores) <= 1e-6)
+    assert all(s["id"] != 5 for s in store.similar_houses(5, k=3))
+
+    # embedding_id wins over house id; unknown listings map to -1
+    lookup = pd.DataFrame({"id": [1, 2, 999], "embedding_id": [store.embedding_ids[1], "", ""]})
+    assert store.rows_for(lookup).tolist() == [1, 1, -1]
+
+def test_ivf_search_recalls_brute_force_neighbours(tmp_path):
+    store = EmbeddingStore.build(_houses(400), root=str(tmp_path), ivf=True)
+    assert store.ivf is not None
+    query = np.asarray(store.vectors[17])
+    exact, _ = store.search(query, k=10, rows=np.arange(len(store)))
+    approx, _ = store.search(query, k=10)
+    assert approx[0] == 17
+    assert len(set(exact) & set(approx)) >= 7
+
+def test_recommender_blends_embeddings_and_prunes_candidates(tmp_path, monkeypatch):
+    houses = _houses()
+    recommender = Recommender()
+    recommender.load_embeddings(EmbeddingStore.build(houses, root=str(tmp_path)))
+    monkeypatch.setattr(engine_module, "EMBEDDING_CANDIDATES", 5)
+    prefs = {"user_id": 1, "min_price": 0, "max_price": 10**7, "min_bedrooms": 0, "keywords": "lake view cottage"}
+    results = recommender.recommend(prefs, houses.to_dict(orient="records"), limit=10)
+    assert len(results) == 5
+    assert all("embedding_match" in r for r in results)
+    assert sum("lake view" in r["description"] for r in results) >= 4
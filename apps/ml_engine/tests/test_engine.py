@@ -1,5 +1,13 @@
 import pytest
+import joblib
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from apps.ml_engine import engine as engine_module
 from apps.ml_engine.engine import Recommender
+from apps.ml_engine.explain import ShapExplainer, parse_handle
 
 @pytest.fixture
 def sample_houses():
@@ -57,3 +65,103 @@ def test_error_handling_wrong_data_types(recommender):
     except TypeError:
         # If it raises due to string comparision, that's expected error handling
         pass
+
+# --- Learned re-ranking (stage 3b) ---
+def _inference_pipeline():
+    numeric = ['price', 'bedrooms', 'bathrooms', 'sqft', 'price_per_sqft', 'bed_bath_ratio', 'popularity_score']
+    X = pd.DataFrame({
+        'price': [100000, 200000, 300000, 150000] * 5, 'bedrooms': [2, 3, 4, 2] * 5,
+        'bathrooms': [1, 2, 3, 1] * 5, 'sqft': [1000, 1500, 2000, 1100] * 5,
+        'price_per_sqft': [100, 133, 150, 136] * 5, 'bed_bath_ratio': [1.8, 1.4, 1.3, 1.8] * 5,
+        'popularity_score': [0, 5, 1, 0] * 5, 'location': ['New York', 'Los Angeles', 'Chicago', 'New York Suburb'] * 5,
+    })
+    y = [0, 1, 0, 0] * 5
+    preprocess = ColumnTransformer([('num', StandardScaler(), numeric), ('cat', OneHotEncoder(handle_unknown='ignore'), ['location'])])
+    return Pipeline([('preprocess', preprocess), ('model', RandomForestClassifier(n_estimators=10, random_state=0))]).fit(X, y)
+
+def test_rerank_with_inference_pipeline(recommender, sample_houses, tmp_path):
+    path = tmp_path / "model.joblib"
+    joblib.dump(_inference_pipeline(), path)
+    assert recommender.load_model(str(path), version="vtest") is not None
+    interactions = [{"user_id": 9, "house_id": 2, "event_type": "save"}] * 5
+    hybrid = recommender.recommend({"min_bedrooms": 1}, sample_houses, interactions=interactions, rerank=False)
+    results = recommender.recommend({"min_bedrooms": 1}, sample_houses, interactions=interactions)
+    assert all("model_score" in r for r in results)
+    assert max(results, key=lambda r: r["model_score"])["id"] == 2
+    rank = lambda rows: [r["id"] for r in rows].index(2)
+    assert rank(results) < rank(hybrid)
+
+def test_rerank_budget_exceeded_falls_back_to_hybrid(recommender, sample_houses):
+    prefs = {"min_bedrooms": 1}
+    baseline = recommender.recommend(prefs, sample_houses)
+    recommender.model = _inference_pipeline()
+    recommender.rerank_budget_ms = 0
+    results = recommender.recommend(prefs, sample_houses)
+    assert "model_score" not in results[0]
+    assert [r["id"] for r in results] == [r["id"] for r in baseline]
+
+def test_legacy_bare_model_is_not_used_for_rerank(recommender, tmp_path):
+    path = tmp_path / "bare.joblib"
+    joblib.dump(RandomForestClassifier(n_estimators=2).fit([[0], [1]], [0, 1]), path)
+    assert recommender.load_model(str(path)) is None
+    assert recommender.model is None
+
+def test_rerank_budget_keeps_the_batches_that_finished(recommender, sample_houses, monkeypatch):
+    import time
+    import numpy as np
+    model = _inference_pipeline()
+    batches = []
+
+    def slow_predict_proba(features):
+        batches.append(len(features))
+        time.sleep(0.02)
+        return np.tile([0.0, 1.0], (len(features), 1))
+
+    monkeypatch.setattr(model, "predict_proba", slow_predict_proba)
+    monkeypatch.setattr(engine_module, "RERANK_BATCH_SIZE", 2)
+    recommender.model, recommender.rerank_budget_ms = model, 10
+    results = recommender.recommend({"min_bedrooms": 1}, sample_houses)
+    assert batches == [2]  # the deadline is checked before a batch, not after
+    assert sorted(r["model_score"] for r in results) == [0.0, 0.0, 1.0, 1.0]  # scored head kept, rest as non-candidates
+
+# --- Explanations ---
+def test_recommend_returns_handles_not_shap_values(recommender, sample_houses):
+    results = recommender.recommend({"min_bedrooms": 1}, sample_houses)
+    explanation = results[0]["explanation"]
+    assert explanation["reason"] and "shap_explainability_weights" not in explanation
+    version, house_id, key = parse_handle(explanation["handle"])
+    assert version is None and house_id == results[0]["id"]
+
+def test_explain_computes_tree_shap_once_per_key(recommender, sample_houses, monkeypatch):
+    pytest.importorskip("shap")
+    recommender.model, recommender.model_version = _inference_pipeline(), "vtest"
+    explainer = ShapExplainer()
+    monkeypatch.setattr(engine_module, "shap_explainer", explainer)
+    values = recommender.explain(sample_houses[:2], "k1")
+    assert set(values) == {1, 2}
+    assert "location" in values[2] and not any(name.startswith("cat__") for name in values[2])
+
+    calls = []
+    monkeypatch.setattr(explainer, "_tree_explainer", lambda model: calls.append(model))
+    assert recommender.explain(sample_houses[:2], "k1") == values
+    assert calls == []
+
+def test_cascade_keeps_full_scoring_top_results():
+    import numpy as np
+    rng = np.random.default_rng(7)
+    n = 5000
+    houses = pd.DataFrame({"id": np.arange(1, n + 1), "location": rng.choice(["A", "B", "C"], n),
+                           "price": rng.uniform(50000, 900000, n).round(), "bedrooms": rng.integers(1, 6, n),
+                           "bathrooms": rng.integers(1, 4, n), "sqft": rng.integers(500, 4000, n)})
+    interactions = pd.DataFrame({"user_id": rng.integers(1, 100, 4000), "house_id": rng.integers(1, n + 1, 4000),
+                                 "event_type": rng.choice(["click", "save", "search"], 4000)})
+    full, cascade = Recommender(), Recommender()
+    full.cascade_candidates, cascade.cascade_candidates = 0, 200
+    for r in (full, cascade):
+        r.popularity.record_many(interactions)
+
+    for user_id in (-1, int(interactions["user_id"].iloc[0])):  # cold start, then a user with history
+        prefs = {"user_id": user_id, "min_bedrooms": 1}
+        expected = {r["id"] for r in full.recommend(prefs, houses, interactions, limit=20)}
+        got = {r["id"] for r in cascade.recommend(prefs, houses, interactions, limit=20)}
+        assert len(expected & got) / len(expected) >= 0.9
@@ -0,0 +1,31 @@
+import math
+import pandas as pd
+from apps.ml_engine.evaluate import precision_at_k, recall_at_k, ndcg_at_k, time_split, evaluate
+
+def test_ranking_metrics():
+    assert precision_at_k([1, 2, 3, 4], {2, 4, 9}, 4) == 0.5
+    assert recall_at_k([1, 2, 3, 4], {2, 4, 9}, 4) == 2 / 3
+    assert ndcg_at_k([2, 1], {2}, 2) == 1.0
+    assert math.isclose(ndcg_at_k([1, 2], {2}, 2), 1 / math.log2(3))
+    assert recall_at_k([1], set(), 1) == 0.0
+
+def test_time_split_holds_out_latest_events():
+    df = pd.DataFrame({"id": range(10), "created_at": pd.date_range("2026-01-01", periods=10)[::-1]})
+    train, test = time_split(df, 0.2)
+    assert test["created_at"].min() > train["created_at"].max()
+    assert len(test) == 2
+
+def test_evaluate_reports_quality_and_latency_side_by_side():
+    houses = [{"id": i, "price": 100000 + i * 10000, "bedrooms": 1 + i % 4, "bathrooms": 1, "sqft": 1000 + i * 50,
+               "location": "Downtown"} for i in range(1, 21)]
+    rows = []
+    for n in range(60):
+        rows.append({"id": n, "user_id": n % 5, "house_id": 1 + (n * 7) % 20, "event_type": "click",
+                     "created_at": pd.Timestamp("2026-01-01") + pd.Timedelta(hours=n)})
+    report = evaluate(houses, pd.DataFrame(rows), {}, k=5, holdout=0.25, workers=1,
+                      scorers=("hybrid", "hybrid+als", "als", "content", "popularity"))
+    assert report["users"] == 5
+    assert set(report["scorers"]) == {"hybrid", "hybrid+als", "als", "content", "popularity"}
+    for metrics in report["scorers"].values():
+        assert 0 <= metrics["ndcg@5"] <= 1 and 0 < metrics["coverage"] <= 1
+        assert metrics["latency_ms"]["p99"] >= metrics["latency_ms"]["p50"] >= 0
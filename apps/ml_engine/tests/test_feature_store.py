@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from apps.ml_engine.engine import Recommender
+from apps.ml_engine.feature_store import FeatureStore, publish
+
+def _houses(n=6, price=200000):
+    return pd.DataFrame({"id": np.arange(n, 0, -1), "title": [f"House {i}" for i in range(n)], "description": "nice",
+                         "price": [price + i * 1000.0 for i in range(n)], "location": "Downtown",
+                         "bedrooms": 3, "bathrooms": 2, "sqft": 1500, "embedding_id": None})
+
+def _interactions():
+    return pd.DataFrame({"id": [1, 2, 3, 4], "user_id": [2, 1, 2, 1], "house_id": [3.0, 1.0, np.nan, 2.0],
+                         "event_type": ["save", "click", "search", "save"],
+                         "created_at": pd.to_datetime(["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-04"], utc=True)})
+
+def test_workers_attach_read_only_views(tmp_path):
+    publish(_houses(), _interactions(), str(tmp_path))
+    snapshot = FeatureStore(str(tmp_path), check_interval=0).current()
+    prices = snapshot.arrays["houses"]["price"]
+    assert isinstance(prices, np.memmap) and not prices.flags.writeable
+    assert np.shares_memory(snapshot.houses["price"].to_numpy(), prices)
+
+    assert snapshot.house_rows([5, 1, 42])["id"].tolist() == [5, 1]
+    mine = snapshot.user_interactions(1)
+    assert mine["id"].tolist() == [2, 4] and snapshot.user_interactions(7).empty
+    assert np.isnan(snapshot.user_interactions(2)["house_id"].iloc[1])
+
+    results = Recommender().recommend({"user_id": 1, "min_bedrooms": 1}, snapshot.houses, snapshot.interactions, limit=3)
+    assert len(results) == 3
+
+def test_refresh_swaps_versions_atomically(tmp_path):
+    root = str(tmp_path)
+    publish(_houses(), _interactions(), root)
+    worker = FeatureStore(root, check_interval=3600)
+    old = worker.current()
+    held = old.houses
+
+    FeatureStore(root, check_interval=0).publish(_houses(price=900000), _interactions())
+    assert worker.current() is old  # not re-checked yet
+    worker._checked_at = None
+    new = worker.current()
+    assert new.version != old.version and new.houses["price"].min() == 900000
+    assert held["price"].min() == 200000  # in-flight readers keep their snapshot
+
+def test_prune_keeps_recent_versions(tmp_path, monkeypatch):
+    from apps.ml_engine import feature_store as fs
+    monkeypatch.setattr(fs, "KEEP_VERSIONS", 2)
+    for _ in range(4):
+        publish(_houses(), _interactions(), str(tmp_path))
+    assert len([d for d in tmp_path.iterdir() if d.name.startswith("v")]) == 2
@@ -0,0 +1,59 @@
+import pandas as pd
+from apps.ml_engine.engine import Recommender
+from apps.ml_engine.popularity import DecayedPopularity
+
+DAY = 86400.0
+
+def test_event_weights_and_half_life():
+    popularity = DecayedPopularity(half_life_hours=24)
+    popularity.record(1, "save", user_id=7, timestamp=0)
+    popularity.record(2, "click", timestamp=0)
+    popularity.record(3, "search", timestamp=0)
+    scores = popularity.scores(now=0)
+    assert scores[1] > scores[2] > scores[3]
+    assert abs(popularity.scores(now=DAY)[1] - scores[1] / 2) < 1e-9
+    assert popularity.counts == {1: 1, 2: 1, 3: 1}
+    assert popularity.has_history(7) and not popularity.has_history(8)
+
+def test_recent_events_outrank_old_ones_and_rebase_is_lossless():
+    popularity = DecayedPopularity(half_life_hours=1)
+    popularity.record(1, "save", timestamp=0)
+    popularity.record(1, "save", timestamp=1)
+    popularity.record(2, "click", timestamp=400 * 3600)  # far enough ahead to force a rebase
+    assert popularity.normalized().idxmax() == 2
+    assert popularity.scores(now=400 * 3600)[2] == 1.0
+
+def test_bulk_load_matches_per_event_updates():
+    rows = [{"user_id": u, "house_id": h, "event_type": e, "created_at": pd.Timestamp("2026-01-01") + pd.Timedelta(hours=n)}
+            for n, (u, h, e) in enumerate([(1, 1, "save"), (2, 1, "click"), (2, 2, "search"), (3, None, "search")])]
+    bulk = DecayedPopularity.from_interactions(rows)
+    single = DecayedPopularity()
+    for row in rows:
+        single.record(row["house_id"], row["event_type"], user_id=row["user_id"], timestamp=row["created_at"].timestamp())
+    pd.testing.assert_series_equal(bulk.normalized().sort_index(), single.normalized().sort_index())
+    assert bulk.counts == single.counts and bulk.users == {1, 2, 3}
+
+def test_cold_start_skips_collaborative_pivot(monkeypatch):
+    houses = [{"id": i, "price": 200000, "bedrooms": 3, "bathrooms": 2, "sqft": 1500, "location": "Downtown"} for i in (1, 2, 3)]
+    interactions = [{"user_id": 9, "house_id": 3, "event_type": "save"}, {"user_id": 9, "house_id": 2, "event_type": "click"}]
+    recommender = Recommender()
+    recommender.popularity.record_many(interactions)
+
+    def no_pivot(*args, **kwargs):
+        raise AssertionError("pivot built for a cold-start user")
+    monkeypatch.setattr(pd.DataFrame, "pivot_table", no_pivot)
+
+    results = recommender.recommend({"user_id": 1, "min_bedrooms": 1}, houses, interactions=interactions)
+    assert {r["id"]: r["collab_match"] for r in results} == {1: 0.0, 2: 0.2, 3: 1.0}
+
+def test_cold_start_never_reads_the_interaction_log():
+    class Unread(list):
+        def __iter__(self):
+            raise AssertionError("interaction log scanned for a cold-start user")
+
+    houses = [{"id": i, "price": 200000, "bedrooms": 3, "bathrooms": 2, "sqft": 1500, "location": "Downtown"} for i in (1, 2)]
+    recommender = Recommender()
+    recommender.popularity.record_many([{"user_id": 9, "house_id": 2, "event_type": "save"}])
+    interactions = Unread([{"user_id": 9, "house_id": 2, "event_type": "save"}])
+    results = recommender.recommend({"user_id": 1, "min_bedrooms": 1}, houses, interactions=interactions)
+    assert {r["id"]: r["collab_match"] for r in results} == {1: 0.0, 2: 1.0}
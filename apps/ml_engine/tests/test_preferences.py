@@ -0,0 +1,60 @@
+from fastapi.testclient import TestClient
+from apps.ml_engine import main, utils
+from apps.ml_engine.admission import FULL
+from apps.ml_engine.preferences import PreferenceCache, SharedVersions
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def test_cache_serves_hits_negative_entries_and_never_caches_errors(monkeypatch):
+    calls, stored = [], {1: {"user_id": 1, "min_bedrooms": 3}, 2: {}}
+    monkeypatch.setattr(utils, "fetch_user_preferences", lambda user_id: calls.append(user_id) or stored.get(user_id))
+    cache = PreferenceCache(ttl=60, max_entries=2, negative_ttl=60)
+
+    assert cache.get(1) == {"user_id": 1, "min_bedrooms": 3} and cache.get(1)["min_bedrooms"] == 3
+    assert cache.get(2) == {} and cache.get(2) == {}  # "none stored" is cached too
+    assert cache.get(3) is None and cache.get(3) is None  # backend error: asked again
+    assert calls == [1, 2, 3, 3]
+
+    cache.put(1, {"user_id": 1, "min_bedrooms": 5})
+    assert cache.get(1)["min_bedrooms"] == 5
+    cache.invalidate(1)
+    assert cache.get(1)["min_bedrooms"] == 3 and calls[-1] == 1
+    stats = cache.snapshot()
+    assert stats["negative_hits"] == 1 and stats["errors"] == 2 and stats["size"] <= 2
+
+    expired = PreferenceCache(ttl=0, negative_ttl=0)
+    expired.get(1), expired.get(1)
+    assert calls[-2:] == [1, 1]
+
+def test_pushed_preferences_are_used_without_a_backend_call(monkeypatch):
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(main.admission, "mode", lambda: FULL)
+    monkeypatch.setattr(utils, "fetch_user_preferences", lambda user_id: (_ for _ in ()).throw(AssertionError("called back")))
+    main.preference_cache.clear()
+    client = TestClient(main.app)
+
+    assert client.put("/preferences/42", json={"min_bedrooms": 1, "max_price": 10000000}).status_code == 200
+    response = client.get("/recommend/42", params={"limit": 2}).json()
+    assert response["user_id"] == 42 and len(response["recommendations"]) == 2
+    assert client.get("/stats/preferences").json()["hits"] >= 1
+    client.delete("/preferences/42")
+    assert main.preference_cache.snapshot()["size"] == 0
+
+def test_push_to_one_worker_reaches_the_others(monkeypatch, tmp_path):
+    stored = {1: {"user_id": 1, "min_bedrooms": 3}}
+    calls = []
+    monkeypatch.setattr(utils, "fetch_user_preferences", lambda user_id: calls.append(user_id) or stored.get(user_id))
+    path = str(tmp_path / "preference_versions.bin")
+    pushed_to, other = (PreferenceCache(ttl=300, versions=SharedVersions(path, slots=64)) for _ in range(2))
+
+    assert pushed_to.get(1)["min_bedrooms"] == 3 and other.get(1)["min_bedrooms"] == 3
+    assert other.get(1)["min_bedrooms"] == 3 and calls == [1, 1]
+
+    stored[1] = {"user_id": 1, "min_bedrooms": 5}  # saved in the backend, pushed to one worker only
+    pushed_to.put(1, stored[1])
+    assert pushed_to.get(1)["min_bedrooms"] == 5 and calls == [1, 1]
+    assert other.get(1)["min_bedrooms"] == 5 and calls == [1, 1, 1]
+    assert other.get(1)["min_bedrooms"] == 5 and other.snapshot()["stale"] == 1
+
+    stored[1] = {"user_id": 1, "min_bedrooms": 2}
+    pushed_to.invalidate(1)
+    assert other.get(1)["min_bedrooms"] == 2 and calls[-1] == 1
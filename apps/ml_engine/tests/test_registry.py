@@ -0,0 +1,45 @@
+import json
+import os
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from apps.ml_engine.registry import ModelRegistry, save_artifact, load_artifact, publish_production
+
+def _registry(tmp_path, versions, production=None):
+    path = tmp_path / "model_registry.json"
+    path.write_text(json.dumps({"versions": versions, "production": production}))
+    return ModelRegistry(str(path), str(tmp_path))
+
+def test_snapshot_is_cached_and_reloads_on_external_replace(tmp_path):
+    registry = _registry(tmp_path, [])
+    assert registry.snapshot() is registry.snapshot()
+    replacement = tmp_path / "other.json"
+    replacement.write_text(json.dumps({"versions": [{"version": "v2"}], "production": "v2"}))
+    os.utime(replacement, ns=(1, 1))
+    os.replace(replacement, registry.path)
+    assert registry.snapshot()["production"] == "v2"
+
+def test_update_is_atomic_and_records_load_times(tmp_path):
+    registry = _registry(tmp_path, [{"version": "v1", "path": "models\\recommender_v1.joblib", "promoted": True}], "v1")
+    registry.record_load("v1", load_ms=12.345, swap_ms=0.5)
+    on_disk = json.loads((tmp_path / "model_registry.json").read_text())
+    assert on_disk["versions"][0]["serving"]["load_ms"] == 12.35
+    assert not (tmp_path / "model_registry.json.tmp").exists()
+    assert registry.artifact_path(registry.entry("v1")) == os.path.join(str(tmp_path), "recommender_v1.joblib")
+
+def test_prune_keeps_production_promoted_and_recent(tmp_path):
+    versions = []
+    for i in range(6):
+        (tmp_path / f"recommender_v{i}.joblib").write_bytes(b"x")
+        versions.append({"version": f"v{i}", "path": f"models/recommender_v{i}.joblib", "promoted": i == 1})
+    registry = _registry(tmp_path, versions, production="v1")
+    assert registry.prune(keep=2) == ["v0", "v2", "v3"]
+    assert sorted(p.name for p in tmp_path.glob("*.joblib")) == ["recommender_v1.joblib", "recommender_v4.joblib", "recommender_v5.joblib"]
+    assert registry.entry("v0")["pruned"] is True and registry.entry("v0")["path"] is None
+
+def test_artifacts_are_memory_mapped_and_published(tmp_path):
+    path = str(tmp_path / "recommender_v1.joblib")
+    save_artifact(StandardScaler().fit(np.random.rand(50, 3)), path)
+    assert isinstance(load_artifact(path).mean_, np.memmap)
+    production = str(tmp_path / "recommender.joblib")
+    publish_production(path, production)
+    assert os.path.exists(production) and load_artifact(production).mean_.shape == (3,)
@@ -0,0 +1,47 @@
+import os
+from fastapi.testclient import TestClient
+from apps.ml_engine import main, replay
+from apps.ml_engine.admission import FULL
+from apps.ml_engine.recorder import result_signature, _StreamSignature
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def test_recorded_traffic_replays_with_latency_and_result_diffs(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(main.admission, "mode", lambda: FULL)
+    for name, value in {"enabled": True, "sample_rate": 1.0, "directory": str(tmp_path), "_logger": None}.items():
+        monkeypatch.setattr(main.recorder, name, value)
+    client = TestClient(main.app)
+    payload = {"min_price": 0, "max_price": 10000000, "min_bedrooms": 1}
+    client.post("/recommend", json=payload, params={"limit": 3})
+    client.post("/recommend/9", json=payload, params={"limit": 3, "stream": "true"})
+    client.get("/ready")  # not under RECORD_PATHS
+    client.post("/recommend", json=payload, params={"limit": 3}, headers={"X-Replay": "1"})  # never re-recorded
+
+    assert main.recorder.path.endswith(f"ml_engine.{os.getpid()}.jsonl")  # one file per worker process
+    entries = replay.load_recordings([str(tmp_path / "ml_engine.*.jsonl*")])
+    assert [(e["method"], e["path"]) for e in entries] == [("POST", "/recommend"), ("POST", "/recommend/9")]
+    assert entries[0]["body"] == payload and entries[0]["data_version"] == main.data_version()
+    assert len(entries[0]["result"]["ids"]) == 3 and entries[1]["result"] == entries[0]["result"]
+
+    summary = replay.report(replay.replay(entries, "http://testserver", speed=0, concurrency=1, session=client))
+    assert summary["errors"] == 0 and summary["status_changes"] == 0
+    assert summary["results"]["identical"] == 2 and summary["results"]["top1_agreement"] == 1.0
+    assert summary["latency_ms"]["POST /recommend/{id}"]["target"]["count"] == 1
+
+    # A different "build": half the catalogue is gone, so the result sets move
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses().iloc[::2].reset_index(drop=True), _interactions()))
+    changed = replay.report(replay.replay(entries, "http://testserver", speed=0, concurrency=1, session=client))
+    assert changed["results"]["identical"] < 2 and changed["results"]["examples"]
+    assert "Results vs recording" in replay.format_report(changed)
+
+def test_result_signatures_and_comparison():
+    assert result_signature(b'{"recommendations": [{"id": 2}, {"id": 1}]}') == {"ids": [2, 1]}
+    assert result_signature(b'{"id": 2}\n{"id": 5}\n', "application/x-ndjson") == {"ids": [2, 5]}
+    assert "sha1" in result_signature(b"not json")
+    streamed = _StreamSignature("application/x-ndjson")
+    for chunk in (b'{"id": 2}\n{"i', b'd": 5}\n', b'{"id": 7}'):
+        streamed.feed(chunk)
+    assert streamed.result() == {"ids": [2, 5, 7]} and not streamed.parts
+    assert replay.compare({"ids": [1, 2]}, {"ids": [2, 1]}) == {"identical": False, "same_set": True, "overlap": 1.0, "top1": False}
+    assert replay.endpoint("/recommend/42") == "/recommend/{id}"
+    assert replay.percentiles([1.0, 2.0, 3.0, 4.0])["p50"] == 3.0
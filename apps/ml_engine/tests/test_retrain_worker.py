@@ -0,0 +1,30 @@
+import time
+from apps.ml_engine.retrain_worker import RetrainSupervisor, report_progress
+
+def slow_job():
+    report_progress("train", 50)
+    time.sleep(0.5)
+    return {"version": "vtest", "promoted": True}
+
+def failing_job():
+    raise RuntimeError("no data")
+
+def test_single_flight_progress_and_hot_swap():
+    swapped = []
+    supervisor = RetrainSupervisor(job=slow_job, n_jobs=1, nice=0)
+    assert supervisor.start(on_success=lambda result: swapped.append(result["version"]) or {"swap_ms": 1.0})
+    assert supervisor.start() is False  # joins the run in flight
+    assert supervisor.status()["state"] == "running"
+    supervisor.wait(timeout=60)
+    status = supervisor.status()
+    assert status["state"] == "succeeded" and status["progress"] == 100
+    assert status["result"]["version"] == "vtest" and swapped == ["vtest"]
+    assert status["swap"] == {"swap_ms": 1.0}
+
+def test_failed_run_is_reported_and_lock_released():
+    supervisor = RetrainSupervisor(job=failing_job, n_jobs=1, nice=0)
+    assert supervisor.start()
+    supervisor.wait(timeout=60)
+    assert supervisor.status()["state"] == "failed" and "no data" in supervisor.status()["error"]
+    assert supervisor.start()  # a new run may start once the previous one finished
+    supervisor.wait(timeout=60)
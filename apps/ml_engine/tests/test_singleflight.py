@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+import pytest
+from apps.ml_engine.singleflight import SingleFlight
+
+def _slow(calls, value):
+    calls.append(value)
+    time.sleep(0.1)
+    if value == "boom":
+        raise ValueError(value)
+    return {"value": value}
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight, calls = SingleFlight("test"), []
+
+    async def burst():
+        return await asyncio.gather(*[flight.do("k", _slow, calls, "x") for _ in range(5)],
+                                    flight.do("other", _slow, calls, "y"))
+
+    results = asyncio.run(burst())
+    assert calls.count("x") == 1 and calls.count("y") == 1
+    assert all(r is results[0] for r in results[:5])
+    assert flight.snapshot() == {"calls": 6, "executions": 2, "coalesced": 4, "errors": 0, "in_flight": 0}
+
+    # Once landed, the next call computes afresh
+    asyncio.run(flight.do("k", _slow, calls, "x"))
+    assert calls.count("x") == 2
+
+def test_errors_reach_every_waiter():
+    flight, calls = SingleFlight("test"), []
+
+    async def burst():
+        return await asyncio.gather(*[flight.do("k", _slow, calls, "boom") for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(burst()))
+    assert calls == ["boom"] and flight.stats["errors"] == 1
+
+def test_thread_callers_coalesce():
+    flight, calls, results = SingleFlight("test"), [], []
+    threads = [threading.Thread(target=lambda: results.append(flight.call("k", _slow, calls, "x"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["x"] and len(results) == 4 and flight.stats["coalesced"] == 3
+    with pytest.raises(ValueError):
+        flight.call("k", _slow, calls, "boom")
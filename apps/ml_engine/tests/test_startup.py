@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from apps.ml_engine import main
+from apps.ml_engine import feature_store as feature_store_module
+from apps.ml_engine import change_feed as change_feed_module
+from apps.ml_engine.feature_store import FeatureStore, publish
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def test_import_defers_heavy_dependencies():
+    code = "import sys, apps.ml_engine.main; print(','.join(m for m in ('pandas', 'sklearn', 'shap') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+def test_ready_after_warm_start_from_disk(tmp_path, monkeypatch):
+    publish(_houses(), _interactions(), str(tmp_path))
+    monkeypatch.setattr(feature_store_module, "feature_store", FeatureStore(str(tmp_path), check_interval=0))
+    monkeypatch.setattr(change_feed_module, "CHANGE_FEED_ENABLED", False)
+    monkeypatch.setattr(main, "readiness", {"ready": False, "stage": "starting", "error": None, "startup_ms": None, "steps_ms": {}})
+    # Nothing may be fetched from the backend while a snapshot is on disk
+    monkeypatch.setattr(FeatureStore, "refresh_from_backend", lambda self: (_ for _ in ()).throw(AssertionError("backend")))
+
+    client = TestClient(main.app)
+    assert client.get("/ready").status_code == 503
+
+    main.warm_start()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] and "prewarm" in body["steps_ms"] and body["error"] is None
@@ -0,0 +1,57 @@
+import requests
+from fastapi.testclient import TestClient
+from apps.ml_engine import main
+from apps.ml_engine.admission import FULL
+from apps.ml_engine.tracing import Tracer, waterfall, render_text
+from apps.ml_engine.tests.test_feature_store import _houses, _interactions
+
+def test_recommend_trace_has_pipeline_stages_and_backend_hops(monkeypatch):
+    forwarded = []
+
+    class _Response:
+        status_code, content = 200, b"{}"
+        def raise_for_status(self): pass
+        def json(self): return {"user_id": 3, "min_bedrooms": 1}
+
+    def fake_request(method, url, headers=None, **kwargs):
+        forwarded.append(headers)
+        return _Response()
+
+    monkeypatch.setattr(requests, "request", fake_request)
+    monkeypatch.setattr(main, "_catalogue", lambda: (_houses(), _interactions()))
+    monkeypatch.setattr(main.admission, "mode", lambda: FULL)
+    main.preference_cache.clear()
+    client = TestClient(main.app)
+
+    response = client.get("/recommend/3", params={"limit": 2}, headers={"X-Trace-Id": "abc123", "X-Parent-Span-Id": "gw1"})
+    assert response.headers["x-trace-id"] == "abc123"
+    trace = client.get("/traces/abc123", params={"peer": "false"}).json()
+    spans = {s["name"]: s for s in trace["spans"]}
+    root = spans["GET /recommend/3"]
+    assert root["parent_id"] == "gw1" and root["attrs"]["status"] == 200
+    hop = spans["GET /users/3/preferences"]
+    assert hop["kind"] == "http" and forwarded[0] == {"X-Trace-Id": "abc123", "X-Parent-Span-Id": hop["span_id"]}
+    assert {"pipeline.filter", "pipeline.content", "pipeline.collaborative", "pipeline.format"} <= set(spans)
+    assert spans["pipeline.filter"]["parent_id"] == spans["recommend"]["span_id"]
+    assert spans["recommend"]["depth"] == 1 and spans["pipeline.format"]["depth"] == 2
+    assert any(t["trace_id"] == "abc123" for t in client.get("/traces").json())
+
+def test_waterfall_orders_and_nests_spans_across_services(tmp_path):
+    export = tmp_path / "spans.jsonl"
+    tracer = Tracer("ml_engine", max_traces=1, export_path=str(export))
+    with tracer.request("GET /x", "t1"):
+        with tracer.span("inner"):
+            pass
+    assert tracer.span("outside").__enter__() is None  # no trace, no span
+    root = next(s for s in tracer.spans("t1") if s["kind"] == "server")
+    remote = {"trace_id": "t1", "span_id": "b1", "parent_id": root["span_id"], "service": "backend_api",
+              "name": "SQL SELECT", "kind": "sql", "start": root["start"] + 1e-4, "duration_ms": 0.1, "attrs": {}}
+    trace = waterfall("t1", tracer.spans("t1") + [remote])
+    assert [s["name"] for s in trace["spans"]][0] == "GET /x" and trace["services"] == ["backend_api", "ml_engine"]
+    assert {s["name"]: s["depth"] for s in trace["spans"]} == {"GET /x": 0, "inner": 1, "SQL SELECT": 1}
+    assert "SQL SELECT" in render_text(trace)
+    assert len(export.read_text().splitlines()) == 2
+
+    with tracer.request("GET /y", "t2"):
+        pass
+    assert tracer.spans("t1") == []  # buffer holds the most recent trace only
@@ -3,51 +3,52 @@ Model Retraining & Versioning Pipeline
 =======================================
 - Trains a new RandomForest model from fresh data.
 - Evaluates precision, recall, accuracy, and F1-score.
-- Saves the new model with a timestamped version tag.
-- Updates the model registry (model_registry.json).
+- Saves preprocessor + model as one inference pipeline with a timestamped version tag.
+- Updates the model registry (model_registry.json) atomically.
 - Only promotes the new model to 'production' if it improves on the previous best.
+- Prunes artifacts of old, unpromoted versions (MODEL_RETENTION_KEEP).
 """
 
 import os
-import json
-import joblib
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
 from sklearn.metrics import (
     precision_score, recall_score, accuracy_score,
     f1_score, classification_report
 )
 from .data_pipeline import HouseDataPipeline
-
-MODELS_DIR = "models"
-REGISTRY_PATH = os.path.join(MODELS_DIR, "model_registry.json")
-PRODUCTION_SYMLINK = os.path.join(MODELS_DIR, "recommender.joblib")
+from .registry import (
+    model_registry, save_artifact, publish_production,
+    MODELS_DIR, REGISTRY_PATH, PRODUCTION_PATH as PRODUCTION_SYMLINK
+)
 
 
 def load_registry() -> dict:
-    if os.path.exists(REGISTRY_PATH):
-        with open(REGISTRY_PATH, "r") as f:
-            return json.load(f)
-    return {"versions": [], "production": None}
+    return model_registry.snapshot()
 
 
 def save_registry(registry: dict):
-    with open(REGISTRY_PATH, "w") as f:
-        json.dump(registry, f, indent=2)
+    def replace(state):
+        state.clear()
+        state.update(registry)
+    model_registry.update(replace)
 
 
-def retrain_and_version() -> dict:
+def retrain_and_version(n_jobs: int = -1, progress=None) -> dict:
     """
     Full retraining pipeline with versioning:
     1. Fetch & process data.
-    2. Train RandomForestClassifier.
+    2. Train RandomForestClassifier (``n_jobs`` cores).
     3. Evaluate against test split.
     4. Save versioned model artifact.
     5. Promote to production if metrics improve.
     6. Return evaluation report.
+    ``progress(stage, percent)`` is called as each step starts.
     """
+    progress = progress or (lambda stage, percent: None)
     os.makedirs(MODELS_DIR, exist_ok=True)
     registry = load_registry()
 
@@ -56,17 +57,20 @@ def retrain_and_version() -> dict:
     print("=" * 50)
 
     # --- 1. Data ---
+    progress("data", 0)
     pipeline = HouseDataPipeline()
     X_train, X_test, y_train, y_test = pipeline.process()
     num_features = X_train.shape[1]
     print(f"[Data]     Train: {X_train.shape[0]} | Test: {X_test.shape[0]} | Features: {num_features}")
 
     # --- 2. Train ---
-    model = RandomForestClassifier(n_estimators=150, max_depth=10, random_state=42, n_jobs=-1)
+    progress("train", 30)
+    model = RandomForestClassifier(n_estimators=150, max_depth=10, random_state=42, n_jobs=n_jobs)
     model.fit(X_train, y_train)
     print("[Training] RandomForest fit complete.")
 
     # --- 3. Evaluate ---
+    progress("evaluate", 70)
     y_pred = model.predict(X_test)
     metrics = {
         "accuracy":  round(float(accuracy_score(y_test, y_pred)), 4),
@@ -91,9 +95,12 @@ def retrain_and_version() -> dict:
     print(classification_report(y_test, y_pred, zero_division=0))
 
     # --- 4. Save versioned artifact ---
+    progress("save", 85)
+    # The fitted ColumnTransformer travels with the model so the artifact scores raw house rows
+    inference_pipeline = Pipeline([("preprocess", pipeline.preprocessor), ("model", model)])
     version_tag = datetime.utcnow().strftime("v%Y%m%d_%H%M%S")
     versioned_path = os.path.join(MODELS_DIR, f"recommender_{version_tag}.joblib")
-    joblib.dump(model, versioned_path)
+    save_artifact(inference_pipeline, versioned_path)
     print(f"[Saved]    {versioned_path}")
 
     version_entry = {
@@ -105,6 +112,8 @@ def retrain_and_version() -> dict:
     }
 
     # --- 5. Promote to production if best F1 ---
+    progress("promote", 95)
+    production = registry["production"]
     current_best_f1 = 0.0
     if registry["production"]:
         for v in registry["versions"]:
@@ -113,18 +122,22 @@ def retrain_and_version() -> dict:
                 break
 
     if metrics["f1_score"] >= current_best_f1:
-        # Replace the production model symlink/file
-        if os.path.exists(PRODUCTION_SYMLINK):
-            os.remove(PRODUCTION_SYMLINK)
-        joblib.dump(model, PRODUCTION_SYMLINK)
-        registry["production"] = version_tag
+        # Repoint the production path at the versioned artifact (hard link, atomic replace)
+        publish_production(versioned_path, PRODUCTION_SYMLINK)
+        production = version_tag
         version_entry["promoted"] = True
         print(f"[Promoted] {version_tag} → production (F1: {metrics['f1_score']} ≥ {current_best_f1})")
     else:
         print(f"[Skipped]  Not promoted — current F1 {metrics['f1_score']} < best {current_best_f1}")
 
-    registry["versions"].append(version_entry)
-    save_registry(registry)
+    def record_version(state):
+        state["versions"].append(version_entry)
+        state["production"] = production
+    model_registry.update(record_version)
+
+    pruned = model_registry.prune()
+    if pruned:
+        print(f"[Retention] Pruned {len(pruned)} unpromoted artifact(s): {', '.join(pruned)}")
 
     return {
         "version": version_tag,
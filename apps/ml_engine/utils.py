@@ -1,15 +1,29 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
 import requests
 import os
+import io
 
 BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://localhost:8000")
+NPZ_MEDIA_TYPE = "application/x-npz"
+BULK_LIMIT = int(os.getenv("BULK_LIMIT", "100000"))
+INTERACTION_PAGE_SIZE = int(os.getenv("INTERACTION_PAGE_SIZE", "5000"))
+
+def _request(method: str, url: str, **kwargs):
+    """One traced HTTP hop to the backend; the trace id travels along in the headers."""
+    from .tracing import tracer
+    path = url[len(BACKEND_API_URL):] if url.startswith(BACKEND_API_URL) else url
+    with tracer.span(f"{method} {path}", kind="http", peer="backend_api") as span:
+        headers = {**kwargs.pop("headers", {}), **tracer.headers()}
+        response = requests.request(method, url, headers=headers, **kwargs)
+        if span is not None:
+            span["attrs"].update(status=response.status_code, bytes=len(response.content))
+        return response
 
 def fetch_house_listings():
     """Fetches all house listings from the backend API."""
     try:
-        response = requests.get(f"{BACKEND_API_URL}/houses/")
+        response = _request("GET", f"{BACKEND_API_URL}/houses/")
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -17,9 +31,11 @@ def fetch_house_listings():
         return []
 
 def fetch_user_preferences(user_id: int):
-    """Fetches user preferences from the backend API."""
+    """Fetches user preferences from the backend API: {} if none are stored, None on error."""
     try:
-        response = requests.get(f"{BACKEND_API_URL}/users/{user_id}/preferences")
+        response = _request("GET", f"{BACKEND_API_URL}/users/{user_id}/preferences")
+        if response.status_code == 404:
+            return {}
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -29,18 +45,118 @@ def fetch_user_preferences(user_id: int):
 def fetch_user_interactions():
     """Fetches all user interaction logs from the backend API."""
     try:
-        response = requests.get(f"{BACKEND_API_URL}/interactions/")
+        response = _request("GET", f"{BACKEND_API_URL}/interactions/")
         response.raise_for_status()
         return response.json()
     except Exception as e:
         print(f"Error fetching interactions: {e}")
         return []
 
+def fetch_columns(path: str, params: dict = None, strict: bool = False) -> dict:
+    """
+    Fetches a bulk endpoint as columnar NPZ and returns {column: ndarray}.
+    Falls back to transposing the JSON rows if the backend does not speak NPZ.
+    Errors return {} unless ``strict``, where they raise: paged callers would
+    otherwise read a failed page as the end of the data.
+    """
+    try:
+        response = _request("GET", f"{BACKEND_API_URL}{path}", params=params, headers={"Accept": NPZ_MEDIA_TYPE})
+        response.raise_for_status()
+        if response.headers.get("content-type", "").startswith(NPZ_MEDIA_TYPE):
+            with np.load(io.BytesIO(response.content), allow_pickle=False) as npz:
+                return {name: npz[name] for name in npz.files}
+        rows = response.json()
+        return {key: np.asarray([row.get(key) for row in rows]) for key in (rows[0] if rows else {})}
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error fetching columns from {path}: {e}")
+        return {}
+
+def fetch_house_columns(limit: int = BULK_LIMIT):
+    """Fetches house listings as NumPy columns (id, price, bedrooms, ...)."""
+    return fetch_columns("/houses/", {"limit": limit})
+
+def fetch_houses_by_id(house_ids: list) -> list:
+    """Fetches just the given listings (as row dicts) in one call."""
+    columns = fetch_columns("/houses/", {"ids": [int(h) for h in house_ids], "limit": len(house_ids)})
+    return pd.DataFrame(columns).to_dict(orient='records') if columns else []
+
+def fetch_interaction_columns(limit: int = BULK_LIMIT):
+    """Fetches interaction logs as NumPy columns (user_id, house_id, event_type, ...)."""
+    return fetch_columns("/interactions/", {"limit": limit})
+
+def fetch_all_user_preferences(page_size: int = 1000) -> dict:
+    """Fetches every stored preference row in keyset-paged bulk calls: {user_id: prefs}."""
+    preferences, after_id = {}, 0
+    try:
+        while True:
+            response = _request("GET", f"{BACKEND_API_URL}/users/preferences/", params={"after_id": after_id, "limit": page_size})
+            response.raise_for_status()
+            page = response.json()
+            for row in page:
+                preferences[row["user_id"]] = {k: v for k, v in row.items() if v is not None and k != "id"}
+            if len(page) < page_size:
+                return preferences
+            after_id = page[-1]["id"]
+    except Exception as e:
+        print(f"Error fetching bulk user preferences: {e}")
+        return preferences
+
+def push_embedding_ids(assignments: dict, batch_size: int = 5000) -> int:
+    """Writes {house_id: embedding_id} back to the backend in bulk; returns rows updated."""
+    items = [{"house_id": int(h), "embedding_id": e} for h, e in assignments.items()]
+    updated = 0
+    try:
+        for start in range(0, len(items), batch_size):
+            response = _request("PUT", f"{BACKEND_API_URL}/houses/embeddings", json=items[start:start + batch_size])
+            response.raise_for_status()
+            updated += response.json().get("updated", 0)
+    except Exception as e:
+        print(f"Error pushing embedding ids: {e}")
+    return updated
+
+def iter_interaction_pages(after_id: int = 0, page_size: int = INTERACTION_PAGE_SIZE):
+    """
+    Streams interaction logs page by page (keyset paging on id), yielding NumPy
+    column dicts. Only one page is held in memory at a time. A failed page raises
+    instead of ending the stream early.
+    """
+    while True:
+        page = fetch_columns("/interactions/", {"after_id": after_id, "limit": page_size}, strict=True)
+        ids = page.get("id")
+        if ids is None or len(ids) == 0:
+            return
+        yield page
+        if len(ids) < page_size:
+            return
+        after_id = int(ids[-1])
+
+def fetch_all_interaction_columns(page_size: int = INTERACTION_PAGE_SIZE) -> dict:
+    """Fetches every interaction (not just the first page) as concatenated NumPy columns; raises on a failed page."""
+    pages = list(iter_interaction_pages(page_size=page_size))
+    if not pages:
+        return {}
+    return {name: np.concatenate([page[name] for page in pages]) for name in pages[0]}
+
+def fetch_changes(since: str = None, wait: float = 0, timeout: float = 10.0):
+    """One call to the backend change feed; ``since=None`` returns only the head cursor."""
+    params = {"wait": wait} if since is None else {"since": since, "wait": wait}
+    try:
+        response = _request("GET", f"{BACKEND_API_URL}/changes/", params=params, timeout=wait + timeout)
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"Error fetching changes: {e}")
+        return None
+
 def preprocess_data(listings):
     """Converts listings to a DataFrame and scales numerical features."""
     if not listings:
         return pd.DataFrame()
     
+    from sklearn.preprocessing import StandardScaler
+
     df = pd.DataFrame(listings)
     
     # Scale numerical features
@@ -49,3 +165,16 @@ def preprocess_data(listings):
     df[numerical_cols] = scaler.fit_transform(df[numerical_cols])
     
     return df
+
+def fetch_trace_spans(trace_id: str) -> list:
+    """The backend's spans for ``trace_id`` (not traced itself, so the waterfall stays clean)."""
+    try:
+        response = requests.get(f"{BACKEND_API_URL}/traces/{trace_id}", params={"peer": "false", "raw": "true"}, timeout=2)
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"Error fetching backend trace: {e}")
+        return []
+